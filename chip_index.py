@@ -0,0 +1,236 @@
+import sys
+import functools
+
+import chip_keys
+import enemy_drops
+from parse_cache import ParseCache
+from chip_library import chip_library_specs, load_chip_library
+from chip_traders import ChipTrader, JP_NO_STAR_CODE
+from mystery_data import MysteryDataParser, MysteryDataParser5, MysteryDataParser6
+
+# bump whenever the indexed sources change, so that cached indexes are invalidated
+CHIP_INDEX_VERSION = 3
+
+SOURCE_DROP = "drop"
+SOURCE_MYSTERY_DATA = "mystery_data"
+SOURCE_TRADER = "trader"
+
+class MysteryDataInput:
+    __slots__ = ("filename", "parser_class", "parser_arg", "version")
+
+    def __init__(self, filename, parser_class, parser_arg, version):
+        self.filename = filename
+        self.parser_class = parser_class
+        self.parser_arg = parser_arg
+        self.version = version
+
+class GameSources:
+    __slots__ = ("game_number", "hp_percents_to_name", "input_drop_tables", "trader_filenames", "mystery_data_inputs")
+
+    def __init__(self, game_number, hp_percents_to_name, input_drop_tables, trader_filenames, mystery_data_inputs=()):
+        self.game_number = game_number
+        self.hp_percents_to_name = hp_percents_to_name
+        self.input_drop_tables = input_drop_tables
+        self.trader_filenames = trader_filenames
+        self.mystery_data_inputs = mystery_data_inputs
+
+    def input_filenames(self):
+        input_filenames = []
+        for input_drop_table in self.input_drop_tables:
+            input_filenames.extend((input_drop_table.filename, input_drop_table.ignored_enemies_filename))
+
+        input_filenames.extend(self.trader_filenames)
+        # the library is only needed to tell chips apart from other mystery data rewards
+        if len(self.mystery_data_inputs) != 0:
+            input_filenames.append(chip_library_specs[self.game_number].chips_filename)
+        input_filenames.extend(mystery_data_input.filename for mystery_data_input in self.mystery_data_inputs)
+        return input_filenames
+
+all_game_sources = (
+    GameSources(1, None,
+        (enemy_drops.InputDropTable("bn1_drops.txt", "bn1_ignored_enemies.txt", None),),
+        ("bn1_chip_trader.txt",)
+    ),
+    GameSources(2, enemy_drops.bn2_hp_percents_to_name,
+        (enemy_drops.InputDropTable("bn2_drops.txt", "bn2_ignored_enemies.txt", None),),
+        ("marine_harbor_lobby_trader.txt", "netopia_town_trader.txt", "marine_harbor_trader.txt", "acdc_metro_station_trader.txt", "retrochip_trader.txt")
+    ),
+    GameSources(3, enemy_drops.bn3_hp_percents_to_name,
+        (enemy_drops.InputDropTable("bn3w_drops.txt", "bn3w_ignored_enemies.txt", "3W"), enemy_drops.InputDropTable("bn3b_drops.txt", "bn3b_ignored_enemies.txt", "3B")),
+        ("bn3_higsbys_trader.txt", "tv_station_hall_1_trader.txt", "hospital_lobby_trader.txt", "bn3_bugfrag_trader.txt")
+    ),
+    GameSources(4, enemy_drops.bn4to6_hp_percents_to_name,
+        (enemy_drops.InputDropTable("bn4rs_drops.txt", "bn4rs_ignored_enemies.txt", "4RS"), enemy_drops.InputDropTable("bn4bm_drops.txt", "bn4bm_ignored_enemies.txt", "4BM")),
+        ("bn4_higsbys_trader.txt", "colosseum_avenue_trader.txt", "elec_town_2_trader.txt", "bn4_bugfrag_trader.txt"),
+        (MysteryDataInput("bn4_mystery_data.txt", MysteryDataParser, 4, None),)
+    ),
+    GameSources(5, enemy_drops.bn4to6_hp_percents_to_name,
+        (enemy_drops.InputDropTable("bn5p_drops.txt", "bn5p_ignored_enemies.txt", "5TP"), enemy_drops.InputDropTable("bn5c_drops.txt", "bn5c_ignored_enemies.txt", "5TC")),
+        ("higsbys_trader.txt", "hall_trader.txt", "mine_trader.txt", "bugfrag_trader.txt"),
+        (MysteryDataInput("exe5_mystery_data.txt", MysteryDataParser5, False, "JP"), MysteryDataInput("bn5_mystery_data.txt", MysteryDataParser5, True, "EN"))
+    ),
+    GameSources(6, enemy_drops.bn4to6_hp_percents_to_name,
+        (enemy_drops.InputDropTable("bn6g_drops.txt", "bn6g_ignored_enemies.txt", "6CG"), enemy_drops.InputDropTable("bn6f_drops.txt", "bn6f_ignored_enemies.txt", "6CF")),
+        ("asterland_trader.txt", "acdc_town_trader.txt", "sky_town_trader.txt", "green_town_trader.txt", "bn6_bugfrag_trader.txt"),
+        (MysteryDataInput("exe6_mystery_data.txt", MysteryDataParser6, False, "JP"), MysteryDataInput("bn6_mystery_data.txt", MysteryDataParser6, True, "EN"))
+    ),
+)
+
+class ChipSource:
+    __slots__ = ("game_number", "chip_name", "code", "kind", "version", "location", "details")
+
+    def __init__(self, game_number, chip_name, code, kind, version, location, details):
+        self.game_number = game_number
+        self.chip_name = chip_name
+        self.code = code
+        self.kind = kind
+        self.version = version
+        self.location = location
+        self.details = details
+
+    def __repr__(self):
+        return f"ChipSource(game_number={self.game_number}, chip_name={self.chip_name}, code={self.code}, kind={self.kind}, version={self.version}, location={self.location}, details={self.details})"
+
+    def __str__(self):
+        parts = [f"BN{self.game_number} {self.chip_name} {self.code}: {self.kind}"]
+        if self.version is not None:
+            parts.append(f"[{self.version}]")
+        parts.append(self.location)
+        if self.details:
+            parts.append(f"({self.details})")
+
+        return " ".join(parts)
+
+class ChipIndex:
+    __slots__ = ("sources", "keys_by_chip_name")
+
+    # packed_sources is what gets cached: {(game_number, chip_name, code): [(kind, version, location, details), ...]}.
+    # plain tuples keep the cached index loadable no matter which module built it
+    def __init__(self, packed_sources):
+        self.sources = {}
+        self.keys_by_chip_name = {}
+
+        for key, packed_chip_sources in packed_sources.items():
+            game_number, chip_name, code = key
+            self.sources[key] = [ChipSource(game_number, chip_name, code, *packed_chip_source) for packed_chip_source in packed_chip_sources]
+            self.keys_by_chip_name.setdefault(chip_name, []).append(key)
+
+        for keys in self.keys_by_chip_name.values():
+            keys.sort()
+
+    @classmethod
+    def load(cls, parse_cache=None, game_sources_list=all_game_sources):
+        if parse_cache is None:
+            return cls(build_packed_sources(game_sources_list, None))
+
+        input_filenames = []
+        for game_sources in game_sources_list:
+            input_filenames.extend(game_sources.input_filenames())
+
+        packed_sources = parse_cache.get_or_parse(
+            "chip_index", CHIP_INDEX_VERSION, input_filenames,
+            {"games": tuple(game_sources.game_number for game_sources in game_sources_list)},
+            functools.partial(build_packed_sources, game_sources_list, parse_cache)
+        )
+        return cls(packed_sources)
+
+    def find(self, game_number, chip_name, code):
+        return self.sources.get((game_number, chip_name, code), [])
+
+    def find_chip_full(self, game_number, chip_full):
+        chip_name, code = chip_full.rsplit(maxsplit=1)
+        return self.find(game_number, chip_name, code)
+
+    def find_all(self, chip_name, game_number=None):
+        # every source of a chip across codes, and across games unless one is given
+        found_sources = []
+        for key in self.keys_by_chip_name.get(chip_name, ()):
+            if game_number is None or key[0] == game_number:
+                found_sources.extend(self.sources[key])
+
+        return found_sources
+
+def build_packed_sources(game_sources_list, parse_cache):
+    packed_sources = {}
+
+    for game_sources in game_sources_list:
+        add_drop_sources(packed_sources, game_sources, parse_cache)
+        add_mystery_data_sources(packed_sources, game_sources, parse_cache)
+        add_trader_sources(packed_sources, game_sources)
+
+    return packed_sources
+
+def add_packed_source(packed_sources, game_number, chip_full, packed_source):
+    chip_name, code = chip_full.rsplit(maxsplit=1)
+    packed_sources.setdefault((game_number, chip_name, code), []).append(packed_source)
+
+def normalize_drop_chip_full(chip_full):
+    # drop tables write stacked navi chip suffixes in brackets, the library doesn't
+    return chip_full.replace("[EX]", "EX").replace("[SP]", "SP")
+
+def add_drop_sources(packed_sources, game_sources, parse_cache):
+    game_drop_table = enemy_drops.GameDropTable(game_sources.hp_percents_to_name, game_sources.game_number, *game_sources.input_drop_tables, parse_cache=parse_cache)
+
+    for enemy_drop_tables_and_version in game_drop_table.game_enemy_drop_tables:
+        version = enemy_drop_tables_and_version.version
+        for chip_full, chip_drop_locations in enemy_drop_tables_and_version.enemy_drop_tables.all_chip_drop_locations.items():
+            chip_full = normalize_drop_chip_full(chip_full)
+            # enemies with the same drop table share their formatted details
+            for equivalent_enemy_drops in chip_drop_locations.equivalent_enemy_drops():
+                all_details = []
+                for drop_entry in equivalent_enemy_drops[0].drop_entries:
+                    details = drop_entry.format_ranks()
+                    if game_drop_table.hp_percents_to_name is not None:
+                        hp_percents_name = game_drop_table.hp_percents_to_name.get(drop_entry.hp_percents_mask, "")
+                        if hp_percents_name != "":
+                            details = f"{details}, {hp_percents_name} HP"
+                    all_details.append(details)
+
+                for enemy_drop in equivalent_enemy_drops:
+                    for details in all_details:
+                        add_packed_source(packed_sources, game_sources.game_number, chip_full, (SOURCE_DROP, version, enemy_drop.enemy_name, details))
+
+def add_mystery_data_sources(packed_sources, game_sources, parse_cache):
+    if len(game_sources.mystery_data_inputs) == 0:
+        return
+
+    chip_library = load_chip_library(game_sources.game_number, parse_cache)
+
+    for mystery_data_input in game_sources.mystery_data_inputs:
+        mystery_data = mystery_data_input.parser_class(mystery_data_input.filename, mystery_data_input.parser_arg, chip_library, parse_cache=parse_cache)
+        for chip_key, chip_locations in mystery_data.all_chip_locations.items():
+            chip_full = chip_keys.chip_key_to_chip_full(chip_key)
+            for location in chip_locations.keys():
+                add_packed_source(packed_sources, game_sources.game_number, chip_full, (SOURCE_MYSTERY_DATA, mystery_data_input.version, location, ""))
+
+# trader files use the older DrkHole name in BN2-BN4
+trader_name_aliases = {"DrkHole": "Hole"}
+
+def add_trader_sources(packed_sources, game_sources):
+    for trader_filename in game_sources.trader_filenames:
+        chip_trader = ChipTrader(trader_filename, trader_name_aliases)
+        for chip_name, entry in chip_trader.chips.items():
+            for code in entry.codes:
+                details = "not in JP" if code == "*" and entry.jp_star_code == JP_NO_STAR_CODE else ""
+                add_packed_source(packed_sources, game_sources.game_number, f"{chip_name} {code}", (SOURCE_TRADER, entry.version, chip_trader.name, details))
+
+def main():
+    if len(sys.argv) not in (2, 3, 4):
+        print("Usage: python chip_index.py CHIP_NAME [CODE] [GAME_NUMBER]")
+        return
+
+    chip_index = ChipIndex.load(ParseCache())
+    chip_name = sys.argv[1]
+
+    if len(sys.argv) == 4:
+        chip_sources = chip_index.find(int(sys.argv[3]), chip_name, sys.argv[2])
+    else:
+        chip_sources = chip_index.find_all(chip_name)
+        if len(sys.argv) == 3:
+            chip_sources = [chip_source for chip_source in chip_sources if chip_source.code == sys.argv[2]]
+
+    for chip_source in chip_sources:
+        print(chip_source)
+
+if __name__ == "__main__":
+    main()
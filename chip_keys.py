@@ -0,0 +1,39 @@
+from symbol_table import SymbolTable
+
+# chip names are interned into dense ids shared by every index in the process, and a
+# (chip name, code) pair is packed into one int as (chip name id << CODE_ID_BITS) | code id.
+# ids depend on load order, so nothing keyed on them may be written to the parse cache
+chip_names = SymbolTable()
+
+chip_codes = "ABCDEFGHIJKLMNOPQRSTUVWXYZ*"
+code_ids = {code: code_id for code_id, code in enumerate(chip_codes)}
+CODE_ID_BITS = 5
+CODE_ID_MASK = (1 << CODE_ID_BITS) - 1
+
+# what lookups of names or codes that were never interned get. it is never a key of any index
+NO_CHIP_KEY = -1
+
+def pack_chip_key(chip_name_id, code):
+    code_id = code_ids.get(code)
+    if chip_name_id is None or code_id is None:
+        return NO_CHIP_KEY
+
+    return (chip_name_id << CODE_ID_BITS) | code_id
+
+def intern_chip_full(chip_full):
+    # for building indexes. rewards that only look like chips ("NO DATA") get NO_CHIP_KEY
+    chip_name, code = chip_full.rsplit(" ", maxsplit=1)
+    if code not in code_ids:
+        return NO_CHIP_KEY
+
+    return pack_chip_key(chip_names.intern(chip_name), code)
+
+def chip_name_id(chip_name):
+    # for lookups, so that querying unknown chips doesn't grow the table
+    return chip_names.get(chip_name)
+
+def lookup_chip_key(chip_name, code):
+    return pack_chip_key(chip_names.get(chip_name), code)
+
+def chip_key_to_chip_full(chip_key):
+    return f"{chip_names[chip_key >> CODE_ID_BITS]} {chip_codes[chip_key & CODE_ID_MASK]}"
@@ -0,0 +1,202 @@
+import json
+import functools
+
+from parse_cache import hash_parts
+
+# bump whenever conversion or indexing changes, so that cached libraries are invalidated
+CHIP_LIBRARY_VERSION = 1
+
+class ChipLibrarySpec:
+    __slots__ = ("game_number", "chips_filename", "library_sections", "v2_version_to_version", "name_aliases", "section_sort_keys")
+
+    def __init__(self, game_number, chips_filename, library_sections, v2_version_to_version=None, name_aliases=None, section_sort_keys=None):
+        self.game_number = game_number
+        self.chips_filename = chips_filename
+        self.library_sections = library_sections
+        # None for games whose export has no version property, so chips get no "version" key
+        self.v2_version_to_version = v2_version_to_version
+        self.name_aliases = name_aliases if name_aliases is not None else {}
+        self.section_sort_keys = section_sort_keys if section_sort_keys is not None else {}
+
+def index_sort_index(chip):
+    return chip["index"]
+
+def version_exclusive_sort_index(chip, first_index, last_index, first_version):
+    # chips in [first_index, last_index] have one copy per version. first_version's
+    # copies come first, then the other version's, then every chip after the range
+    chip_index = chip["index"]
+    num_exclusive = last_index - first_index + 1
+
+    if chip_index < first_index:
+        return chip_index
+    elif chip_index <= last_index:
+        if chip.get("version") == first_version:
+            return chip_index
+        else:
+            return chip_index + num_exclusive
+    else:
+        return chip_index + num_exclusive * 2
+
+def bn3_giga_sort_index(chip):
+    chip_index = chip["index"]
+    if chip["name"]["en"] == "BassGS":
+        return 11
+    elif 1 <= chip_index <= 5:
+        if chip.get("version") == "white":
+            return chip_index
+        else:
+            return chip_index + 5
+    else:
+        return chip_index - 6 + 12
+
+bn4_mega_sort_index = functools.partial(version_exclusive_sort_index, first_index=19, last_index=36, first_version="redsun")
+bn5_mega_sort_index = functools.partial(version_exclusive_sort_index, first_index=22, last_index=39, first_version="protoman")
+bn6_mega_sort_index = functools.partial(version_exclusive_sort_index, first_index=7, last_index=21, first_version="gregar")
+
+chip_library_specs = {
+    1: ChipLibrarySpec(1, "bn1_chips_v2.json", ("standard",)),
+    2: ChipLibrarySpec(2, "bn2_chips_v2.json", ("standard",)),
+    3: ChipLibrarySpec(3, "bn3_chips_v2.json", ("standard", "mega", "giga"),
+        {"White": "white", "Blue": "blue"},
+        section_sort_keys={"giga": bn3_giga_sort_index}
+    ),
+    4: ChipLibrarySpec(4, "bn4_chips_v2.json", ("standard", "mega", "giga", "secret"),
+        {"Red Sun": "redsun", "Blue Moon": "bluemoon"},
+        section_sort_keys={"mega": bn4_mega_sort_index}
+    ),
+    5: ChipLibrarySpec(5, "bn5_chips_v2.json", ("standard", "mega", "giga", "dark", "secret"),
+        {"Team ProtoMan": "protoman", "Team Colonel": "colonel"},
+        section_sort_keys={"mega": bn5_mega_sort_index}
+    ),
+    6: ChipLibrarySpec(6, "bn6_chips_v2.json", ("standard", "mega", "giga", "secret"),
+        {"Gregar": "gregar", "Falzar": "falzar"},
+        name_aliases={"AquaMan": "SpoutMan", "AquaManEX": "SpoutMnEX", "AquaManSP": "SpoutMnSP"},
+        section_sort_keys={"mega": bn6_mega_sort_index}
+    ),
+}
+
+def convert_v2_format_to_v1(chips_v2, spec):
+    chips = []
+
+    for v2_chip_full in chips_v2["results"].values():
+        v2_chip = v2_chip_full["printouts"]
+
+        v2_chip_name = v2_chip["name"][0]
+        chip = {
+            "name": {
+                "en": spec.name_aliases.get(v2_chip_name, v2_chip_name)
+            },
+            "codes": "".join(v2_chip["codes"]),
+            "index": v2_chip["index"][0],
+            "section": v2_chip["section"][0].lower()
+        }
+
+        if spec.v2_version_to_version is not None:
+            v2_version_list = v2_chip["version"]
+            if len(v2_version_list) != 0:
+                chip["version"] = spec.v2_version_to_version.get(v2_version_list[0])
+            else:
+                chip["version"] = None
+
+        chips.append(chip)
+
+    return chips
+
+def load_chips(filename, spec):
+    with open(filename, "r") as f:
+        chips_json = json.load(f)
+
+    # bn5_chips.json style exports are already a list of v1 chips
+    if isinstance(chips_json, list):
+        return chips_json
+    else:
+        return convert_v2_format_to_v1(chips_json, spec)
+
+def is_library_chip(chip, library_sections):
+    if chip is None:
+        return False
+
+    if not isinstance(chip.get("index"), int):
+        return False
+
+    if chip.get("section") not in library_sections:
+        return False
+
+    return True
+
+class ChipLibrary:
+    __slots__ = ("game_number", "chips", "chips_by_section", "sorted_chips_by_section", "sorted_chips_by_section_version", "chips_by_name", "chips_by_index", "chips_by_name_code", "chip_fulls", "digest")
+
+    def __init__(self, chips, spec):
+        self.game_number = spec.game_number
+        self.chips = []
+        self.chips_by_section = {section: [] for section in spec.library_sections}
+        self.sorted_chips_by_section_version = {}
+        self.chips_by_name = {}
+        self.chips_by_index = {}
+        self.chips_by_name_code = {}
+        chip_fulls = set()
+
+        for chip in chips:
+            if not is_library_chip(chip, spec.library_sections):
+                continue
+
+            self.chips.append(chip)
+            section = chip["section"]
+            chip_name = chip["name"]["en"]
+            self.chips_by_section[section].append(chip)
+            self.sorted_chips_by_section_version.setdefault((section, chip.get("version")), []).append(chip)
+            self.chips_by_name.setdefault(chip_name, []).append(chip)
+            self.chips_by_index.setdefault((section, chip["index"]), []).append(chip)
+
+            for code in chip["codes"]:
+                self.chips_by_name_code.setdefault((chip_name, code), chip)
+                chip_fulls.add(f"{chip_name} {code}")
+
+        self.chip_fulls = frozenset(chip_fulls)
+
+        # sorts are stable, so chips with equal keys stay in export order
+        self.sorted_chips_by_section = {}
+        for section, section_chips in self.chips_by_section.items():
+            self.sorted_chips_by_section[section] = sorted(section_chips, key=spec.section_sort_keys.get(section, index_sort_index))
+
+        for section_version_chips in self.sorted_chips_by_section_version.values():
+            section_version_chips.sort(key=index_sort_index)
+
+        self.digest = hash_parts(*sorted(f"{chip['name']['en']} {chip['codes']}" for chip in self.chips))
+
+    def section(self, section):
+        return self.sorted_chips_by_section[section]
+
+    def section_version(self, section, version):
+        return self.sorted_chips_by_section_version.get((section, version), [])
+
+    def find_by_name(self, chip_name):
+        return self.chips_by_name.get(chip_name, [])
+
+    def find_by_index(self, section, chip_index):
+        return self.chips_by_index.get((section, chip_index), [])
+
+    def find(self, chip_name, code):
+        return self.chips_by_name_code.get((chip_name, code))
+
+    def has_chip_full(self, chip_full):
+        return chip_full in self.chip_fulls
+
+def load_chip_library(game_number, parse_cache=None, chips_filename=None):
+    spec = chip_library_specs[game_number]
+    if chips_filename is None:
+        chips_filename = spec.chips_filename
+
+    if parse_cache is None:
+        return build_chip_library(chips_filename, game_number)
+    else:
+        return parse_cache.get_or_parse(
+            "chip_library", CHIP_LIBRARY_VERSION, (chips_filename,),
+            {"game_number": game_number},
+            functools.partial(build_chip_library, chips_filename, game_number)
+        )
+
+def build_chip_library(chips_filename, game_number):
+    spec = chip_library_specs[game_number]
+    return ChipLibrary(load_chips(chips_filename, spec), spec)
@@ -0,0 +1,241 @@
+import sys
+
+from chip_library import load_chip_library
+from mystery_data import load_mystery_data_file, game_cycles, md_label_cycle_indices
+
+# (filename, version) of every mystery data dump of a game. BN4 has no JP/EN split
+route_inputs = {
+    4: (("bn4_mystery_data.txt", None),),
+    5: (("exe5_mystery_data.txt", "JP"), ("bn5_mystery_data.txt", "EN")),
+    6: (("exe6_mystery_data.txt", "JP"), ("bn6_mystery_data.txt", "EN")),
+}
+
+# branch and bound gives up after this many nodes and returns the best route found so far
+DEFAULT_MAX_NODES = 200000
+
+def iter_bits(mask):
+    while mask != 0:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+class RouteStop:
+    __slots__ = ("version", "map_name", "md_type", "flag_id", "chip_fulls")
+
+    def __init__(self, version, map_name, md_type, flag_id, chip_fulls):
+        self.version = version
+        self.map_name = map_name
+        # None when stops are whole maps
+        self.md_type = md_type
+        self.flag_id = flag_id
+        self.chip_fulls = chip_fulls
+
+    def __str__(self):
+        parts = []
+        if self.version is not None:
+            parts.append(f"[{self.version}]")
+        parts.append(self.map_name)
+        if self.md_type is not None:
+            parts.append(f"{self.md_type} {self.flag_id}")
+        parts.append(f"({len(self.chip_fulls)}): {', '.join(self.chip_fulls)}")
+
+        return " ".join(parts)
+
+class Route:
+    __slots__ = ("stops", "uncovered", "is_optimal")
+
+    def __init__(self, stops, uncovered, is_optimal):
+        self.stops = stops
+        # targets that no allowed stop gives
+        self.uncovered = uncovered
+        self.is_optimal = is_optimal
+
+# chip sets are python ints used as bitsets over the library's (chip, code) pairs, like trader code masks
+class ChipRouteOptimizer:
+    __slots__ = ("game_number", "chip_fulls", "chip_bits", "stop_keys", "stop_masks")
+
+    def __init__(self, game_number, versions=None, cycles=None, per_md=False, parse_cache=None, chip_library=None):
+        self.game_number = game_number
+        if chip_library is None:
+            chip_library = load_chip_library(game_number, parse_cache)
+
+        self.chip_fulls = []
+        self.chip_bits = {}
+        for chip in chip_library.chips:
+            chip_name = chip["name"]["en"]
+            for code in chip["codes"]:
+                chip_full = f"{chip_name} {code}"
+                if chip_full not in self.chip_bits:
+                    self.chip_bits[chip_full] = len(self.chip_fulls)
+                    self.chip_fulls.append(chip_full)
+
+        cycle_names = game_cycles[game_number]
+        if cycles is None:
+            allowed_cycle_indices = frozenset(range(len(cycle_names)))
+        else:
+            allowed_cycle_indices = frozenset(cycle_names.index(cycle) for cycle in cycles)
+
+        stop_masks = {}
+        for filename, version in route_inputs[game_number]:
+            if versions is not None and version is not None and version not in versions:
+                continue
+
+            for mystery_data in load_mystery_data_file(filename, parse_cache).mds:
+                label_cycle_indices = md_label_cycle_indices(game_number, mystery_data)
+                mask = 0
+                for md_reward in mystery_data.rewards:
+                    chip_bit = self.chip_bits.get(md_reward.reward)
+                    if chip_bit is not None and not allowed_cycle_indices.isdisjoint(label_cycle_indices[md_reward.label]):
+                        mask |= 1 << chip_bit
+
+                if mask == 0:
+                    continue
+
+                if per_md:
+                    stop_key = (version, mystery_data.map_name, mystery_data.md_type_abbrev, mystery_data.flag_id)
+                else:
+                    stop_key = (version, mystery_data.map_name, None, None)
+
+                stop_masks[stop_key] = stop_masks.get(stop_key, 0) | mask
+
+        self.stop_keys = list(stop_masks.keys())
+        self.stop_masks = list(stop_masks.values())
+
+    def target_mask(self, chip_fulls):
+        mask = 0
+        for chip_full in chip_fulls:
+            chip_bit = self.chip_bits.get(chip_full)
+            if chip_bit is None:
+                raise RuntimeError(f"{chip_full} is not in the BN{self.game_number} library!")
+
+            mask |= 1 << chip_bit
+
+        return mask
+
+    def solve(self, chip_fulls=None, exact=False, max_nodes=DEFAULT_MAX_NODES):
+        if chip_fulls is None:
+            chip_fulls = self.chip_fulls
+
+        target_mask = self.target_mask(chip_fulls)
+        coverable_mask = 0
+        for stop_mask in self.stop_masks:
+            coverable_mask |= stop_mask
+
+        uncovered_mask = target_mask & ~coverable_mask
+        target_mask &= coverable_mask
+
+        candidates = self.undominated_candidates(target_mask)
+        route_stop_indices = self.greedy(target_mask, candidates)
+        is_optimal = len(route_stop_indices) <= 1
+        if exact and not is_optimal:
+            route_stop_indices, is_optimal = self.branch_and_bound(target_mask, candidates, route_stop_indices, max_nodes)
+
+        # each stop lists the targets it adds on top of the stops before it
+        stops = []
+        remaining_mask = target_mask
+        for stop_index in route_stop_indices:
+            version, map_name, md_type, flag_id = self.stop_keys[stop_index]
+            new_mask = self.stop_masks[stop_index] & remaining_mask
+            remaining_mask &= ~new_mask
+            stops.append(RouteStop(version, map_name, md_type, flag_id, [self.chip_fulls[chip_bit] for chip_bit in iter_bits(new_mask)]))
+
+        return Route(stops, [self.chip_fulls[chip_bit] for chip_bit in iter_bits(uncovered_mask)], is_optimal)
+
+    def undominated_candidates(self, target_mask):
+        # (stop index, mask within the targets), dropping stops whose targets another stop also gives
+        candidates = []
+        for stop_index, stop_mask in enumerate(self.stop_masks):
+            mask = stop_mask & target_mask
+            if mask != 0:
+                candidates.append((stop_index, mask))
+
+        # biggest first, so a dominated stop is always checked against the stops that can dominate it
+        candidates.sort(key=lambda candidate: -candidate[1].bit_count())
+        undominated_candidates = []
+        for stop_index, mask in candidates:
+            if all(mask & ~kept_mask != 0 for kept_stop_index, kept_mask in undominated_candidates):
+                undominated_candidates.append((stop_index, mask))
+
+        return undominated_candidates
+
+    def greedy(self, target_mask, candidates):
+        route_stop_indices = []
+        remaining_mask = target_mask
+
+        while remaining_mask != 0:
+            best_stop_index = None
+            best_count = 0
+            for stop_index, mask in candidates:
+                count = (mask & remaining_mask).bit_count()
+                if count > best_count:
+                    best_stop_index = stop_index
+                    best_count = count
+                    best_mask = mask
+
+            route_stop_indices.append(best_stop_index)
+            remaining_mask &= ~best_mask
+
+        return route_stop_indices
+
+    def branch_and_bound(self, target_mask, candidates, best_route, max_nodes):
+        chip_bit_candidates = {chip_bit: [] for chip_bit in iter_bits(target_mask)}
+        for candidate in candidates:
+            for chip_bit in iter_bits(candidate[1]):
+                chip_bit_candidates[chip_bit].append(candidate)
+
+        best_route = list(best_route)
+        route = []
+        num_nodes = 0
+        gave_up = False
+
+        def search(remaining_mask):
+            nonlocal best_route, num_nodes, gave_up
+
+            if remaining_mask == 0:
+                if len(route) < len(best_route):
+                    best_route = list(route)
+                return
+
+            if num_nodes >= max_nodes:
+                gave_up = True
+                return
+            num_nodes += 1
+
+            # no stop gives more than max_count of what is left
+            max_count = max((mask & remaining_mask).bit_count() for stop_index, mask in candidates)
+            if len(route) + -(-remaining_mask.bit_count() // max_count) >= len(best_route):
+                return
+
+            # the target with the fewest stops giving it has to come from one of them
+            branch_chip_bit = min(iter_bits(remaining_mask), key=lambda chip_bit: len(chip_bit_candidates[chip_bit]))
+            branch_candidates = sorted(chip_bit_candidates[branch_chip_bit], key=lambda candidate: -(candidate[1] & remaining_mask).bit_count())
+
+            for stop_index, mask in branch_candidates:
+                route.append(stop_index)
+                search(remaining_mask & ~mask)
+                route.pop()
+
+        search(target_mask)
+        return best_route, not gave_up
+
+def main():
+    if len(sys.argv) < 4:
+        print("Usage: python chip_routes.py GAME_NUMBER VERSION|all CYCLE|all [CHIP_FULL ...]")
+        return
+
+    game_number = int(sys.argv[1])
+    versions = None if sys.argv[2] == "all" else (sys.argv[2],)
+    cycles = None if sys.argv[3] == "all" else (sys.argv[3],)
+    chip_fulls = sys.argv[4:] if len(sys.argv) > 4 else None
+
+    route = ChipRouteOptimizer(game_number, versions, cycles).solve(chip_fulls, exact=True)
+    for stop in route.stops:
+        print(stop)
+
+    if len(route.uncovered) != 0:
+        print(f"Not in mystery data: {', '.join(route.uncovered)}")
+    if not route.is_optimal:
+        print("Search limit reached, the route may not be minimal")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import re
+
+JP_HAS_STAR_CODE = 0
+JP_NO_STAR_CODE = 1
+JP_STAR_CODE_IRRELEVANT = 2
+
+# how a trader's missing library codes are written after its name
+MISSING_CODES_TEXT_NONE = 0
+MISSING_CODES_TEXT_STAR_NOTES = 1
+MISSING_CODES_TEXT_LIST = 2
+
+# version tags are unique across games, so one table covers every trader file
+trader_tag_to_version = {
+    "RS": "redsun",
+    "BM": "bluemoon",
+    "TP": "protoman",
+    "TC": "colonel",
+    "G": "gregar",
+    "F": "falzar",
+}
+
+trader_tag_to_jp_star_code = {
+    "J*Y": JP_HAS_STAR_CODE,
+    "J*N": JP_NO_STAR_CODE,
+}
+
+# name, codes, then at most one tag. names may contain spaces ("Z Saver")
+# and bracketed suffixes ("Roll[SP]")
+trader_entry_regex = re.compile(r"^\t(?P<name>[^\t]+?)\t+(?P<codes>[A-Z*]+)\t*(?:\[(?P<tag>[A-Z*]+)\])?\t*$")
+
+STAR_CODE_BIT = 1 << 26
+
+code_to_bit = {chr(ord("A") + i): 1 << i for i in range(26)}
+code_to_bit["*"] = STAR_CODE_BIT
+
+codes_to_mask_memo = {}
+
+def codes_to_mask(codes):
+    codes_mask = codes_to_mask_memo.get(codes)
+    if codes_mask is None:
+        codes_mask = 0
+        for code in codes:
+            codes_mask |= code_to_bit[code]
+
+        codes_to_mask_memo[codes] = codes_mask
+
+    return codes_mask
+
+class ChipTraderEntry:
+    __slots__ = ("name", "codes", "codes_mask", "version", "jp_star_code")
+
+    def __init__(self, name, codes, version, jp_star_code):
+        self.name = name
+        self.codes = codes
+        self.codes_mask = codes_to_mask(codes)
+        self.version = version
+        self.jp_star_code = jp_star_code
+
+    @classmethod
+    def from_line(cls, line, filename, line_num, name_aliases):
+        match_obj = trader_entry_regex.match(line)
+        if match_obj is None:
+            raise RuntimeError(f"At {filename}:{line_num}: Invalid trader entry \"{line}\"!")
+
+        name = match_obj.group("name")
+        if "[" in name:
+            name = name.replace("[", "").replace("]", "")
+        name = name_aliases.get(name, name)
+
+        version = None
+        jp_star_code = JP_STAR_CODE_IRRELEVANT
+        tag = match_obj.group("tag")
+        if tag is not None:
+            jp_star_code = trader_tag_to_jp_star_code.get(tag, JP_STAR_CODE_IRRELEVANT)
+            if jp_star_code == JP_STAR_CODE_IRRELEVANT:
+                version = trader_tag_to_version.get(tag)
+                if version is None:
+                    raise RuntimeError(f"At {filename}:{line_num}: Unknown trader tag [{tag}]!")
+
+        return cls(name, match_obj.group("codes"), version, jp_star_code)
+
+class ChipTrader:
+    __slots__ = ("name", "chips")
+
+    def __init__(self, filename, name_aliases=None, default_name="Chip Trader"):
+        if name_aliases is None:
+            name_aliases = {}
+
+        self.chips = {}
+
+        with open(filename, "r") as f:
+            lines = f.read().splitlines()
+
+        # the BN1 trader file has no name line
+        if len(lines) != 0 and not lines[0].startswith("\t"):
+            self.name = lines[0].strip()
+            first_entry_line_num = 2
+            lines = lines[1:]
+        else:
+            self.name = default_name
+            first_entry_line_num = 1
+
+        for line_num, line in enumerate(lines, first_entry_line_num):
+            if line.strip() == "":
+                continue
+
+            entry = ChipTraderEntry.from_line(line, filename, line_num, name_aliases)
+            self.chips[entry.name] = entry
+
+class ChipTraders:
+    __slots__ = ("traders", "traders_by_chip_name", "version_to_game_version", "missing_codes_text_style", "validate_missing_codes", "trader_chip_notes")
+
+    def __init__(self, filenames, version_to_game_version=None, missing_codes_text_style=MISSING_CODES_TEXT_NONE, validate_missing_codes=True, name_aliases=None, trader_chip_notes=None):
+        self.traders = [ChipTrader(filename, name_aliases) for filename in filenames]
+        self.version_to_game_version = version_to_game_version if version_to_game_version is not None else {}
+        self.missing_codes_text_style = missing_codes_text_style
+        self.validate_missing_codes = validate_missing_codes
+        # {(trader name, chip name): text} replacing the missing codes text
+        self.trader_chip_notes = trader_chip_notes if trader_chip_notes is not None else {}
+
+        self.traders_by_chip_name = {}
+        for trader in self.traders:
+            for chip_name, entry in trader.chips.items():
+                self.traders_by_chip_name.setdefault(chip_name, []).append((trader, entry))
+
+    def find_entries(self, chip_name):
+        return self.traders_by_chip_name.get(chip_name, ())
+
+    def has_chip_in_code(self, chip, code):
+        code_bit = code_to_bit[code]
+        for trader, entry in self.find_entries(chip["name"]["en"]):
+            if entry.codes_mask & code_bit:
+                return True
+
+        return False
+
+    def find_traders_for_chip(self, chip):
+        trader_chip_entries = self.find_entries(chip["name"]["en"])
+        if len(trader_chip_entries) == 0:
+            return None, None
+
+        chip_codes_mask = codes_to_mask(chip["codes"])
+        found_trader_texts = []
+        found_version_text = None
+
+        for trader, entry in trader_chip_entries:
+            found_trader_texts.append(trader.name + self.get_missing_codes_text(trader, entry, chip, chip_codes_mask))
+            if entry.version is not None:
+                found_version_text = self.version_to_game_version[entry.version]
+
+        return ", ".join(found_trader_texts), found_version_text
+
+    def get_missing_codes_text(self, trader, entry, chip, chip_codes_mask):
+        missing_codes_mask = chip_codes_mask & ~entry.codes_mask
+
+        if self.validate_missing_codes and missing_codes_mask & ~STAR_CODE_BIT:
+            raise RuntimeError(f"{trader.name} is missing non-* codes of {chip['name']['en']}! Library: {chip['codes']}, trader: {entry.codes}")
+
+        trader_chip_note = self.trader_chip_notes.get((trader.name, entry.name))
+        if trader_chip_note is not None:
+            return trader_chip_note
+
+        if self.missing_codes_text_style == MISSING_CODES_TEXT_STAR_NOTES:
+            if entry.jp_star_code == JP_NO_STAR_CODE:
+                return " ({{JP2}}: No {{code|*}})"
+            elif missing_codes_mask & STAR_CODE_BIT:
+                return " (No {{code|*}})"
+        elif self.missing_codes_text_style == MISSING_CODES_TEXT_LIST:
+            if missing_codes_mask != 0:
+                return " (No " + ", ".join(("{{code|%s}}" % code) for code in chip["codes"] if missing_codes_mask & code_to_bit[code]) + ")"
+
+        return ""
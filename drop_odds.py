@@ -0,0 +1,138 @@
+import sys
+
+import numpy as np
+
+import enemy_drops
+from drop_rate_store import DropRateStore, CHANCE_DENOMINATOR
+
+class DropOdds:
+    __slots__ = ("version", "enemy_name", "reward", "hp_percent", "rank", "chance", "expected_battles")
+
+    def __init__(self, version, enemy_name, reward, hp_percent, rank, chance, expected_battles):
+        self.version = version
+        self.enemy_name = enemy_name
+        self.reward = reward
+        self.hp_percent = hp_percent
+        # None when the chance is taken over a busting level distribution
+        self.rank = rank
+        self.chance = chance
+        self.expected_battles = expected_battles
+
+    def __str__(self):
+        parts = [f"[{self.version}] {self.reward}: {self.enemy_name}"]
+        if self.rank is not None:
+            parts.append(f"LV{self.rank}")
+        if self.hp_percent is not None:
+            parts.append(f"{self.hp_percent} HP")
+        parts.append(f"{self.chance:.2%}, {self.expected_battles:.1f} battles expected")
+
+        return " ".join(parts)
+
+def rank_distribution_to_weights(rank_distribution):
+    # {rank: weight}, ranks as ints or as drop table text ("10", "S+"). weights don't need to sum to 1
+    rank_weights = np.zeros(enemy_drops.MAX_RANK + 1, dtype=np.float64)
+    for rank, weight in rank_distribution.items():
+        if isinstance(rank, str):
+            rank = enemy_drops.DropEntry.rank_to_int(rank)
+        rank_weights[rank] += weight
+
+    total_weight = rank_weights.sum()
+    if total_weight <= 0:
+        raise RuntimeError(f"Busting level distribution {rank_distribution} has no weight!")
+
+    return rank_weights / total_weight
+
+def parse_rank_distribution(rank_distribution_str):
+    # "9:1,10:2,S:1"
+    rank_distribution = {}
+    for rank_weight in rank_distribution_str.split(","):
+        rank, weight = rank_weight.split(":")
+        rank_distribution[rank.strip()] = float(weight)
+
+    return rank_distribution
+
+# group keys pack (table, enemy, reward, hp_percent, rank) into one int64, following drop_rate_dtype's widths
+GROUP_KEY_SHIFTS = (48, 32, 16, 8, 0)
+
+class DropOddsCalculator:
+    __slots__ = ("drop_rate_store",)
+
+    def __init__(self, drop_rate_store=None):
+        if drop_rate_store is None:
+            drop_rate_store = DropRateStore()
+
+        self.drop_rate_store = drop_rate_store
+
+    def group_chances(self, selected, rank_distribution):
+        # drop chances summed per (table, enemy, reward, HP band, busting level), or per
+        # (table, enemy, reward, HP band) weighted by rank_distribution when one is given
+        rows = self.drop_rate_store.drop_rates[selected]
+        chances = rows["chance"].astype(np.float64) / CHANCE_DENOMINATOR
+        ranks = rows["rank"].astype(np.int64)
+
+        if rank_distribution is not None:
+            chances *= rank_distribution_to_weights(rank_distribution)[ranks]
+            ranks = np.zeros_like(ranks)
+
+        keys = ranks
+        for name, shift in zip(("table", "enemy", "reward", "hp_percent"), GROUP_KEY_SHIFTS):
+            keys = keys | (rows[name].astype(np.int64) << shift)
+
+        group_keys, group_indices = np.unique(keys, return_inverse=True)
+        group_chances = np.bincount(group_indices.reshape(-1), weights=chances, minlength=len(group_keys))
+        has_chance = group_chances > 0
+        return group_keys[has_chance], group_chances[has_chance]
+
+    def to_drop_odds(self, group_key, chance, has_rank):
+        drop_rate_store = self.drop_rate_store
+        group_key = int(group_key)
+        table_id, enemy_id, reward_id, hp_percent_bit = ((group_key >> shift) & mask for shift, mask in zip(GROUP_KEY_SHIFTS, (0xff, 0xffff, 0xffff, 0xff)))
+        rank = enemy_drops.DropEntry.int_to_rank(group_key & 0xff) if has_rank else None
+        chance = float(chance)
+
+        return DropOdds(drop_rate_store.tables[table_id], drop_rate_store.enemies[enemy_id], drop_rate_store.rewards[reward_id], enemy_drops.bit_to_hp_percent[hp_percent_bit], rank, chance, 1 / chance)
+
+    def find(self, reward, version=None, rank_distribution=None):
+        # every place the reward drops, best chance first
+        group_keys, group_chances = self.group_chances(self.drop_rate_store.select(table=version, reward=reward), rank_distribution)
+        order = np.argsort(-group_chances, kind="stable")
+        has_rank = rank_distribution is None
+        return [self.to_drop_odds(group_keys[i], group_chances[i], has_rank) for i in order.tolist()]
+
+    def best_farming_spots(self, version, rank_distribution=None, chips_only=True):
+        # the best place to farm every reward of a drop table at once, as {reward: DropOdds}
+        group_keys, group_chances = self.group_chances(self.drop_rate_store.select(table=version, chips_only=chips_only), rank_distribution)
+        reward_ids = (group_keys >> GROUP_KEY_SHIFTS[2]) & 0xffff
+        # by reward, then best chance first, ties in key order
+        order = np.lexsort((group_keys, -group_chances, reward_ids))
+        sorted_reward_ids = reward_ids[order]
+        is_reward_start = np.ones(len(order), dtype=bool)
+        is_reward_start[1:] = sorted_reward_ids[1:] != sorted_reward_ids[:-1]
+
+        has_rank = rank_distribution is None
+        best_farming_spots = {}
+        for i in order[is_reward_start].tolist():
+            drop_odds = self.to_drop_odds(group_keys[i], group_chances[i], has_rank)
+            best_farming_spots[drop_odds.reward] = drop_odds
+
+        return best_farming_spots
+
+def main():
+    if len(sys.argv) not in (2, 3, 4):
+        print("Usage: python drop_odds.py VERSION [REWARD|all] [RANK_DISTRIBUTION, e.g. 9:1,10:2,S:1]")
+        return
+
+    drop_odds_calculator = DropOddsCalculator()
+    version = sys.argv[1]
+    rank_distribution = parse_rank_distribution(sys.argv[3]) if len(sys.argv) == 4 else None
+
+    if len(sys.argv) >= 3 and sys.argv[2] != "all":
+        all_drop_odds = drop_odds_calculator.find(sys.argv[2], version, rank_distribution)
+    else:
+        all_drop_odds = drop_odds_calculator.best_farming_spots(version, rank_distribution).values()
+
+    for drop_odds in all_drop_odds:
+        print(drop_odds)
+
+if __name__ == "__main__":
+    main()
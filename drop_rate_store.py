@@ -0,0 +1,156 @@
+import decimal
+
+import numpy as np
+
+import enemy_drops
+from symbol_table import SymbolTable
+
+# one row per (drop table, enemy, reward, HP band, busting level).
+# chance is the exact drop probability in 1/256 units
+drop_rate_dtype = np.dtype([
+    ("table", np.uint8),
+    ("enemy", np.uint16),
+    ("reward", np.uint16),
+    ("hp_percent", np.uint8),
+    ("rank", np.uint8),
+    ("chance", np.uint16),
+])
+
+CHANCE_DENOMINATOR = 256
+
+all_drop_rate_input_tables = (
+    (enemy_drops.InputDropTable("bn1_drops.txt", "bn1_ignored_enemies.txt", "1"), False),
+    (enemy_drops.InputDropTable("bn2_drops.txt", "bn2_ignored_enemies.txt", "2"), True),
+    (enemy_drops.InputDropTable("bn3w_drops.txt", "bn3w_ignored_enemies.txt", "3W"), True),
+    (enemy_drops.InputDropTable("bn3b_drops.txt", "bn3b_ignored_enemies.txt", "3B"), True),
+    (enemy_drops.InputDropTable("bn4rs_drops.txt", "bn4rs_ignored_enemies.txt", "4RS"), True),
+    (enemy_drops.InputDropTable("bn4bm_drops.txt", "bn4bm_ignored_enemies.txt", "4BM"), True),
+    (enemy_drops.InputDropTable("bn5p_drops.txt", "bn5p_ignored_enemies.txt", "5TP"), True),
+    (enemy_drops.InputDropTable("bn5c_drops.txt", "bn5c_ignored_enemies.txt", "5TC"), True),
+    (enemy_drops.InputDropTable("bn6g_drops.txt", "bn6g_ignored_enemies.txt", "6CG"), True),
+    (enemy_drops.InputDropTable("bn6f_drops.txt", "bn6f_ignored_enemies.txt", "6CF"), True),
+)
+
+chance_str_to_chance_256 = {}
+
+def chance_to_chance_256(chance):
+    chance_256 = chance_str_to_chance_256.get(chance)
+    if chance_256 is None:
+        exact_chance_256 = decimal.Decimal(chance.rstrip("%")) * CHANCE_DENOMINATOR / 100
+        if exact_chance_256 != exact_chance_256.to_integral_value():
+            raise RuntimeError(f"Chance {chance} is not a multiple of 1/{CHANCE_DENOMINATOR}!")
+
+        chance_256 = int(exact_chance_256)
+        chance_str_to_chance_256[chance] = chance_256
+
+    return chance_256
+
+class DropRateStore:
+    __slots__ = ("tables", "enemies", "rewards", "drop_rates", "reward_is_chip")
+
+    def __init__(self, input_tables=all_drop_rate_input_tables):
+        self.tables = SymbolTable()
+        self.enemies = SymbolTable()
+        self.rewards = SymbolTable()
+
+        columns = {name: [] for name in drop_rate_dtype.names}
+
+        for input_drop_table, hp_percent_drops in input_tables:
+            self.load_drop_table(input_drop_table, hp_percent_drops, columns)
+
+        self.drop_rates = np.empty(len(columns["table"]), dtype=drop_rate_dtype)
+        for name, column in columns.items():
+            self.drop_rates[name] = column
+
+        self.reward_is_chip = np.fromiter((reward != "NO DATA" and enemy_drops.is_chip_reward(reward) for reward in self.rewards.names), dtype=bool, count=len(self.rewards))
+
+    def load_drop_table(self, input_drop_table, hp_percent_drops, columns):
+        table_id = self.tables.intern(input_drop_table.version)
+        enemy_drop_tables = enemy_drops.EnemyDropTables(input_drop_table.filename, input_drop_table.ignored_enemies_filename, hp_percent_drops=hp_percent_drops)
+
+        table_column = columns["table"]
+        enemy_column = columns["enemy"]
+        reward_column = columns["reward"]
+        hp_percent_column = columns["hp_percent"]
+        rank_column = columns["rank"]
+        chance_column = columns["chance"]
+
+        cur_enemy_index = -1
+        skip_enemy = False
+
+        for drop_record in enemy_drop_tables.iter_drop_records():
+            if drop_record.enemy_index != cur_enemy_index:
+                cur_enemy_index = drop_record.enemy_index
+                skip_enemy = enemy_drop_tables.is_skipped_enemy(cur_enemy_index, drop_record.enemy_name)
+                enemy_id = self.enemies.intern(drop_record.enemy_name)
+
+            if skip_enemy:
+                continue
+
+            if drop_record.is_new_reward:
+                reward_id = self.rewards.intern(drop_record.reward)
+
+            hp_percent_bit = enemy_drops.hp_percent_to_bit[drop_record.hp_percent]
+            chance_256 = chance_to_chance_256(drop_record.chance)
+            ranks_mask = enemy_drops.rank_range_to_mask(drop_record.rank)
+
+            for rank in range(1, enemy_drops.MAX_RANK + 1):
+                if ranks_mask & (1 << rank):
+                    table_column.append(table_id)
+                    enemy_column.append(enemy_id)
+                    reward_column.append(reward_id)
+                    hp_percent_column.append(hp_percent_bit)
+                    rank_column.append(rank)
+                    chance_column.append(chance_256)
+
+    def select(self, table=None, enemy=None, reward=None, hp_percent=None, rank=None, min_chance=None, chips_only=False):
+        # returns a boolean mask over drop_rates. names are looked up in the
+        # symbol tables, min_chance is a probability in [0, 1] (exclusive)
+        drop_rates = self.drop_rates
+        selected = np.ones(len(drop_rates), dtype=bool)
+
+        if table is not None:
+            selected &= drop_rates["table"] == self.symbol_id(self.tables, table)
+        if enemy is not None:
+            selected &= drop_rates["enemy"] == self.symbol_id(self.enemies, enemy)
+        if reward is not None:
+            selected &= drop_rates["reward"] == self.symbol_id(self.rewards, reward)
+        if hp_percent is not None:
+            selected &= drop_rates["hp_percent"] == enemy_drops.hp_percent_to_bit[hp_percent]
+        if rank is not None:
+            if isinstance(rank, str):
+                rank = enemy_drops.DropEntry.rank_to_int(rank)
+            selected &= drop_rates["rank"] == rank
+        if min_chance is not None:
+            selected &= drop_rates["chance"] > min_chance * CHANCE_DENOMINATOR
+        if chips_only:
+            selected &= self.reward_is_chip[drop_rates["reward"]]
+
+        return selected
+
+    def query(self, **kwargs):
+        return self.drop_rates[self.select(**kwargs)]
+
+    def rows_to_tuples(self, rows):
+        return [
+            (self.tables[row["table"]], self.enemies[row["enemy"]], self.rewards[row["reward"]], enemy_drops.bit_to_hp_percent[row["hp_percent"]], enemy_drops.DropEntry.int_to_rank(int(row["rank"])), int(row["chance"]) / CHANCE_DENOMINATOR)
+            for row in rows
+        ]
+
+    @staticmethod
+    def symbol_id(symbol_table, name):
+        symbol_id = symbol_table.get(name)
+        if symbol_id is None:
+            # matches nothing, but keeps the result an empty selection instead of an error
+            return -1
+
+        return symbol_id
+
+def main():
+    drop_rate_store = DropRateStore()
+    rows = drop_rate_store.query(rank=10, min_chance=0.25, chips_only=True)
+    for row in drop_rate_store.rows_to_tuples(rows):
+        print(row)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
 import pathlib
 import re
-from sortedcontainers import SortedList
+import sys
 import itertools
+import os
+import concurrent.futures
 
-from line_reader import LineReader
+import chip_keys
+from parse_cache import hash_parts
+
+# bump whenever the parsed drop structures change, so that cached parses are invalidated
+ENEMY_DROPS_PARSER_VERSION = 5
+
+# below this many bytes of drop files, starting worker processes costs more than parsing serially
+PARALLEL_PARSE_MIN_BYTES = 256 * 1024
 
 class InputDropTable:
     __slots__ = ("filename", "ignored_enemies_filename", "version")
@@ -14,11 +23,57 @@ class InputDropTable:
         self.version = version
 
 class EnemyDropTablesAndVersion:
-    __slots__ = ("enemy_drop_tables", "version")
+    __slots__ = ("enemy_drop_tables", "version", "chip_drop_locations_by_key")
 
     def __init__(self, enemy_drop_tables, version):
         self.enemy_drop_tables = enemy_drop_tables
         self.version = version
+        self.chip_drop_locations_by_key = None
+
+    def index_chip_keys(self):
+        # the cached parse stays keyed by chip name, lookups go through packed chip keys
+        self.chip_drop_locations_by_key = {}
+        for chip_full, chip_drop_locations in self.enemy_drop_tables.all_chip_drop_locations.items():
+            chip_key = chip_keys.intern_chip_full(chip_full)
+            if chip_key != chip_keys.NO_CHIP_KEY:
+                self.chip_drop_locations_by_key[chip_key] = chip_drop_locations
+
+# how an enemy's drops of one chip compare across a game's versions
+DROP_DIFF_SHARED = 0
+DROP_DIFF_VERSION_EXCLUSIVE = 1
+DROP_DIFF_RANKS_DIFFER = 2
+
+class EnemyDropDiff:
+    __slots__ = ("enemy_name", "kind", "version_enemy_drops")
+
+    def __init__(self, enemy_name, kind, version_enemy_drops):
+        self.enemy_name = enemy_name
+        self.kind = kind
+        # [(version, EnemyDrop), ...] of the versions where the enemy drops the chip, in table order
+        self.version_enemy_drops = version_enemy_drops
+
+    @property
+    def versions(self):
+        return [version for version, enemy_drop in self.version_enemy_drops]
+
+    def __repr__(self):
+        return f"EnemyDropDiff(enemy_name={self.enemy_name}, kind={self.kind}, versions={self.versions})"
+
+bn2_hp_percents_to_name = {
+    frozenset((">=75%",)): "High",
+    frozenset(("<75%",)): "Mid",
+    frozenset(("<25%",)): "Low",
+    frozenset((">=75%", "<75%")): "High & Mid",
+    frozenset((">=75%", "<25%")): "High & Low",
+    frozenset(("<75%", "<25%")): "Mid & Low",
+    frozenset((">=75%", "<75%", "<25%")): "",
+}
+
+bn3_hp_percents_to_name = {
+    frozenset((">=37.5%",)): "High",
+    frozenset(("<37.5%",)): "Low",
+    frozenset((">=37.5%", "<37.5%")): "",
+}
 
 bn4to6_hp_percents_to_name = {
     frozenset((">37.5%",)): "High",
@@ -27,243 +82,195 @@ bn4to6_hp_percents_to_name = {
 }
 
 class GameDropTable:
-    __slots__ = ("game_enemy_drop_tables", "hp_percents_to_name", "game_number")
+    __slots__ = ("game_enemy_drop_tables", "hp_percents_to_name", "game_number", "location_texts", "drop_entry_texts", "drop_tables")
 
-    def __init__(self, hp_percents_to_name, game_number, *input_drop_tables):
+    def __init__(self, hp_percents_to_name, game_number, *input_drop_tables, parse_cache=None, max_workers=None):
         self.game_enemy_drop_tables = []
-        self.hp_percents_to_name = hp_percents_to_name
-        if self.hp_percents_to_name is not None:
+        if hp_percents_to_name is not None:
+            self.hp_percents_to_name = make_hp_percents_mask_to_name(hp_percents_to_name)
             hp_percent_drops = True
         else:
+            self.hp_percents_to_name = None
             hp_percent_drops = False
         self.game_number = game_number
+        # rendered location text (or None) per chip key, so each chip is rendered once however many pages ask for it
+        self.location_texts = {}
+        # rendered "HP band: ranks" text per (hp_percents_mask, ranks_mask)
+        self.drop_entry_texts = {}
+        # every distinct drop table of the game, as a tuple of DropEntries, indexed by drop_table_id
+        self.drop_tables = []
+
+        unparsed_enemy_drop_tables = []
 
         for input_drop_table in input_drop_tables:
             enemy_drop_tables = EnemyDropTables(input_drop_table.filename, input_drop_table.ignored_enemies_filename, hp_percent_drops=hp_percent_drops)
-            enemy_drop_tables.parse_enemy_drop_tables()
-            enemy_drop_tables.fold_same_drop_entries()
+            enemy_drop_tables.all_chip_drop_locations = None
+            if parse_cache is not None:
+                enemy_drop_tables.all_chip_drop_locations = parse_cache.get(*enemy_drops_cache_key(input_drop_table, hp_percent_drops))
+            if enemy_drop_tables.all_chip_drop_locations is None:
+                unparsed_enemy_drop_tables.append((input_drop_table, enemy_drop_tables))
+
             enemy_drop_tables_and_version = EnemyDropTablesAndVersion(enemy_drop_tables, input_drop_table.version)
             self.game_enemy_drop_tables.append(enemy_drop_tables_and_version)
 
+        parse_all_enemy_drop_tables([enemy_drop_tables for input_drop_table, enemy_drop_tables in unparsed_enemy_drop_tables], max_workers)
+
+        if parse_cache is not None:
+            for input_drop_table, enemy_drop_tables in unparsed_enemy_drop_tables:
+                parse_cache.put(*enemy_drops_cache_key(input_drop_table, hp_percent_drops), enemy_drop_tables.all_chip_drop_locations)
+
+        self.canonicalize_drop_tables()
+
+        for enemy_drop_tables_and_version in self.game_enemy_drop_tables:
+            enemy_drop_tables_and_version.index_chip_keys()
+
+    def canonicalize_drop_tables(self):
+        # every enemy with the same drop entries points at one tuple in self.drop_tables, and every
+        # enemy of the same drop table, whichever chip or version it's from, gets one new canonical
+        # EnemyDrop. the parsed EnemyDrops may be shared, so they are left as they are
+        drop_table_ids = {}
+        canonical_enemy_drops = {}
+
+        for enemy_drop_tables_and_version in self.game_enemy_drop_tables:
+            for chip_drop_locations in enemy_drop_tables_and_version.enemy_drop_tables.all_chip_drop_locations.values():
+                enemy_drops = chip_drop_locations.enemy_drops
+                for enemy_name, enemy_drop in enemy_drops.items():
+                    drop_table_key = tuple(itertools.chain.from_iterable((drop_entry.hp_percents_mask, drop_entry.ranks_mask) for drop_entry in enemy_drop.drop_entries))
+                    drop_table_id = drop_table_ids.get(drop_table_key)
+                    if drop_table_id is None:
+                        drop_table_id = len(self.drop_tables)
+                        drop_table_ids[drop_table_key] = drop_table_id
+                        self.drop_tables.append(tuple(enemy_drop.drop_entries))
+
+                    canonical_enemy_drop = canonical_enemy_drops.get((enemy_name, drop_table_id))
+                    if canonical_enemy_drop is None:
+                        canonical_enemy_drop = EnemyDrop.from_drop_table(enemy_name, enemy_drop.version, self.drop_tables[drop_table_id], drop_table_id)
+                        canonical_enemy_drops[(enemy_name, drop_table_id)] = canonical_enemy_drop
+
+                    enemy_drops[enemy_name] = canonical_enemy_drop
+
     def find_chip(self, chip_name, code):
-        chip_full = f"{chip_name} {code}"
-        output = ""
+        return self.find_chip_key(chip_keys.lookup_chip_key(chip_name, code))
+
+    def find_chip_key(self, chip_key):
+        location_texts = self.location_texts
+        if chip_key in location_texts:
+            return location_texts[chip_key]
+
+        return self.find_chip_keys((chip_key,))[chip_key]
+
+    def find_chip_keys(self, chip_key_list):
+        # {chip key: location text or None} of e.g. a whole library section. the chips that haven't
+        # been rendered yet are looked up in one pass over each version's index, then rendered together
+        location_texts = self.location_texts
+        new_chip_keys = [chip_key for chip_key in dict.fromkeys(chip_key_list) if chip_key not in location_texts]
+
+        if len(new_chip_keys) != 0:
+            all_version_chip_drop_locations = zip(*(
+                [enemy_drop_tables_and_version.chip_drop_locations_by_key.get(chip_key) for chip_key in new_chip_keys]
+                for enemy_drop_tables_and_version in self.game_enemy_drop_tables
+            ))
+            for chip_key, version_chip_drop_locations in zip(new_chip_keys, all_version_chip_drop_locations):
+                location_texts[chip_key] = self.render_chip_drop_locations(version_chip_drop_locations)
+
+        return {chip_key: location_texts[chip_key] for chip_key in chip_key_list}
+
+    def diff_chip(self, chip_name, code):
+        return self.diff_chip_key(chip_keys.lookup_chip_key(chip_name, code))
+
+    def diff_chip_key(self, chip_key):
+        return self.diff_chip_drop_locations([enemy_drop_tables_and_version.chip_drop_locations_by_key.get(chip_key) for enemy_drop_tables_and_version in self.game_enemy_drop_tables])
+
+    def diff_chip_drop_locations(self, version_chip_drop_locations):
+        # joins every version's drops of the chip on enemy name, in one pass over any number of versions.
+        # enemies are in the order they first show up in
+        version_enemy_drops_by_enemy = {}
+        for enemy_drop_tables_and_version, chip_drop_locations in zip(self.game_enemy_drop_tables, version_chip_drop_locations):
+            if chip_drop_locations is not None:
+                for enemy_name, enemy_drop in chip_drop_locations.enemy_drops.items():
+                    version_enemy_drops_by_enemy.setdefault(enemy_name, []).append((enemy_drop_tables_and_version.version, enemy_drop))
+
+        num_versions = len(self.game_enemy_drop_tables)
+        enemy_drop_diffs = []
+
+        for enemy_name, version_enemy_drops in version_enemy_drops_by_enemy.items():
+            first_structural_hash = version_enemy_drops[0][1].get_structural_hash()
+            if any(enemy_drop.get_structural_hash() != first_structural_hash for version, enemy_drop in version_enemy_drops[1:]):
+                kind = DROP_DIFF_RANKS_DIFFER
+            elif len(version_enemy_drops) == num_versions:
+                kind = DROP_DIFF_SHARED
+            else:
+                kind = DROP_DIFF_VERSION_EXCLUSIVE
 
-        chosen_version = None
-        chip_drop_locations = None
+            enemy_drop_diffs.append(EnemyDropDiff(enemy_name, kind, version_enemy_drops))
 
-        if len(self.game_enemy_drop_tables) == 1:
-            enemy_drop_tables = self.game_enemy_drop_tables[0].enemy_drop_tables
-            chip_drop_locations = enemy_drop_tables.all_chip_drop_locations.get(chip_full)
-        else:
-            enemy_drop_tables_1 = self.game_enemy_drop_tables[0].enemy_drop_tables
-            version_1 = self.game_enemy_drop_tables[0].version
-
-            enemy_drop_tables_2 = self.game_enemy_drop_tables[1].enemy_drop_tables
-            version_2 = self.game_enemy_drop_tables[1].version
-
-            chip_drop_locations_1 = enemy_drop_tables_1.all_chip_drop_locations.get(chip_full)
-            chip_drop_locations_2 = enemy_drop_tables_2.all_chip_drop_locations.get(chip_full)
-
-            if chip_drop_locations_1 is not None and chip_drop_locations_2 is not None:
-                if chip_drop_locations_1 != chip_drop_locations_2:
-                    #print(f"chip_drop_locations_1 B: {chip_drop_locations_1}")
-                    #print(f"chip_drop_locations_2 B: {chip_drop_locations_2}\n")
-
-                    if self.game_number in (3, 4):
-                        chip_location_parts = []
-
-                        for enemy_name_1, enemy_drop_1 in chip_drop_locations_1.enemy_drops.items():
-                            enemy_drop_2 = chip_drop_locations_2.enemy_drops.get(enemy_name_1)
-                            if enemy_drop_2 is None or len(enemy_drop_1.drop_entries) != 1 or len(enemy_drop_2.drop_entries) != 1:
-                                raise RuntimeError()
-
-                            drop_entry_1 = enemy_drop_1.drop_entries[0]
-                            drop_entry_2 = enemy_drop_2.drop_entries[0]
-
-                            if len(drop_entry_1.hp_percents) != 2 or len(drop_entry_2.hp_percents) != 2:
-                                #print(f"type(enemy_drop_1.drop_entries[0].hp_percents).__name__: {type(enemy_drop_1.drop_entries[0].hp_percents).__name__}")
-                                raise RuntimeError(f"{enemy_drop_1.drop_entries[0].hp_percents}, {enemy_drop_2.drop_entries[0].hp_percents}")
-
-                            drop_ranks_formatted_1 = drop_entry_1.format_ranks()
-                            drop_ranks_formatted_2 = drop_entry_2.format_ranks()
-
-                            enemy_and_rank = f"{enemy_name_1} ({{{{{version_1}2}}}}: {drop_ranks_formatted_1}; {{{{{version_2}2}}}}: {drop_ranks_formatted_2})"
-                            chip_location_parts.append(enemy_and_rank)
-
-                        output += ", ".join(chip_location_parts)
-
-                    elif self.game_number == 6:
-                        enemy_drops_1 = chip_drop_locations_1.enemy_drops
-                        enemy_drops_2 = chip_drop_locations_2.enemy_drops
-
-                        if chip_full == "FlshBom1 Q":
-                            output += "BigHat (LV5~10) ({{6CG2}}: Any HP, {{6CF2}}: HP > 37.5%)"
-                        else:
-                            if len(enemy_drops_1) == 1 and len(enemy_drops_2) == 2 or len(enemy_drops_1) == 2 and len(enemy_drops_2) == 1:
-                                if len(enemy_drops_1) == 1 and len(enemy_drops_2) == 2:
-                                    bigger_enemy_drops = enemy_drops_2
-                                    bigger_enemy_drops_version = version_2
-                                    smaller_enemy_drops = enemy_drops_1
-                                    smaller_enemy_drops_version = version_1
-                                else:
-                                    bigger_enemy_drops = enemy_drops_1
-                                    bigger_enemy_drops_version = version_1
-                                    smaller_enemy_drops = enemy_drops_2
-                                    smaller_enemy_drops_version = version_2
-
-                                chip_location_parts = []
-
-                                for bigger_enemy_name, bigger_enemy_drop in bigger_enemy_drops.items():
-                                    if len(bigger_enemy_drop.drop_entries) != 1:
-                                        raise RuntimeError()
-
-                                    smaller_enemy_drop = smaller_enemy_drops.get(bigger_enemy_name)
-                                    if smaller_enemy_drop is None:
-                                        bigger_drop_entry = bigger_enemy_drop.drop_entries[0]
-                                        if len(bigger_drop_entry.hp_percents) != 2:
-                                            raise RuntimeError()
-                                        bigger_drop_ranks_formatted = bigger_drop_entry.format_ranks()
-                                        enemy_and_rank = f"{{{{{bigger_enemy_drops_version}}}}} {bigger_enemy_name} ({bigger_drop_ranks_formatted})"
-                                        chip_location_parts.append(enemy_and_rank)
-                                    else:
-                                        if smaller_enemy_drop != bigger_enemy_drop:
-                                            raise RuntimeError()
-
-                                        smaller_drop_entry = smaller_enemy_drop.drop_entries[0]
-                                        if len(smaller_drop_entry.hp_percents) != 2:
-                                            raise RuntimeError()
-
-                                        smaller_drop_ranks_formatted = smaller_drop_entry.format_ranks()
-                                        enemy_and_rank = f"{bigger_enemy_name} ({smaller_drop_ranks_formatted})"
-                                        chip_location_parts.append(enemy_and_rank)
-
-                                output += ", ".join(chip_location_parts)
-                                #print(f"6 1,2 weird output: {chip_full}: {output}")
-                                        #print(f"smaller_enemy_drop: {smaller_enemy_drop}")
-                                        #print(f"bigger_enemy_drop: {bigger_enemy_drop}")
-                                        #if smaller_enemy_drop
-                                        #bigger_drop_ranks_formatted = 
-                                #print(f"chip_drop_locations_1 A: {chip_drop_locations_1}")
-                                #print(f"chip_drop_locations_2 A: {chip_drop_locations_2}\n")
-                            else:
-                                if chip_full == "FireBrn2 T":
-                                    output += "OldHeatr (LV9~S), {{6CG}} RarOldSt (LV9~S), RarOldS2 (LV7~10)"
-                                elif chip_full == "BblStar2 C":
-                                    output += "{{6CG}} StarFsh2 (LV9~S), RarStrFs (LV9~S), RarStrF2 (LV7~10)"
-                                elif chip_full == "CornSht2 C":
-                                    output += "MegaCorn (LV9~S), {{6CF}} RareCorn (LV9~S), {{6CF}} RarCorn2 (LV5~10)"
-                                elif chip_full == "CornSht2 D":
-                                    output += "MegaCorn (LV7~10), {{6CG}} RareCorn (LV9~S), {{6CG}} RarCorn2 (LV5~10)"
-                                elif chip_full == "FireHit2 R":
-                                    output += "Chumpy (LV7~10), {{6CG}} RarChampy (LV9~S), {{6CG}} RarChmpy2 (LV5~10)"
-                                elif chip_full == "FireHit2 S":
-                                    output += "Chumpy (LV9~S), {{6CF}} RarChampy (LV9~S), {{6CF}} RarChmpy2 (LV5~10)"
-                                elif chip_full == "Rflectr1 *":
-                                    output += "RareMttar ({{6CG2}}: LV5~7, {{6CF2}}: LV5~10)"
-                                elif chip_full == "Rflectr2 *":
-                                    output += "RareMttar ({{6CG2}}: LV7~S, {{6CF2}}: LV5~7), RareMttr2 ({{6CG2}}: LV9~11, {{6CF2}}: LV5~10)"
-                                elif chip_full == "Rflectr3 *":
-                                    output += "RareMttr2 ({{6CG2}}: LV7~S, {{6CF2}}: LV9~S)"
-                                else:
-                                    raise RuntimeError()
-                    else:
-                        raise RuntimeError()
-
-                    chip_drop_locations = None
-                else:
-                    chip_drop_locations = chip_drop_locations_1
-            elif chip_drop_locations_1 is not None and chip_drop_locations_2 is None:
-                chip_drop_locations = chip_drop_locations_1
-                chosen_version = version_1
-            elif chip_drop_locations_1 is None and chip_drop_locations_2 is not None:
-                chip_drop_locations = chip_drop_locations_2
-                chosen_version = version_2
+        return enemy_drop_diffs
+
+    def diff_all(self):
+        # {chip key: [EnemyDropDiff, ...]} of every chip whose drops aren't the same in all versions
+        num_versions = len(self.game_enemy_drop_tables)
+        structural_hashes_by_key = {}
+        for enemy_drop_tables_and_version in self.game_enemy_drop_tables:
+            for chip_key, chip_drop_locations in enemy_drop_tables_and_version.chip_drop_locations_by_key.items():
+                structural_hashes_by_key.setdefault(chip_key, set()).add(chip_drop_locations.get_structural_hash())
+
+        all_enemy_drop_diffs = {}
+        for chip_key, structural_hashes in structural_hashes_by_key.items():
+            if len(structural_hashes) == 1 and all(chip_key in enemy_drop_tables_and_version.chip_drop_locations_by_key for enemy_drop_tables_and_version in self.game_enemy_drop_tables):
+                continue
+
+            all_enemy_drop_diffs[chip_key] = self.diff_chip_key(chip_key)
+
+        return all_enemy_drop_diffs
+
+    def format_drop_entry(self, drop_entry):
+        drop_entry_key = (drop_entry.hp_percents_mask, drop_entry.ranks_mask)
+        drop_entry_text = self.drop_entry_texts.get(drop_entry_key)
+        if drop_entry_text is None:
+            drop_ranks_formatted = drop_entry.format_ranks()
+            hp_percent_name = self.hp_percents_to_name[drop_entry.hp_percents_mask]
+            if hp_percent_name == "":
+                drop_entry_text = drop_ranks_formatted
             else:
-                chip_drop_locations = None
+                drop_entry_text = f"{hp_percent_name}: {drop_ranks_formatted}"
+            self.drop_entry_texts[drop_entry_key] = drop_entry_text
+
+        return drop_entry_text
+
+    def format_enemy_drop(self, enemy_drop):
+        if self.hp_percents_to_name is not None:
+            return "; ".join(self.format_drop_entry(drop_entry) for drop_entry in enemy_drop.drop_entries)
+
+        if len(enemy_drop.drop_entries) != 1:
+            raise RuntimeError(f"{enemy_drop.enemy_name} has more than one drop entry without HP bands!")
+
+        return enemy_drop.drop_entries[0].format_ranks()
 
-        if chip_drop_locations is not None:
-            chip_location_parts = []
-            if chosen_version is not None:
-                chosen_version_str = f"{{{{{chosen_version}}}}} "
+    def render_chip_drop_locations(self, version_chip_drop_locations):
+        # version_chip_drop_locations: one chip's ChipDropLocations (or None) per version, in table order.
+        # a drop only some versions have is marked with their templates, and an enemy whose
+        # drops differ across versions lists each version's drops
+        chip_location_parts = []
+
+        for enemy_drop_diff in self.diff_chip_drop_locations(version_chip_drop_locations):
+            enemy_name = enemy_drop_diff.enemy_name
+            if enemy_drop_diff.kind == DROP_DIFF_RANKS_DIFFER:
+                version_drops_formatted = "; ".join(f"{{{{{version}2}}}}: {self.format_enemy_drop(enemy_drop)}" for version, enemy_drop in enemy_drop_diff.version_enemy_drops)
+                chip_location_parts.append(f"{enemy_name} ({version_drops_formatted})")
             else:
-                chosen_version_str = ""
-
-            for enemy_name, enemy_drop in chip_drop_locations.enemy_drops.items():
-                if self.hp_percents_to_name is not None:
-                    hp_percent_and_drop_ranks_formatted_parts = []
-
-                    for drop_entry in enemy_drop.drop_entries:
-                        drop_ranks_formatted = drop_entry.format_ranks()
-                        hp_percent_name = self.hp_percents_to_name[frozenset(drop_entry.hp_percents)]
-                        if hp_percent_name == "":
-                            hp_percent_and_drop_ranks_formatted = drop_ranks_formatted
-                        else:
-                            hp_percent_and_drop_ranks_formatted = f"{hp_percent_name}: {drop_ranks_formatted}"
-                        hp_percent_and_drop_ranks_formatted_parts.append(hp_percent_and_drop_ranks_formatted)
-
-                    all_hp_percent_and_drop_ranks_formatted = "; ".join(hp_percent_and_drop_ranks_formatted_parts)
-                    enemy_and_rank = f"{chosen_version_str}{enemy_name} ({all_hp_percent_and_drop_ranks_formatted})"
+                if enemy_drop_diff.kind == DROP_DIFF_VERSION_EXCLUSIVE:
+                    versions_str = "".join(f"{{{{{version}}}}} " for version in enemy_drop_diff.versions)
                 else:
-                    if len(enemy_drop.drop_entries) != 1:
-                        raise RuntimeError()
-
-                    drop_entry = enemy_drop.drop_entries[0]
-                    drop_ranks_formatted = drop_entry.format_ranks()
-                    enemy_and_rank = f"{enemy_name} ({drop_ranks_formatted})"
+                    versions_str = ""
 
-                chip_location_parts.append(enemy_and_rank)
+                enemy_drop = enemy_drop_diff.version_enemy_drops[0][1]
+                chip_location_parts.append(f"{versions_str}{enemy_name} ({self.format_enemy_drop(enemy_drop)})")
 
-            output += ", ".join(chip_location_parts)
-        elif output == "":
+        if len(chip_location_parts) == 0:
             return None
 
-        #print(f"{chip_full}: {output}")
-        return output
-                        #print(f"3,4 weird version output: {output}")
-                        #"VolGear (4RS: 
-                        #print(f"enemy_drop_1: {enemy_drop_1}, enemy_drop_2: {enemy_drop_2}")
-
-                    #if len(chip_drop_locations_1.enemy_drops) == 1 and len(chip_drop_locations_2.enemy_drops) == 1:
-                    #    enemy_name_1 = next(iter(chip_drop_locations_1.enemy_drops.keys()))
-                    #    enemy_name_2 = next(iter(chip_drop_locations_2.enemy_drops.keys()))
-                    #    if enemy_name_1 == enemy_name_2:
-                            
-                        
-                    #if game_number == 3:
-                    #    if chip_full == "Yo-Yo2 H":
-                    #        chip_location_parts = ["Yurt ({{3W2}}: LV7-10
-                        
-                    #enemy_drops = []
-                    #other_version_exclusive_drops = set(chip_drop_locations_2.enemy_drops.keys())
-                    #
-                    ## C: Dominerd (W: LV7-10; B: LV9-S) 
-                    #"""
-                    #enemy_drops = [
-                    #    EnemyDrop(
-                    #        name="Dominerd",
-                    #        drop_entries=[
-                    #            DropEntry(hp_percents={'<37.5%', '>=37.5%'}, ranks=7,8,9,10)
-                    #        ],
-                    #        version=3W
-                    #    ),
-                    #    EnemyDrop(
-                    #        name="Dominerd",
-                    #        drop_entries=[
-                    #            DropEntry(hp_percents={'<37.5%', '>=37.5%'}, ranks=9,10,11)
-                    #        ],
-                    #        version=3B
-                    #    )
-                    #]
-                    #"""
-                    #for enemy_name_1, enemy_drop_1 in chip_drop_locations_1.enemy_drops.items():
-                    #    enemy_drop_2 = chip_drop_locations_2.enemy_drops.get(enemy_name_1)
-                    #    if enemy_drop_2 is not None:
-                    #        other_version_exclusive_drops -= enemy_name_1
-                    #        for 
-
+        return ", ".join(chip_location_parts)
 
-        return output
 """
 Shockwav:
 H: Mettaur (Mid: LV9-S)
@@ -273,8 +280,224 @@ R: Mettaur (High: LV7-10)
 U: Mettaur (Low: LV7-10)
 """
 
-nontab_at_start_regex = re.compile(r"^[^\t]+")
-multitab_regex = re.compile(r"\t+")
+DROP_TABLE_SEPARATOR = "--------------------------------------------------------"
+
+hp_drop_record_regex = re.compile(r"^([^\t]*)\t+([^\t]+)\t+(?:([^\t]+)\t+)?([^\t]+)\t+([^\t]+)$")
+no_hp_drop_record_regex = re.compile(r"^([^\t]*)\t+(?:([^\t]+)\t+)?([^\t]+)\t+([^\t]+)$")
+
+def enemy_drops_cache_key(input_drop_table, hp_percent_drops):
+    return (
+        "enemy_drops", ENEMY_DROPS_PARSER_VERSION,
+        (input_drop_table.filename, input_drop_table.ignored_enemies_filename),
+        {"hp_percent_drops": hp_percent_drops}
+    )
+
+def use_process_pool(max_workers, input_filenames):
+    if max_workers is None or max_workers <= 1 or len(input_filenames) <= 1:
+        return False
+
+    return sum(os.path.getsize(input_filename) for input_filename in input_filenames) >= PARALLEL_PARSE_MIN_BYTES
+
+def map_drop_files(func, args_list, input_filenames, max_workers):
+    # func must be a module level function so that worker processes can find it
+    if not use_process_pool(max_workers, input_filenames):
+        return [func(*args) for args in args_list]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(max_workers, len(args_list))) as executor:
+        return list(executor.map(func, *zip(*args_list)))
+
+def parse_all_enemy_drop_tables(enemy_drop_tables_list, max_workers=None):
+    input_filenames = [enemy_drop_tables.input_filename for enemy_drop_tables in enemy_drop_tables_list]
+
+    if not use_process_pool(max_workers, input_filenames):
+        # a game's version files are mostly the same enemy blocks, which are parsed once for all of them
+        enemy_block_drops = {}
+        for enemy_drop_tables in enemy_drop_tables_list:
+            enemy_drop_tables.parse_enemy_drop_tables(enemy_block_drops)
+        return
+
+    packed_results = map_drop_files(
+        parse_packed_chip_drop_locations,
+        [(enemy_drop_tables.input_filename, enemy_drop_tables.ignored_enemies, enemy_drop_tables.hp_percent_drops, enemy_drop_tables.version) for enemy_drop_tables in enemy_drop_tables_list],
+        input_filenames,
+        max_workers
+    )
+
+    # workers can't share objects across files, so identical enemy drops are shared while unpacking instead
+    unpacked_enemy_drops = {}
+    for enemy_drop_tables, packed_chip_drop_locations in zip(enemy_drop_tables_list, packed_results):
+        enemy_drop_tables.all_chip_drop_locations = unpack_chip_drop_locations(packed_chip_drop_locations, enemy_drop_tables.version, unpacked_enemy_drops)
+
+def parse_packed_chip_drop_locations(input_filename, ignored_enemies, hp_percent_drops, version):
+    enemy_drop_tables = EnemyDropTables(input_filename, None, hp_percent_drops=hp_percent_drops, version=version)
+    enemy_drop_tables.ignored_enemies = ignored_enemies
+    return pack_chip_drop_locations(enemy_drop_tables.parse_enemy_drop_tables())
+
+# workers send back plain tuples of strings and ints instead of the object graph.
+# (chip, ((enemy, (hp_percents_mask, ranks_mask, hp_percents_mask, ranks_mask, ...)), ...))
+def pack_chip_drop_locations(all_chip_drop_locations):
+    return tuple(
+        (chip_full, tuple(
+            (enemy_name, tuple(itertools.chain.from_iterable((drop_entry.hp_percents_mask, drop_entry.ranks_mask) for drop_entry in enemy_drop.drop_entries)))
+            for enemy_name, enemy_drop in chip_drop_locations.enemy_drops.items()
+        ))
+        for chip_full, chip_drop_locations in all_chip_drop_locations.items()
+    )
+
+def unpack_chip_drop_locations(packed_chip_drop_locations, version, unpacked_enemy_drops=None):
+    # unpacked_enemy_drops: {(enemy, packed drop entries): EnemyDrop}, shared between the tables that should share objects
+    if unpacked_enemy_drops is None:
+        unpacked_enemy_drops = {}
+
+    all_chip_drop_locations = {}
+
+    for chip_full, packed_enemy_drops in packed_chip_drop_locations:
+        chip_drop_locations = ChipDropLocations(chip_full, version)
+        for enemy_name, packed_drop_entries in packed_enemy_drops:
+            enemy_drop = unpacked_enemy_drops.get((enemy_name, packed_drop_entries))
+            if enemy_drop is None:
+                enemy_drop = EnemyDrop(enemy_name, chip_drop_locations.version)
+                for i in range(0, len(packed_drop_entries), 2):
+                    enemy_drop.add_drop_entry(DropEntry(packed_drop_entries[i], packed_drop_entries[i + 1]))
+                unpacked_enemy_drops[(enemy_name, packed_drop_entries)] = enemy_drop
+
+            chip_drop_locations.add_enemy_drop(enemy_drop)
+
+        all_chip_drop_locations[chip_full] = chip_drop_locations
+
+    return all_chip_drop_locations
+
+class DropRecord:
+    __slots__ = ("enemy_index", "enemy_name", "hp_percent", "reward", "is_new_reward", "rank", "chance", "line_num")
+
+    def __init__(self, enemy_index, enemy_name, hp_percent, reward, is_new_reward, rank, chance, line_num):
+        self.enemy_index = enemy_index
+        self.enemy_name = enemy_name
+        self.hp_percent = hp_percent
+        self.reward = reward
+        self.is_new_reward = is_new_reward
+        self.rank = rank
+        self.chance = chance
+        self.line_num = line_num
+
+    def __repr__(self):
+        return f"DropRecord(enemy_index={self.enemy_index}, enemy_name={self.enemy_name}, hp_percent={self.hp_percent}, reward={self.reward}, is_new_reward={self.is_new_reward}, rank={self.rank}, chance={self.chance})"
+
+def iter_drop_records(f, filename, hp_percent_drops):
+    # yields one DropRecord per row; continuation rows carry over the reward
+    # of the row that started it. hp_percent is None for BN1 (no HP column)
+    for enemy_index, (first_line_num, block_lines) in enumerate(iter_enemy_blocks(f)):
+        yield from iter_enemy_block_drop_records(block_lines, first_line_num, enemy_index, filename, hp_percent_drops)
+
+def iter_enemy_blocks(f):
+    # yields (line number of the first line, lines) per enemy, i.e. every run of
+    # lines between two separators that has at least one row
+    line_num = 0
+
+    for line in f:
+        line_num += 1
+        if line.startswith("Enemy\t"):
+            break
+
+    for line in f:
+        line_num += 1
+        if line.startswith(DROP_TABLE_SEPARATOR):
+            break
+
+    block_lines = []
+    has_rows = False
+
+    for line in f:
+        line_num += 1
+        if line.startswith(DROP_TABLE_SEPARATOR):
+            if has_rows:
+                yield line_num - len(block_lines), block_lines
+            block_lines = []
+            has_rows = False
+        else:
+            block_lines.append(line)
+            has_rows = has_rows or line.strip() != ""
+
+    if has_rows:
+        yield line_num + 1 - len(block_lines), block_lines
+
+def iter_enemy_block_drop_records(block_lines, first_line_num, enemy_index, filename, hp_percent_drops):
+    if hp_percent_drops:
+        match_drop_record = hp_drop_record_regex.match
+    else:
+        match_drop_record = no_hp_drop_record_regex.match
+
+    enemy_name = None
+    hp_percent = None
+    reward = None
+
+    for line_num, line in enumerate(block_lines, first_line_num):
+        line = line.rstrip()
+        if line == "":
+            hp_percent = None
+            reward = None
+            continue
+
+        match_obj = match_drop_record(line)
+        if match_obj is None:
+            raise RuntimeError(f"At {filename}:{line_num}: Invalid drop table row {line!r}")
+
+        if hp_percent_drops:
+            cur_enemy_name, cur_hp_percent, cur_reward, rank, chance = match_obj.groups()
+            if hp_percent is not None and cur_hp_percent != hp_percent:
+                raise RuntimeError(f"At {filename}:{line_num}: HP band changed from {hp_percent} to {cur_hp_percent} without a blank line")
+            hp_percent = cur_hp_percent
+        else:
+            cur_enemy_name, cur_reward, rank, chance = match_obj.groups()
+
+        if enemy_name is None:
+            # every row and drop object of the enemy shares one name string
+            enemy_name = sys.intern(cur_enemy_name)
+
+        if cur_reward is not None:
+            reward = cur_reward
+            is_new_reward = True
+        elif reward is None:
+            raise RuntimeError(f"At {filename}:{line_num}: Expected a reward at the start of the drop table or HP band")
+        else:
+            is_new_reward = False
+
+        yield DropRecord(enemy_index, enemy_name, hp_percent, reward, is_new_reward, rank, chance, line_num)
+
+def parse_enemy_block(block_lines, first_line_num, enemy_index, filename, hp_percent_drops):
+    # (enemy name, ((chip, EnemyDrop), ...)) of one enemy block. the EnemyDrops
+    # may end up shared between tables, so they are never changed afterwards
+    enemy_name = None
+    block_enemy_drops = {}
+    drop_entry = None
+    enemy_drop = None
+
+    for drop_record in iter_enemy_block_drop_records(block_lines, first_line_num, enemy_index, filename, hp_percent_drops):
+        enemy_name = drop_record.enemy_name
+        if drop_record.is_new_reward:
+            if drop_entry is not None:
+                enemy_drop.add_drop_entry(drop_entry)
+
+            reward = drop_record.reward
+            if is_chip_reward(reward):
+                enemy_drop = block_enemy_drops.get(reward)
+                if enemy_drop is None:
+                    enemy_drop = EnemyDrop(enemy_name, None)
+                    block_enemy_drops[reward] = enemy_drop
+                drop_entry = DropEntry.from_hp_percent(drop_record.hp_percent)
+            else:
+                drop_entry = None
+
+        if drop_entry is not None:
+            drop_entry.add_rank(drop_record.rank)
+
+    if drop_entry is not None:
+        enemy_drop.add_drop_entry(drop_entry)
+
+    return enemy_name, tuple(block_enemy_drops.items())
+
+def is_chip_reward(reward):
+    return not reward.endswith("z") and not reward.startswith("HP+") and not reward.startswith("HP Max")
 
 class EnemyDropTables:
 
@@ -315,15 +538,11 @@ class EnemyDropTables:
     }
     """
 
-    __slots__ = ("line_reader", "hp_percent_drops", "cur_enemy_index", "all_chip_drop_locations", "ignored_enemies", "version")
+    __slots__ = ("input_filename", "hp_percent_drops", "all_chip_drop_locations", "ignored_enemies", "version")
 
     def __init__(self, input_filename, ignored_enemies_filename, hp_percent_drops=True, version=None):
-        with open(input_filename, "r") as f:
-            lines = f.read().splitlines()
-
-        self.line_reader = LineReader(lines, input_filename)
+        self.input_filename = input_filename
         self.hp_percent_drops = hp_percent_drops
-        self.cur_enemy_index = 0
         self.ignored_enemies = {}
         self.version = version
 
@@ -334,148 +553,68 @@ class EnemyDropTables:
                     enemy_name = enemy_name.strip()
                     self.ignored_enemies[int(index_as_str)] = enemy_name
 
+    def iter_drop_records(self):
+        with open(self.input_filename, "r") as f:
+            yield from iter_drop_records(f, self.input_filename, self.hp_percent_drops)
+
     def find_all_enemies(self):
-        self.line_reader.reset()
-        for line in self.line_reader:
-            if line.startswith("Enemy\t"):
-                break
+        enemy_names = []
 
-        READING_LINE_SEPARATOR = 0
-        READING_ENEMY_NAME = 1
+        with open(self.input_filename, "r") as f:
+            for line in f:
+                if line.startswith("Enemy\t"):
+                    break
 
-        state = READING_LINE_SEPARATOR
-        enemy_names = []
+            at_enemy_start = False
 
-        for line in self.line_reader:
-            if state == READING_LINE_SEPARATOR:
-                if line.startswith("--------------------------------------------------------"):
-                    state = READING_ENEMY_NAME
-            elif state == READING_ENEMY_NAME:
-                enemy_name = line.split("\t", maxsplit=1)[0]
-                enemy_names.append(enemy_name)
-                state = READING_LINE_SEPARATOR
+            for line in f:
+                if line.startswith(DROP_TABLE_SEPARATOR):
+                    at_enemy_start = True
+                elif at_enemy_start:
+                    enemy_names.append(line.split("\t", maxsplit=1)[0])
+                    at_enemy_start = False
 
         output = ""
         output = "".join(f"{enemy_index: >3d}: {enemy_name}\n" for enemy_index, enemy_name in enumerate(enemy_names))
         return output
 
-    def parse_enemy_drop_tables(self):
-        self.line_reader.reset()
-        
+    def parse_enemy_drop_tables(self, enemy_block_drops=None):
+        # enemy_block_drops: {block text: parse_enemy_block result}. blocks with the same text,
+        # here or in any other file parsed with the same dict, are parsed once and share their EnemyDrops
+        if enemy_block_drops is None:
+            enemy_block_drops = {}
+
         self.all_chip_drop_locations = {}
 
-        for line in self.line_reader:
-            if line.startswith("Enemy\t"):
-                break
+        with open(self.input_filename, "r") as f:
+            for enemy_index, (first_line_num, block_lines) in enumerate(iter_enemy_blocks(f)):
+                block_text = "".join(block_lines)
+                parsed_enemy_block = enemy_block_drops.get(block_text)
+                if parsed_enemy_block is None:
+                    parsed_enemy_block = parse_enemy_block(block_lines, first_line_num, enemy_index, self.input_filename, self.hp_percent_drops)
+                    enemy_block_drops[block_text] = parsed_enemy_block
+
+                enemy_name, block_enemy_drops = parsed_enemy_block
+                if self.is_skipped_enemy(enemy_index, enemy_name):
+                    continue
 
-        for line in self.line_reader:
-            if line.startswith("--------------------------------------------------------"):
-                break
+                for chip_full, enemy_drop in block_enemy_drops:
+                    self.get_chip_drop_locations(chip_full).add_enemy_drop(enemy_drop)
 
-        while True:
-            end_of_file = self.parse_enemy_drop_table()
-            if end_of_file:
-                break
+        return self.all_chip_drop_locations
 
-    def parse_enemy_drop_table(self):
-        line = self.line_reader.next()
-        enemy_name = line.split("\t", maxsplit=1)[0]
-        ignored_enemy = self.ignored_enemies.get(self.cur_enemy_index)
-        skip_enemy = False
+    def is_skipped_enemy(self, enemy_index, enemy_name):
+        ignored_enemy = self.ignored_enemies.get(enemy_index)
 
-        if ignored_enemy is not None: 
+        if ignored_enemy is not None:
             if enemy_name != ignored_enemy:
-                raise RuntimeError(f"Invalid ignored enemy index/name pair! Expected: ({self.cur_enemy_index}, {ignored_enemy}). Got: ({self.cur_enemy_index}, {enemy_name})")
+                raise RuntimeError(f"Invalid ignored enemy index/name pair! Expected: ({enemy_index}, {ignored_enemy}). Got: ({enemy_index}, {enemy_name})")
 
-            skip_enemy = True
+            return True
         elif enemy_name == "Unused":
-            skip_enemy = True
-            
-        if skip_enemy:
-            while True:
-                if line.startswith("--------------------------------------------------------"):
-                    break
-                line = self.line_reader.next().strip()
-                
+            return True
         else:
-            #print(f"line: {line}")
-            line = nontab_at_start_regex.sub("", line, count=1).strip()
-    
-            hp_percent = None
-    
-            FOUND_NEW_REWARD = 0
-            ON_CURRENT_REWARD = 1
-            SKIP_CURRENT_REWARD = 2
-    
-            state = FOUND_NEW_REWARD
-            drop_entry = None
-            reward = None
-    
-            while True:
-                if line.startswith("--------------------------------------------------------"):
-                    if state == ON_CURRENT_REWARD:
-                        enemy_drop.add_drop_entry(drop_entry)
-    
-                    break
-                elif line == "":
-                    if state == ON_CURRENT_REWARD:
-                        enemy_drop.add_drop_entry(drop_entry)
-                    line = self.line_reader.next().strip()
-                    hp_percent = None
-                    state = FOUND_NEW_REWARD
-                    continue
-
-                if self.hp_percent_drops:
-                    cur_hp_percent_and_cur_reward_parts = multitab_regex.split(line)
-                    #print(f"cur_hp_percent_and_cur_reward_parts: {cur_hp_percent_and_cur_reward_parts}")
-                    cur_hp_percent = cur_hp_percent_and_cur_reward_parts[0]
-                    cur_reward_parts = cur_hp_percent_and_cur_reward_parts[1:]
-                    if hp_percent is not None:
-                        if cur_hp_percent != hp_percent:
-                            raise RuntimeError()
-                    else:
-                        hp_percent = cur_hp_percent
-                else:
-                    #print(f"line: {line}")
-                    cur_reward_parts = multitab_regex.split(line)
-    
-                #print(f"cur_reward_parts: {cur_reward_parts}")
-    
-                if state == ON_CURRENT_REWARD:
-                    if len(cur_reward_parts) == 3:
-                        enemy_drop.add_drop_entry(drop_entry)
-                        state = FOUND_NEW_REWARD
-                    else:
-                        
-                        rank, percentage = cur_reward_parts
-                        drop_entry.add_rank(rank)
-                elif state == SKIP_CURRENT_REWARD and len(cur_reward_parts) == 3:
-                    state = FOUND_NEW_REWARD
-    
-                if state == FOUND_NEW_REWARD:
-                    if len(cur_reward_parts) == 3:
-                        reward, rank, percentage = cur_reward_parts
-                        if not reward.endswith("z") and not reward.startswith("HP+") and not reward.startswith("HP Max"):
-                            chip_drop_locations = self.get_chip_drop_locations(reward)
-                            enemy_drop = chip_drop_locations.get_enemy_drop(enemy_name)
-                            drop_entry = DropEntry.from_hp_percent(hp_percent)
-                            drop_entry.add_rank(rank)
-                            state = ON_CURRENT_REWARD
-                        else:
-                            state = SKIP_CURRENT_REWARD
-                            enemy_drop = None
-                    else:
-                        raise RuntimeError(cur_reward_parts)
-    
-                line = self.line_reader.next().strip()
-
-        self.cur_enemy_index += 1
-        return self.line_reader.is_end_of_file_or_last_line()
-
-    def fold_same_drop_entries(self):
-        for chip_name, chip_drop_locations in self.all_chip_drop_locations.items():
-            for enemy_name, enemy_drop in chip_drop_locations.enemy_drops.items():
-                enemy_drop.fold_drop_entries()
+            return False
 
     def get_chip_drop_locations(self, name):
         chip_drop_locations = self.all_chip_drop_locations.get(name)
@@ -504,13 +643,20 @@ class IgnoredEnemy:
             return self.__key() == other.__key()
         return NotImplemented
 
+def structural_hash(*parts):
+    # a content hash that is the same in every process, unlike hash() of strings
+    return int(hash_parts(*parts), 16)
+
+# structural hashes are computed on first use, once parsing is done, so that
+# comparing drops between versions is one integer compare
 class ChipDropLocations:
-    __slots__ = ("name", "enemy_drops", "version")
+    __slots__ = ("name", "enemy_drops", "version", "structural_hash")
 
     def __init__(self, name, version):
         self.name = name
         self.enemy_drops = {}
         self.version = None # version
+        self.structural_hash = None
 
     def get_enemy_drop(self, enemy_name):
         enemy_drop = self.enemy_drops.get(enemy_name)
@@ -518,145 +664,231 @@ class ChipDropLocations:
         if enemy_drop is None:
             enemy_drop = EnemyDrop(enemy_name, self.version)
             self.enemy_drops[enemy_name] = enemy_drop
+            self.structural_hash = None
 
         return enemy_drop
 
+    def add_enemy_drop(self, enemy_drop):
+        # enemy_drop may be shared with other tables, so an enemy listed twice is merged into a copy
+        cur_enemy_drop = self.enemy_drops.get(enemy_drop.enemy_name)
+        if cur_enemy_drop is not None:
+            merged_enemy_drop = EnemyDrop(enemy_drop.enemy_name, self.version)
+            for drop_entry in itertools.chain(cur_enemy_drop.drop_entries, enemy_drop.drop_entries):
+                merged_enemy_drop.add_drop_entry(DropEntry(drop_entry.hp_percents_mask, drop_entry.ranks_mask))
+            enemy_drop = merged_enemy_drop
+
+        self.enemy_drops[enemy_drop.enemy_name] = enemy_drop
+        self.structural_hash = None
+
+    def get_structural_hash(self):
+        if self.structural_hash is None:
+            # enemy order doesn't matter, same as comparing the enemy_drops dicts
+            self.structural_hash = structural_hash(self.name, *sorted(enemy_drop.get_structural_hash() for enemy_drop in self.enemy_drops.values()))
+
+        return self.structural_hash
+
     def __eq__(self, other):
         if isinstance(other, ChipDropLocations):
-            return self.name == other.name and self.enemy_drops == other.enemy_drops
+            return self.get_structural_hash() == other.get_structural_hash()
         return NotImplemented
 
+    def __hash__(self):
+        return self.get_structural_hash()
+
+    def equivalent_enemy_drops(self):
+        # [[EnemyDrop, ...], ...] of the enemies with the same drop table, in enemy order
+        equivalent_enemy_drops = {}
+        for enemy_drop in self.enemy_drops.values():
+            if enemy_drop.drop_table_id is None:
+                raise RuntimeError(f"{self.name} drops haven't been canonicalized! Load them through GameDropTable.")
+            equivalent_enemy_drops.setdefault(enemy_drop.drop_table_id, []).append(enemy_drop)
+
+        return list(equivalent_enemy_drops.values())
+
     def __repr__(self):
         return f"ChipDropLocations(name={self.name}, enemy_drops={self.enemy_drops})"
 
 class EnemyDrop:
-    __slots__ = ("enemy_name", "drop_entries", "version")
+    __slots__ = ("enemy_name", "drop_entries", "version", "drop_entry_indices", "structural_hash", "drop_table_id")
 
     def __init__(self, enemy_name, version):
         self.enemy_name = enemy_name
         self.drop_entries = []
         self.version = version
+        # {ranks_mask: index of the entry with those busting levels in drop_entries}
+        self.drop_entry_indices = {}
+        self.structural_hash = None
+        # index into GameDropTable.drop_tables, only set on canonical EnemyDrops
+        self.drop_table_id = None
+
+    @classmethod
+    def from_drop_table(cls, enemy_name, version, drop_entries, drop_table_id):
+        # drop_entries is a canonical drop table shared with other enemies, so the EnemyDrop is frozen
+        enemy_drop = cls(enemy_name, version)
+        enemy_drop.drop_entries = drop_entries
+        enemy_drop.drop_entry_indices = None
+        enemy_drop.drop_table_id = drop_table_id
+        return enemy_drop
+
+    def get_structural_hash(self):
+        if self.structural_hash is None:
+            self.structural_hash = structural_hash(self.enemy_name, *(f"{drop_entry.hp_percents_mask}:{drop_entry.ranks_mask}" for drop_entry in self.drop_entries))
+
+        return self.structural_hash
 
     def __eq__(self, other):
         if isinstance(other, EnemyDrop):
-            return self.enemy_name == other.enemy_name and self.drop_entries == other.drop_entries
+            return self.get_structural_hash() == other.get_structural_hash()
         return NotImplemented
 
+    def __hash__(self):
+        return self.get_structural_hash()
+
     def add_drop_entry(self, drop_entry):
-        self.drop_entries.append(drop_entry)
-
-    def fold_drop_entries(self):
-        if len(self.drop_entries) == 1:
-            return
-
-        elif len(self.drop_entries) == 2:
-            drop_entries_0 = self.drop_entries[0]
-            drop_entries_1 = self.drop_entries[1]
-            new_drop_entries = drop_entries_0.create_merged_if_ranks_equal(drop_entries_1)
-            if new_drop_entries is not None:
-                self.drop_entries = [new_drop_entries]
-        elif len(self.drop_entries) == 3:
-            # 0=1, 2
-            # 0=2, 1
-            # 1=2, 0
-            # 0=1=2
-
-            drop_entries_0 = self.drop_entries[0]
-            drop_entries_1 = self.drop_entries[1]
-            drop_entries_2 = self.drop_entries[2]
-
-            new_drop_entries = drop_entries_0.create_merged_if_ranks_equal(drop_entries_1)
-            if new_drop_entries is not None:
-                other_drop_entries = drop_entries_2
-            else:
-                new_drop_entries = drop_entries_0.create_merged_if_ranks_equal(drop_entries_2)
-                if new_drop_entries is not None:
-                    other_drop_entries = drop_entries_1
-                else:
-                    new_drop_entries = drop_entries_1.create_merged_if_ranks_equal(drop_entries_2)
-                    if new_drop_entries is not None:
-                        other_drop_entries = drop_entries_0
-                    else:
-                        other_drop_entries = None
-
-            if other_drop_entries is not None:
-                new_drop_entry_2 = new_drop_entries.create_merged_if_ranks_equal(other_drop_entries)
-                if new_drop_entry_2 is not None:
-                    self.drop_entries = [new_drop_entry_2]
-                else:
-                    self.drop_entries = [new_drop_entries, other_drop_entries]
-            else:
-                pass # keep self.drop_entries as is
+        if self.drop_table_id is not None:
+            raise RuntimeError(f"{self.enemy_name}'s drop table is canonicalized and can't take new entries!")
+
+        self.structural_hash = None
+        # entries with the same busting levels only differ by HP band, so they are folded
+        # into one new entry covering all of those bands as they arrive. an entry that now
+        # covers more bands than the ones before it moves ahead of them, which is the order
+        # the per-count fold gave (merged entries first)
+        drop_entries = self.drop_entries
+        drop_entry_index = self.drop_entry_indices.get(drop_entry.ranks_mask)
+        if drop_entry_index is None:
+            drop_entry_index = len(drop_entries)
+            drop_entries.append(drop_entry)
         else:
-            raise RuntimeError(f"drop_entries has len {len(self.drop_entries)}! enemy_name: {self.enemy_name}, drop_entries: {self.drop_entries}")
+            drop_entry = DropEntry.from_merge(drop_entries[drop_entry_index], drop_entry)
+
+        num_hp_percents = drop_entry.num_hp_percents()
+        while drop_entry_index > 0 and drop_entries[drop_entry_index - 1].num_hp_percents() < num_hp_percents:
+            drop_entries[drop_entry_index] = drop_entries[drop_entry_index - 1]
+            self.drop_entry_indices[drop_entries[drop_entry_index].ranks_mask] = drop_entry_index
+            drop_entry_index -= 1
+
+        drop_entries[drop_entry_index] = drop_entry
+        self.drop_entry_indices[drop_entry.ranks_mask] = drop_entry_index
 
     def __repr__(self):
         return f"EnemyDrop(name={self.enemy_name}, drop_entries={self.drop_entries})"
 
-class DropEntry:
-    __slots__ = ("hp_percents", "ranks", "version")
+# every HP band that appears in a drop table gets a fixed bit, so that masks
+# stay meaningful across runs (and inside cached parses). BN1 has no HP column
+hp_percent_to_bit = {
+    None: 1 << 0,
+    ">37.5%": 1 << 1,
+    "<=37.5%": 1 << 2,
+    ">=37.5%": 1 << 3,
+    "<37.5%": 1 << 4,
+    ">=75%": 1 << 5,
+    "<75%": 1 << 6,
+    "<25%": 1 << 7,
+}
 
-    def __init__(self, hp_percents, ranks):
-        self.hp_percents = hp_percents
-        self.ranks = ranks
-        self.version = None
+bit_to_hp_percent = {bit: hp_percent for hp_percent, bit in hp_percent_to_bit.items()}
 
-    def __eq__(self, other):
-        if isinstance(other, DropEntry):
-            return self.hp_percents == other.hp_percents and self.ranks == other.ranks
-        return NotImplemented
+def hp_percents_to_mask(hp_percents):
+    hp_percents_mask = 0
+    for hp_percent in hp_percents:
+        hp_percent_bit = hp_percent_to_bit.get(hp_percent)
+        if hp_percent_bit is None:
+            raise RuntimeError(f"Unknown HP band {hp_percent}! Add it to hp_percent_to_bit.")
+        hp_percents_mask |= hp_percent_bit
 
-    @classmethod
-    def from_hp_percent(cls, hp_percent):
-        return cls({hp_percent}, SortedList())
+    return hp_percents_mask
 
-    @classmethod
-    def from_merge(cls, drop_entry_1, drop_entry_2):
-        hp_percents = drop_entry_1.hp_percents | drop_entry_2.hp_percents
-        ranks = drop_entry_1.ranks
-        return cls(hp_percents, ranks)
+def mask_to_hp_percents(hp_percents_mask):
+    return frozenset(hp_percent for hp_percent_bit, hp_percent in bit_to_hp_percent.items() if hp_percents_mask & hp_percent_bit)
 
-    def add_rank(self, rank):
+def make_hp_percents_mask_to_name(hp_percents_to_name):
+    return {hp_percents_to_mask(hp_percents): name for hp_percents, name in hp_percents_to_name.items()}
+
+# busting levels are 1-10 then S, S+, S++ (11-13); rank n is bit n of a rank mask
+MAX_RANK = 13
+
+rank_str_to_mask = {}
+rank_mask_to_formatted = [None] * (1 << (MAX_RANK + 1))
+
+def format_rank_mask(ranks_mask):
+    formatted_ranks = rank_mask_to_formatted[ranks_mask]
+    if formatted_ranks is None:
+        rank_parts = []
+        rank = 1
+        while rank <= MAX_RANK:
+            if ranks_mask & (1 << rank):
+                start_rank = rank
+                while rank < MAX_RANK and ranks_mask & (1 << (rank + 1)):
+                    rank += 1
+
+                if start_rank == rank:
+                    rank_parts.append(DropEntry.int_to_rank(start_rank))
+                else:
+                    rank_parts.append(f"{DropEntry.int_to_rank(start_rank)}~{DropEntry.int_to_rank(rank)}")
+
+            rank += 1
+
+        formatted_ranks = "LV" + ", ".join(rank_parts)
+        rank_mask_to_formatted[ranks_mask] = formatted_ranks
+
+    return formatted_ranks
+
+def rank_range_to_mask(rank):
+    rank_mask = rank_str_to_mask.get(rank)
+    if rank_mask is None:
         if "-" in rank:
             start_rank, end_rank = rank.split(" - ", maxsplit=1)
 
             start_rank_num = DropEntry.rank_to_int(start_rank)
             end_rank_num = DropEntry.rank_to_int(end_rank)
 
-            for rank_num in range(start_rank_num, end_rank_num+1):
-                self.ranks.add(rank_num)
+            rank_mask = (1 << (end_rank_num + 1)) - (1 << start_rank_num)
         else:
-            self.ranks.add(DropEntry.rank_to_int(rank))
+            rank_mask = 1 << DropEntry.rank_to_int(rank)
 
-    def create_merged_if_ranks_equal(self, other):
-        if self.ranks == other.ranks:
-            return DropEntry.from_merge(self, other)
-        else:
-            return None
+        rank_str_to_mask[rank] = rank_mask
 
-    def format_ranks(self):
-        rank_parts = []
-        ranks_1_onwards_plus_sentinel = list(self.ranks[1:]) + [100]
-        start_rank = self.ranks[0]
-        prev_rank = start_rank
+    return rank_mask
 
-        for rank in ranks_1_onwards_plus_sentinel:
-            if rank != prev_rank + 1:
-                if start_rank == prev_rank:
-                    rank_parts.append(DropEntry.int_to_rank(start_rank))
-                else:
-                    end_rank = prev_rank
-                    rank_parts.append(f"{DropEntry.int_to_rank(start_rank)}~{DropEntry.int_to_rank(end_rank)}")
+class DropEntry:
+    __slots__ = ("hp_percents_mask", "ranks_mask")
 
-                start_rank = rank
+    def __init__(self, hp_percents_mask, ranks_mask):
+        self.hp_percents_mask = hp_percents_mask
+        self.ranks_mask = ranks_mask
 
-            prev_rank = rank
+    def __eq__(self, other):
+        if isinstance(other, DropEntry):
+            return self.hp_percents_mask == other.hp_percents_mask and self.ranks_mask == other.ranks_mask
+        return NotImplemented
 
-        output = ""
-        output += "LV"
-        output += ", ".join(rank_parts)
+    def __hash__(self):
+        return hash((self.hp_percents_mask, self.ranks_mask))
 
-        return output
+    @classmethod
+    def from_hp_percent(cls, hp_percent):
+        return cls(hp_percents_to_mask((hp_percent,)), 0)
+
+    @classmethod
+    def from_merge(cls, drop_entry_1, drop_entry_2):
+        return cls(drop_entry_1.hp_percents_mask | drop_entry_2.hp_percents_mask, drop_entry_1.ranks_mask)
+
+    @property
+    def hp_percents(self):
+        return mask_to_hp_percents(self.hp_percents_mask)
+
+    @property
+    def ranks(self):
+        return [rank for rank in range(1, MAX_RANK + 1) if self.ranks_mask & (1 << rank)]
+
+    def num_hp_percents(self):
+        return bin(self.hp_percents_mask).count("1")
+
+    def add_rank(self, rank):
+        self.ranks_mask |= rank_range_to_mask(rank)
+
+    def format_ranks(self):
+        return format_rank_mask(self.ranks_mask)
 
     @staticmethod
     def rank_to_int(rank):
@@ -681,9 +913,28 @@ class DropEntry:
             return str(rank)
 
     def __repr__(self):
-        return f"DropEntry(hp_percents={self.hp_percents}, ranks={','.join(str(rank) for rank in self.ranks)})"
+        return f"DropEntry(hp_percents={set(self.hp_percents)}, ranks={','.join(str(rank) for rank in self.ranks)})"
+
+def find_all_enemies_in_file(droprate_filename):
+    return EnemyDropTables(droprate_filename, None).find_all_enemies()
+
+def dump_enemy_drops_by_chips(droprate_filename, ignored_enemies_filename, hp_percent_drops):
+    enemy_drop_table = EnemyDropTables(droprate_filename, ignored_enemies_filename, hp_percent_drops=hp_percent_drops)
+    enemy_drop_table.parse_enemy_drop_tables()
+
+    output = []
+
+    for chip_name, chip_drop_locations in enemy_drop_table.all_chip_drop_locations.items():
+        output.append(f"{chip_name}:\n")
 
-def generate_droprate_enemies():
+        for enemy_name, enemy_drop in chip_drop_locations.enemy_drops.items():
+            output.append(f"  {enemy_name}:\n")
+            for drop_entry in enemy_drop.drop_entries:
+                output.append(f"    {set(drop_entry.hp_percents)}: {', '.join(str(rank) for rank in drop_entry.ranks)}\n")
+
+    return "".join(output)
+
+def generate_droprate_enemies(max_workers=None):
     droprate_filenames = [
         "bn1_drops.txt",
         "bn2_drops.txt",
@@ -697,19 +948,19 @@ def generate_droprate_enemies():
         "bn6f_drops.txt",
     ]
 
-    for droprate_filename in droprate_filenames:
-        enemy_drop_table = EnemyDropTables(droprate_filename, None)
-        enemies = enemy_drop_table.find_all_enemies()
+    all_enemies = map_drop_files(find_all_enemies_in_file, [(droprate_filename,) for droprate_filename in droprate_filenames], droprate_filenames, max_workers)
+
+    for droprate_filename, enemies in zip(droprate_filenames, all_enemies):
         droprate_stem = pathlib.Path(droprate_filename).stem
         output_filename = f"{droprate_stem}_enemies_out.txt"
         enemies = f"== {droprate_stem} ==\n" + enemies
         with open(output_filename, "w+") as f:
             f.write(enemies)
 
-def test_dump_bn1_enemy_drops():
+def test_dump_bn1_enemy_drops(max_workers=None):
     droprate_filenames = [
-        ("bn1_drops.txt", "bn1_ignored_enemies.txt"),
-        ("bn2_drops.txt", None),
+        ("bn1_drops.txt", "bn1_ignored_enemies.txt", False),
+        ("bn2_drops.txt", None, True),
         #"bn3w_drops.txt",
         #"bn3b_drops.txt",
         #"bn4rs_drops.txt",
@@ -720,29 +971,14 @@ def test_dump_bn1_enemy_drops():
         #"bn6f_drops.txt",
     ]
 
-    hp_percent_drops = False
-
-    for droprate_filename, ignored_enemies_filename in droprate_filenames:
-        enemy_drop_table = EnemyDropTables(droprate_filename, ignored_enemies_filename, hp_percent_drops=hp_percent_drops)
-        enemy_drop_table.parse_enemy_drop_tables()
-    
-        output = []
-    
-        for chip_name, chip_drop_locations in enemy_drop_table.all_chip_drop_locations.items():
-            output.append(f"{chip_name}:\n")
-    
-            for enemy_name, enemy_drop in chip_drop_locations.enemy_drops.items():
-                output.append(f"  {enemy_name}:\n")
-                for drop_entry in enemy_drop.drop_entries:
-                    output.append(f"    {drop_entry.hp_percents}: {', '.join(str(rank) for rank in drop_entry.ranks)}\n")
+    all_output = map_drop_files(dump_enemy_drops_by_chips, droprate_filenames, [droprate_filename for droprate_filename, ignored_enemies_filename, hp_percent_drops in droprate_filenames], max_workers)
 
+    for (droprate_filename, ignored_enemies_filename, hp_percent_drops), output in zip(droprate_filenames, all_output):
         droprate_stem = pathlib.Path(droprate_filename).stem
         output_filename = f"{droprate_stem}_by_chips.txt"
 
         with open(output_filename, "w+") as f:
-            f.write("".join(output))
-
-        hp_percent_drops = True
+            f.write(output)
 
 def main():
     MODE = 1
@@ -1,8 +1,11 @@
 import json
-import functools
 import re
 
+import chip_keys
 import enemy_drops
+from parse_cache import ParseCache
+from chip_library import load_chip_library
+from chip_traders import ChipTraders
 
 PAGE_HEADER = """\
 {{nw|TODO: Add info and improve template.}}
@@ -33,65 +36,6 @@ HALL_TRADER_TEXT = ""
 OLD_MINE_TRADER_TEXT = ""
 BUGFRAG_TRADER_TEXT = ""
 
-def convert_v2_format_to_v1(chips_v2):
-    chips = []
-
-    for v2_chip_full in chips_v2["results"].values():
-        v2_chip = v2_chip_full["printouts"]
-
-        chip = {
-            "name": {
-                "en": None
-            },
-            "codes": "".join(v2_chip["codes"]),
-            "index": v2_chip["index"][0],
-            "section": v2_chip["section"][0].lower()
-        }
-
-        v2_chip_name = v2_chip["name"][0]
-
-        #if v2_chip_name == "AquaMan":
-        #    v2_chip_name = "SpoutMan"
-        #elif v2_chip_name == "AquaManEX":
-        #    v2_chip_name = "SpoutMnEX"
-        #elif v2_chip_name == "AquaManSP":
-        #    v2_chip_name = "SpoutMnSP"
-
-        chip["name"]["en"] = v2_chip_name
-
-        chips.append(chip)
-
-    return chips
-
-def is_library_chip(chip):
-    if chip is None:
-        return False
-
-    if not isinstance(chip.get("index"), int):
-        return False
-
-    if chip.get("section") != "standard":
-        return False
-
-    return True
-
-version_to_ordinal = {
-    "white": 0,
-    "blue": 1,
-    None: None
-}
-
-def compare_chips(a, b):
-    a_index = a.get("index")
-    b_index = b.get("index")
-
-    if a_index < b_index:
-        return -1
-    elif a_index > b_index:
-        return 1
-    else:
-        raise RuntimeError(f"Bad chip comparison! a: {a}, b: {b}")
-
 def get_basic_chip_id_name(chip):
     return f"{chip['index']:03d}", chip["name"]["en"]
 
@@ -117,19 +61,34 @@ def get_bn2_chip_id_name(chip):
 
     return chip_id, chip_name
 
+# every chip also has an asterisk row
+def get_bn2_chip_codes(chip):
+    chip_codes = chip["codes"]
+    if not chip_codes.endswith("*"):
+        chip_codes += "*"
+
+    return chip_codes
+
 def gen_basic_chiploc_table(chips, game_drop_table=None, chip_id_name_func=get_basic_chip_id_name, chip_traders=None, is_free_battle_chip=False):
     output = []
+    chip_id_names = [chip_id_name_func(chip) for chip in chips]
 
-    for chip in chips:
-        id, name = chip_id_name_func(chip)
+    if game_drop_table is not None:
+        # the whole section's drop locations in one batch
+        drop_location_texts = game_drop_table.find_chip_keys([
+            chip_keys.pack_chip_key(chip_keys.chip_name_id(name), code)
+            for chip, (id, name) in zip(chips, chip_id_names)
+            for code in get_bn2_chip_codes(chip)
+        ])
+
+    for chip, (id, name) in zip(chips, chip_id_names):
         cur_output = CHIP_LOCATION_TEMPLATE_PART_1.format(id=id, name=name)
         output.append(cur_output)
-        chip_codes = chip["codes"]
-        if not chip_codes.endswith("*"):
-            chip_codes += "*"
+        chip_codes = get_bn2_chip_codes(chip)
 
+        chip_name_id = chip_keys.chip_name_id(name)
         for code in chip_codes:
-            original_code = code
+            chip_key = chip_keys.pack_chip_key(chip_name_id, code)
 
             if code == "*":
                 code = "asterisk"
@@ -137,7 +96,7 @@ def gen_basic_chiploc_table(chips, game_drop_table=None, chip_id_name_func=get_b
             location_text_parts = []
             location_text_parts.append(DUMMY_LOCATION_TEXT)
 
-            enemy_chip_location = game_drop_table.find_chip(name, original_code)
+            enemy_chip_location = drop_location_texts[chip_key]
             if enemy_chip_location is not None:
                 location_text_parts.append(enemy_chip_location)
 
@@ -156,149 +115,26 @@ def gen_basic_chiploc_table(chips, game_drop_table=None, chip_id_name_func=get_b
 
     return output
 
-JP_HAS_STAR_CODE = 0
-JP_NO_STAR_CODE = 1
-JP_STAR_CODE_IRRELEVANT = 2
-
-class ChipTraderEntry:
-    __slots__ = ("name", "codes", "version", "jp_star_code")
-
-    def __init__(self, line):
-        #if "[RS]" in line:
-        #    self.version = "white"
-        #elif "[BM]" in line:
-        #    self.version = "blue"
-        #else:
-        self.version = None
-
-        if "[J*Y]" in line:
-            self.jp_star_code = JP_HAS_STAR_CODE
-        elif "[J*N]" in line:
-            self.jp_star_code = JP_NO_STAR_CODE
-        else:
-            self.jp_star_code = JP_STAR_CODE_IRRELEVANT
-
-        line = line.replace("[RS]", "").replace("[BM]", "").replace("[J*Y]", "").replace("[J*N]", "").replace("[", "").replace("]", "").strip()
-        self.name, self.codes = line.rsplit(maxsplit=1)
-        if self.name == "DrkHole":
-            self.name = "Hole"
-
-class ChipTrader:
-    __slots__ = ("name", "chips")
-
-    def __init__(self, filename):
-        self.chips = {}
-
-        with open(filename, "r") as f:
-            line = next(f)
-            self.name = line.strip()
-
-            for line in f:
-                entry = ChipTraderEntry(line)
-                self.chips[entry.name] = entry
-
-    def get_trader_text_if_has_chip(self, chip):
-        chip_name = chip["name"]["en"]
-        entry = self.chips.get(chip_name)
-        if entry is not None:
-            trader_text = ""
-            if entry.version is not None:
-                version_text = f"{version_to_game_version[entry.version]}"
-            else:
-                version_text = None
-
-            trader_text += self.name
-            all_codes = set(chip["codes"])
-            #print(f"chip_name: {chip_name}, entry.codes: {entry.codes}")
-            entry_codes = set(entry.codes)
-            missing_codes = all_codes - entry_codes
-            if "*" in missing_codes and "*" in all_codes:
-                naturally_missing_star_code = True
-            else:
-                naturally_missing_star_code = False
-            if len(missing_codes) > 1:
-                raise RuntimeError()
-            elif len(missing_codes) == 1 and "*" not in missing_codes:
-                raise RuntimeError()
-
-            if self.name == "RetroChip Trader" and chip_name == "Mine":
-                missing_code_text = " (Has {{code|*}})"
-            else:
-                missing_code_text = ""
-            #missing_codes_parts = [("{{code|%s}}" % code) for code in missing_codes]
-            #if entry.jp_star_code == JP_NO_STAR_CODE:
-            #    missing_code_text = " ({{JP2}}: No {{code|*}})"
-            #elif naturally_missing_star_code:
-            #    missing_code_text = " (No {{code|*}})"
-            #else:
-            #    missing_code_text = ""
-
-            trader_text += missing_code_text
-
-            return trader_text, version_text
-        else:
-            return None, None
-
-class ChipTraders:
-    __slots__ = ("traders",)
-
-    def __init__(self, filenames):
-        self.traders = []
-        for filename in filenames:
-            self.traders.append(ChipTrader(filename))
-
-    def find_traders_for_chip(self, chip):
-        found_trader_texts = []
-        found_version_text = None
-        for trader in self.traders:
-            cur_trader_text, version_text = trader.get_trader_text_if_has_chip(chip)
-            if cur_trader_text is not None:
-                found_trader_texts.append(cur_trader_text)
-                if version_text is not None:
-                    found_version_text = version_text
-
-        if len(found_trader_texts) != 0:
-            return ", ".join(found_trader_texts), found_version_text
-        else:
-            return None, None
-
-bn2_hp_percents_to_name = {
-    frozenset((">=75%",)): "High",
-    frozenset(("<75%",)): "Mid",
-    frozenset(("<25%",)): "Low",
-    frozenset((">=75%", "<75%")): "High & Mid",
-    frozenset((">=75%", "<25%")): "High & Low",
-    frozenset(("<75%", "<25%")): "Mid & Low",
-    frozenset((">=75%", "<75%", "<25%")): "",
-}
-
 def main():
-    with open("bn2_chips_v2.json", "r") as f:
-        chips_v2 = json.load(f)
-
-    chips = convert_v2_format_to_v1(chips_v2)
-    library_chips = list(filter(is_library_chip, chips))
+    parse_cache = ParseCache()
+    chip_library = load_chip_library(2, parse_cache)
+    library_chips = chip_library.chips
 
     with open("bn2_library_chips.json", "w+") as f:
         json.dump(library_chips, f, indent=2)
 
-    chip_traders = ChipTraders(("marine_harbor_lobby_trader.txt", "netopia_town_trader.txt", "marine_harbor_trader.txt", "acdc_metro_station_trader.txt", "retrochip_trader.txt"))
-
-    #remaining_sections = set(chip.get("section") for chip in library_chips)
-    chips_by_section = {}
-
-    for section in ("standard",):
-        chips_by_section[section] = [chip for chip in library_chips if chip.get("section") == section]
-        sort_func = lambda x: x.get("index")
-
-        chips_by_section[section].sort(key=sort_func)
+    chip_traders = ChipTraders(
+        ("marine_harbor_lobby_trader.txt", "netopia_town_trader.txt", "marine_harbor_trader.txt", "acdc_metro_station_trader.txt", "retrochip_trader.txt"),
+        name_aliases={"DrkHole": "Hole"},
+        trader_chip_notes={("RetroChip Trader", "Mine"): " (Has {{code|*}})"}
+    )
 
-    game_drop_table = enemy_drops.GameDropTable(bn2_hp_percents_to_name, 2, enemy_drops.InputDropTable("bn2_drops.txt", "bn2_ignored_enemies.txt", None))
+    game_drop_table = enemy_drops.GameDropTable(enemy_drops.bn2_hp_percents_to_name, 2, enemy_drops.InputDropTable("bn2_drops.txt", "bn2_ignored_enemies.txt", None), parse_cache=parse_cache)
 
     output = []
     output.append(PAGE_HEADER)
 
-    standard = chips_by_section["standard"]
+    standard = chip_library.section("standard")
     output.append("==Chips==\n")
     output.extend(gen_basic_chiploc_table(standard, game_drop_table=game_drop_table, chip_traders=chip_traders, chip_id_name_func=get_bn2_chip_id_name))
 
@@ -1,8 +1,11 @@
 import json
-import functools
 import re
 
+import chip_keys
 import enemy_drops
+from parse_cache import ParseCache
+from chip_library import load_chip_library
+from chip_traders import ChipTraders
 
 PAGE_HEADER = """\
 {{nw|TODO: Add info and improve template.}}
@@ -33,98 +36,6 @@ HALL_TRADER_TEXT = ""
 OLD_MINE_TRADER_TEXT = ""
 BUGFRAG_TRADER_TEXT = ""
 
-def convert_v2_format_to_v1(chips_v2):
-    chips = []
-
-    for v2_chip_full in chips_v2["results"].values():
-        v2_chip = v2_chip_full["printouts"]
-
-        chip = {
-            "name": {
-                "en": None
-            },
-            "codes": "".join(v2_chip["codes"]),
-            "index": v2_chip["index"][0],
-            "section": v2_chip["section"][0].lower()
-        }
-
-        v2_chip_name = v2_chip["name"][0]
-
-        #if v2_chip_name == "AquaMan":
-        #    v2_chip_name = "SpoutMan"
-        #elif v2_chip_name == "AquaManEX":
-        #    v2_chip_name = "SpoutMnEX"
-        #elif v2_chip_name == "AquaManSP":
-        #    v2_chip_name = "SpoutMnSP"
-
-        chip["name"]["en"] = v2_chip_name
-
-        v2_version_list = v2_chip["version"]
-        if len(v2_version_list) != 0:
-            v2_version = v2_version_list[0]
-            if v2_version == "White":
-                version = "white"
-            elif v2_version == "Blue":
-                version = "blue"
-            else:
-                version = None
-        else:
-            version = None
-
-        chip["version"] = version
-        chips.append(chip)
-
-    return chips
-
-def is_library_chip(chip):
-    if chip is None:
-        return False
-
-    if not isinstance(chip.get("index"), int):
-        return False
-
-    if chip.get("section") not in ("standard", "mega", "giga"):
-        return False
-
-    return True
-
-version_to_ordinal = {
-    "white": 0,
-    "blue": 1,
-    None: None
-}
-
-def compare_chips(a, b):
-    a_index = a.get("index")
-    b_index = b.get("index")
-
-    if a_index < b_index:
-        return -1
-    elif a_index > b_index:
-        return 1
-    else:
-        a_version = version_to_ordinal[a.get("version")]
-        b_version = version_to_ordinal[b.get("version")]
-
-        if a_version < b_version:
-            return -1
-        elif a_version > b_version:
-            return 1
-        else:
-            raise RuntimeError(f"Bad chip comparison! a: {a}, b: {b}")
-
-def giga_sort_index(chip):
-    chip_index = chip.get("index")
-    if chip["name"]["en"] == "BassGS":
-        return 11
-    elif 1 <= chip_index <= 5:
-        if chip.get("version") == "white":
-            return chip_index
-        else:
-            return chip_index + 5
-    else:
-        return chip_index - 6 + 12
-
 def get_basic_chip_id_name(chip):
     return f"{chip['index']:03d}", chip["name"]["en"]
 
@@ -169,13 +80,22 @@ def get_unregistered_secret_chip_id_name(chip):
 
 def gen_basic_chiploc_table(chips, game_drop_table=None, chip_id_name_func=get_basic_chip_id_name, chip_traders=None, is_free_battle_chip=False):
     output = []
+    chip_id_names = [chip_id_name_func(chip) for chip in chips]
+
+    if game_drop_table is not None:
+        # the whole section's drop locations in one batch
+        drop_location_texts = game_drop_table.find_chip_keys([
+            chip_keys.pack_chip_key(chip_keys.chip_name_id(name), code)
+            for chip, (id, name) in zip(chips, chip_id_names)
+            for code in chip["codes"]
+        ])
 
-    for chip in chips:
-        id, name = chip_id_name_func(chip)
+    for chip, (id, name) in zip(chips, chip_id_names):
         cur_output = CHIP_LOCATION_TEMPLATE_PART_1.format(id=id, name=name)
         output.append(cur_output)
+        chip_name_id = chip_keys.chip_name_id(name)
         for code in chip["codes"]:
-            original_code = code
+            chip_key = chip_keys.pack_chip_key(chip_name_id, code)
             if code == "*":
                 code = "asterisk"
 
@@ -185,7 +105,7 @@ def gen_basic_chiploc_table(chips, game_drop_table=None, chip_id_name_func=get_b
             location_text_parts.append(DUMMY_LOCATION_TEXT)
 
             if game_drop_table is not None:
-                enemy_chip_location = game_drop_table.find_chip(name, original_code)
+                enemy_chip_location = drop_location_texts[chip_key]
                 if enemy_chip_location is not None:
                     location_text_parts.append(enemy_chip_location)
 
@@ -204,169 +124,46 @@ def gen_basic_chiploc_table(chips, game_drop_table=None, chip_id_name_func=get_b
 
     return output
 
-JP_HAS_STAR_CODE = 0
-JP_NO_STAR_CODE = 1
-JP_STAR_CODE_IRRELEVANT = 2
-
-class ChipTraderEntry:
-    __slots__ = ("name", "codes", "version", "jp_star_code")
-
-    def __init__(self, line):
-        #if "[RS]" in line:
-        #    self.version = "white"
-        #elif "[BM]" in line:
-        #    self.version = "blue"
-        #else:
-        self.version = None
-
-        if "[J*Y]" in line:
-            self.jp_star_code = JP_HAS_STAR_CODE
-        elif "[J*N]" in line:
-            self.jp_star_code = JP_NO_STAR_CODE
-        else:
-            self.jp_star_code = JP_STAR_CODE_IRRELEVANT
-
-        line = line.replace("[RS]", "").replace("[BM]", "").replace("[J*Y]", "").replace("[J*N]", "").replace("[", "").replace("]", "").strip()
-        self.name, self.codes = line.rsplit(maxsplit=1)
-        if self.name == "DrkHole":
-            self.name = "Hole"
-
-class ChipTrader:
-    __slots__ = ("name", "chips")
-
-    def __init__(self, filename):
-        self.chips = {}
-
-        with open(filename, "r") as f:
-            line = next(f)
-            self.name = line.strip()
-
-            for line in f:
-                entry = ChipTraderEntry(line)
-                self.chips[entry.name] = entry
-
-    def get_trader_text_if_has_chip(self, chip):
-        chip_name = chip["name"]["en"]
-        entry = self.chips.get(chip_name)
-        if entry is not None:
-            trader_text = ""
-            if entry.version is not None:
-                version_text = f"{version_to_game_version[entry.version]}"
-            else:
-                version_text = None
-
-            trader_text += self.name
-            all_codes = set(chip["codes"])
-            #print(f"chip_name: {chip_name}, entry.codes: {entry.codes}")
-            entry_codes = set(entry.codes)
-            missing_codes = all_codes - entry_codes
-            if "*" in missing_codes and "*" in all_codes:
-                naturally_missing_star_code = True
-            else:
-                naturally_missing_star_code = False
-            if len(missing_codes) > 1:
-                raise RuntimeError()
-            elif len(missing_codes) == 1 and "*" not in missing_codes:
-                raise RuntimeError()
-
-            missing_code_text = ""
-            #missing_codes_parts = [("{{code|%s}}" % code) for code in missing_codes]
-            #if entry.jp_star_code == JP_NO_STAR_CODE:
-            #    missing_code_text = " ({{JP2}}: No {{code|*}})"
-            #elif naturally_missing_star_code:
-            #    missing_code_text = " (No {{code|*}})"
-            #else:
-            #    missing_code_text = ""
-
-            trader_text += missing_code_text
-
-            return trader_text, version_text
-        else:
-            return None, None
-
-class ChipTraders:
-    __slots__ = ("traders",)
-
-    def __init__(self, filenames):
-        self.traders = []
-        for filename in filenames:
-            self.traders.append(ChipTrader(filename))
-
-    def find_traders_for_chip(self, chip):
-        found_trader_texts = []
-        found_version_text = None
-        for trader in self.traders:
-            cur_trader_text, version_text = trader.get_trader_text_if_has_chip(chip)
-            if cur_trader_text is not None:
-                found_trader_texts.append(cur_trader_text)
-                if version_text is not None:
-                    found_version_text = version_text
-
-        if len(found_trader_texts) != 0:
-            return ", ".join(found_trader_texts), found_version_text
-        else:
-            return None, None
-
-bn3_hp_percents_to_name = {
-    frozenset((">=37.5%",)): "High",
-    frozenset(("<37.5%",)): "Low",
-    frozenset((">=37.5%", "<37.5%")): "",
-}
-
 def main():
-    with open("bn3_chips_v2.json", "r") as f:
-        chips_v2 = json.load(f)
-
-    chips = convert_v2_format_to_v1(chips_v2)
-    library_chips = list(filter(is_library_chip, chips))
+    parse_cache = ParseCache()
+    chip_library = load_chip_library(3, parse_cache)
+    library_chips = chip_library.chips
 
     with open("bn3_library_chips.json", "w+") as f:
         json.dump(library_chips, f, indent=2)
 
-    chip_traders = ChipTraders(("bn3_higsbys_trader.txt", "tv_station_hall_1_trader.txt", "hospital_lobby_trader.txt", "bn3_bugfrag_trader.txt"))
-
-    #remaining_sections = set(chip.get("section") for chip in library_chips)
-    chips_by_section = {}
-
-    for section in ("standard", "mega", "giga"):
-        chips_by_section[section] = [chip for chip in library_chips if chip.get("section") == section]
-        sort_func = lambda x: x.get("index")
-        if section == "giga":
-            gigas_full = chips_by_section["giga"]
-            gigas_white = sorted([chip for chip in gigas_full if chip.get("version") == "white"], key=lambda x: x.get("index"))
-            gigas_blue = sorted([chip for chip in gigas_full if chip.get("version") == "blue"], key=lambda x: x.get("index"))
-            gigas_both = sorted([chip for chip in gigas_full if chip.get("version") is None], key=lambda x: x.get("index"))
-            chips_by_section["giga_white"] = gigas_white
-            chips_by_section["giga_blue"] = gigas_blue
-            chips_by_section["giga_both"] = gigas_both
-
-        chips_by_section[section].sort(key=sort_func)
+    chip_traders = ChipTraders(
+        ("bn3_higsbys_trader.txt", "tv_station_hall_1_trader.txt", "hospital_lobby_trader.txt", "bn3_bugfrag_trader.txt"),
+        version_to_game_version=version_to_game_version,
+        name_aliases={"DrkHole": "Hole"}
+    )
 
-    game_drop_table = enemy_drops.GameDropTable(bn3_hp_percents_to_name, 3, 
+    game_drop_table = enemy_drops.GameDropTable(enemy_drops.bn3_hp_percents_to_name, 3, 
         enemy_drops.InputDropTable("bn3w_drops.txt", "bn3w_ignored_enemies.txt", "3W"),
-        enemy_drops.InputDropTable("bn3b_drops.txt", "bn3b_ignored_enemies.txt", "3B")
+        enemy_drops.InputDropTable("bn3b_drops.txt", "bn3b_ignored_enemies.txt", "3B"),
+        parse_cache=parse_cache
     )
 
     output = []
     output.append(PAGE_HEADER)
 
-    standard = chips_by_section["standard"]
+    standard = chip_library.section("standard")
     output.append("==Standard Class Chips==\n")
     output.extend(gen_basic_chiploc_table(standard, game_drop_table=game_drop_table, chip_traders=chip_traders))
 
-    mega = chips_by_section["mega"]
+    mega = chip_library.section("mega")
     output.extend(["==Mega Class Chips==\n"])
     output.extend(gen_basic_chiploc_table(mega, game_drop_table=game_drop_table, chip_id_name_func=get_mega_chip_id_name, chip_traders=chip_traders))
 
     output.extend(["==Giga Class Chips==\n", "===White===\n"])
-    giga_white = chips_by_section["giga_white"]
+    giga_white = chip_library.section_version("giga", "white")
     output.extend(gen_basic_chiploc_table(giga_white))
 
-    giga_blue = chips_by_section["giga_blue"]
+    giga_blue = chip_library.section_version("giga", "blue")
     output.append("===Blue===\n")
     output.extend(gen_basic_chiploc_table(giga_blue))
 
-    giga_both = chips_by_section["giga_both"]
+    giga_both = chip_library.section_version("giga", None)
     output.append("===Both versions===\n")
     output.extend(gen_basic_chiploc_table(giga_both))
 
@@ -1,8 +1,11 @@
 import json
-import functools
 
+import chip_keys
 import enemy_drops
-from mystery_data import MysteryDataParser5
+from parse_cache import ParseCache
+from chip_library import load_chip_library
+from chip_traders import ChipTraders, MISSING_CODES_TEXT_LIST
+from mystery_data import MysteryDataParser5, JpEnMysteryData, JP_EN_JP_ONLY, JP_EN_EN_ONLY, JP_EN_DIFFERS
 
 
 PAGE_HEADER = """\
@@ -34,87 +37,6 @@ HALL_TRADER_TEXT = ""
 OLD_MINE_TRADER_TEXT = ""
 BUGFRAG_TRADER_TEXT = ""
 
-def convert_v2_format_to_v1(bn5_chips_v2):
-    bn5_chips = []
-
-    for v2_chip_full in bn5_chips_v2["results"].values():
-        v2_chip = v2_chip_full["printouts"]
-        chip = {
-            "name": {
-                "en": v2_chip["name"][0]
-            },
-            "codes": "".join(v2_chip["codes"]),
-            "index": v2_chip["index"][0],
-            "section": v2_chip["section"][0].lower()
-        }
-
-        v2_version_list = v2_chip["version"]
-        if len(v2_version_list) != 0:
-            v2_version = v2_version_list[0]
-            if v2_version == "Team ProtoMan":
-                version = "protoman"
-            elif v2_version == "Team Colonel":
-                version = "colonel"
-            else:
-                version = None
-        else:
-            version = None
-
-        chip["version"] = version
-        bn5_chips.append(chip)
-
-    return bn5_chips
-
-def is_library_chip(chip):
-    if chip is None:
-        return False
-
-    if not isinstance(chip.get("index"), int):
-        return False
-
-    if chip.get("section") not in ("standard", "mega", "giga", "dark", "secret"):
-        return False
-
-    return True
-
-version_to_ordinal = {
-    "protoman": 0,
-    "colonel": 1,
-    None: None
-}
-
-def compare_chips(a, b):
-    a_index = a.get("index")
-    b_index = b.get("index")
-
-    if a_index < b_index:
-        return -1
-    elif a_index > b_index:
-        return 1
-    else:
-        a_version = version_to_ordinal[a.get("version")]
-        b_version = version_to_ordinal[b.get("version")]
-
-        if a_version < b_version:
-            return -1
-        elif a_version > b_version:
-            return 1
-        else:
-            raise RuntimeError(f"Bad chip comparison! a: {a}, b: {b}")
-
-def bn5_mega_sort_index(chip):
-    chip_index = chip.get("index")
-    if chip_index < 22:
-        return chip_index
-    # version exclusive megas
-    elif 22 <= chip_index <= 39:
-        if chip.get("version") == "protoman":
-            return chip_index
-        else:
-            return chip_index + 18
-    else:
-        return chip_index + 36
-
 def get_basic_chip_id_name(chip):
     return f"{chip['index']:03d}", chip["name"]["en"]
 
@@ -146,14 +68,27 @@ def get_mega_chip_id_name(chip):
 
     return chip_id, chip_name
 
+# drop tables write the navi chip suffixes in brackets
+def get_drop_chip_name_id(name):
+    return chip_keys.chip_name_id(name.replace("{{DS}}", "[DS]").replace("{{SP}}", "[SP]"))
+
 def gen_basic_chiploc_table(chips, game_drop_table=None, mystery_data=None, chip_id_name_func=get_basic_chip_id_name, chip_traders=None):
     output = []
-    if mystery_data is not None:
-        mystery_data_jp, mystery_data_en = mystery_data
-    for chip in chips:
-        id, name = chip_id_name_func(chip)
+    chip_id_names = [chip_id_name_func(chip) for chip in chips]
+
+    if game_drop_table is not None:
+        # the whole section's drop locations in one batch
+        drop_location_texts = game_drop_table.find_chip_keys([
+            chip_keys.pack_chip_key(get_drop_chip_name_id(name), code)
+            for chip, (id, name) in zip(chips, chip_id_names)
+            for code in chip["codes"]
+        ])
+
+    for chip, (id, name) in zip(chips, chip_id_names):
         cur_output = CHIP_LOCATION_TEMPLATE_PART_1.format(id=id, name=name)
         output.append(cur_output)
+        drop_chip_name_id = get_drop_chip_name_id(name)
+        chip_name_id = chip_keys.chip_name_id(name)
         for code in chip["codes"]:
             original_code = code
             if code == "*":
@@ -163,24 +98,22 @@ def gen_basic_chiploc_table(chips, game_drop_table=None, mystery_data=None, chip
             location_text_parts.append(DUMMY_LOCATION_TEXT)
 
             if game_drop_table is not None:
-                original_name = name.replace("{{DS}}", "[DS]").replace("{{SP}}", "[SP]")
-                enemy_chip_location = game_drop_table.find_chip(original_name, original_code)
+                enemy_chip_location = drop_location_texts[chip_keys.pack_chip_key(drop_chip_name_id, original_code)]
                 if enemy_chip_location is not None:
                     location_text_parts.append(enemy_chip_location)
 
             if mystery_data is not None:
-                md_chip_location_jp = mystery_data_jp.find_chip(name, original_code)
-                md_chip_location_en = mystery_data_en.find_chip(name, original_code)
-                if md_chip_location_jp != md_chip_location_en:
-                    if md_chip_location_jp is None:
-                        print(f"{name} {original_code}: EN: {md_chip_location_en}")                        
-                    elif md_chip_location_en is None:
-                        print(f"{name} {original_code}: JP: {md_chip_location_jp}")
-                    else:
-                        print(f"{name} {original_code}: JP/EN: {md_chip_location_jp} | {md_chip_location_en}")
-
-                if md_chip_location_en is not None:
-                    location_text_parts.append(md_chip_location_en)
+                md_chip_locations = mystery_data.find_chip_key(chip_keys.pack_chip_key(chip_name_id, original_code))
+                if md_chip_locations is not None:
+                    if md_chip_locations.kind == JP_EN_EN_ONLY:
+                        print(f"{name} {original_code}: EN: {md_chip_locations.location_text_en}")
+                    elif md_chip_locations.kind == JP_EN_JP_ONLY:
+                        print(f"{name} {original_code}: JP: {md_chip_locations.location_text_jp}")
+                    elif md_chip_locations.kind == JP_EN_DIFFERS:
+                        print(f"{name} {original_code}: JP/EN: {md_chip_locations.location_text_jp} | {md_chip_locations.location_text_en}")
+
+                    if md_chip_locations.location_text_en is not None:
+                        location_text_parts.append(md_chip_locations.location_text_en)
 
             location_text = ", ".join(location_text_parts)
 
@@ -202,160 +135,71 @@ NO_VERSION = 0
 PROTOMAN = 1
 COLONEL = 2
 
-class ChipTraderEntry:
-    __slots__ = ("name", "codes", "version")
-
-    def __init__(self, line):
-        if "[TP]" in line:
-            self.version = "protoman"
-        elif "[TC]" in line:
-            self.version = "colonel"
-        else:
-            self.version = None
-
-        line = line.replace("[TC]", "").replace("[TP]", "").replace("[", "").replace("]", "").strip()
-        self.name, self.codes = line.rsplit(maxsplit=1)
-
-class ChipTrader:
-    __slots__ = ("name", "chips")
-
-    def __init__(self, filename):
-        self.chips = {}
-
-        with open(filename, "r") as f:
-            line = next(f)
-            self.name = line.strip()
-
-            for line in f:
-                entry = ChipTraderEntry(line)
-                self.chips[entry.name] = entry
-
-    def get_trader_text_if_has_chip(self, chip):
-        chip_name = chip["name"]["en"]
-        entry = self.chips.get(chip_name)
-        if entry is not None:
-            trader_text = ""
-            if entry.version is not None:
-                version_text = f"{version_to_game_version[entry.version]}"
-            else:
-                version_text = None
-
-            trader_text += self.name
-            all_codes = set(chip["codes"])
-            entry_codes = set(entry.codes)
-            missing_codes = all_codes - entry_codes
-
-            if len(missing_codes) != 0:
-                trader_text += " (No " + ", ".join(("{{code|%s}}" % code) for code in missing_codes) + ")"
-
-            return trader_text, version_text
-        else:
-            return None, None
-
-class ChipTraders:
-    __slots__ = ("traders",)
-
-    def __init__(self, filenames):
-        self.traders = []
-        for filename in filenames:
-            self.traders.append(ChipTrader(filename))
-
-    def find_traders_for_chip(self, chip):
-        found_trader_texts = []
-        found_version_text = None
-        for trader in self.traders:
-            cur_trader_text, version_text = trader.get_trader_text_if_has_chip(chip)
-            if cur_trader_text is not None:
-                found_trader_texts.append(cur_trader_text)
-                if version_text is not None:
-                    found_version_text = version_text
-
-        if len(found_trader_texts) != 0:
-            return ", ".join(found_trader_texts), found_version_text
-        else:
-            return None, None
-
 def main():
-    with open("bn5_chips_v2.json", "r") as f:
-        bn5_chips_v2 = json.load(f)
-
-    bn5_chips = convert_v2_format_to_v1(bn5_chips_v2)
-    bn5_library_chips = list(filter(is_library_chip, bn5_chips))
+    parse_cache = ParseCache()
+    bn5_chip_library = load_chip_library(5, parse_cache)
+    bn5_library_chips = bn5_chip_library.chips
 
     with open("bn5_library_chips.json", "w+") as f:
         json.dump(bn5_library_chips, f, indent=2)
 
-    chip_traders = ChipTraders(("higsbys_trader.txt", "hall_trader.txt", "mine_trader.txt", "bugfrag_trader.txt"))
-    mystery_data_jp = MysteryDataParser5("exe5_mystery_data.txt", False, bn5_library_chips)
-    mystery_data_en = MysteryDataParser5("bn5_mystery_data.txt", True, bn5_library_chips)
-
-    #bn5_remaining_sections = set(chip.get("section") for chip in bn5_library_chips)
-    bn5_chips_by_section = {}
-
-    for section in ("standard", "mega", "giga", "dark", "secret"):
-        bn5_chips_by_section[section] = [chip for chip in bn5_library_chips if chip.get("section") == section]
-        sort_func = lambda x: x.get("index")
-        if section == "mega":
-            sort_func = bn5_mega_sort_index
-        elif section == "giga":
-            bn5_gigas_full = bn5_chips_by_section["giga"]
-            bn5_gigas_protoman = sorted([chip for chip in bn5_gigas_full if chip.get("version") == "protoman"], key=lambda x: x.get("index"))
-            bn5_gigas_colonel = sorted([chip for chip in bn5_gigas_full if chip.get("version") == "colonel"], key=lambda x: x.get("index"))
-            bn5_chips_by_section["giga_protoman"] = bn5_gigas_protoman
-            bn5_chips_by_section["giga_colonel"] = bn5_gigas_colonel
-        elif section == "secret":
-            bn5_secret = bn5_chips_by_section["secret"]
-            bn5_secret_registered = []
-            bn5_secret_unregistered = []
-            for chip in bn5_secret:
-                chip_name = chip["name"]["en"]
-                if chip_name == "Otenko":
-                    bn5_secret_registered.append(chip)
-                elif chip_name == "GunDelEX":
-                    bn5_secret_registered.append(chip)
-                elif chip_name == "LeaderR":
-                    bn5_secret_unregistered.append(chip)
-                elif chip_name == "ChaosL":
-                    bn5_secret_unregistered.append(chip)
-
-            bn5_chips_by_section["secret_registered"] = bn5_secret_registered
-            bn5_chips_by_section["secret_unregistered"] = bn5_secret_unregistered
-
-        bn5_chips_by_section[section].sort(key=sort_func)
+    chip_traders = ChipTraders(
+        ("higsbys_trader.txt", "hall_trader.txt", "mine_trader.txt", "bugfrag_trader.txt"),
+        version_to_game_version=version_to_game_version,
+        missing_codes_text_style=MISSING_CODES_TEXT_LIST,
+        validate_missing_codes=False
+    )
+    mystery_data = JpEnMysteryData(
+        MysteryDataParser5("exe5_mystery_data.txt", False, bn5_chip_library, parse_cache=parse_cache),
+        MysteryDataParser5("bn5_mystery_data.txt", True, bn5_chip_library, parse_cache=parse_cache)
+    )
+
+    # export order, not index order
+    bn5_secret_registered = []
+    bn5_secret_unregistered = []
+    for chip in bn5_chip_library.chips_by_section["secret"]:
+        chip_name = chip["name"]["en"]
+        if chip_name == "Otenko":
+            bn5_secret_registered.append(chip)
+        elif chip_name == "GunDelEX":
+            bn5_secret_registered.append(chip)
+        elif chip_name == "LeaderR":
+            bn5_secret_unregistered.append(chip)
+        elif chip_name == "ChaosL":
+            bn5_secret_unregistered.append(chip)
 
     game_drop_table = enemy_drops.GameDropTable(enemy_drops.bn4to6_hp_percents_to_name, 5, 
         enemy_drops.InputDropTable("bn5p_drops.txt", "bn5p_ignored_enemies.txt", "5TP"),
-        enemy_drops.InputDropTable("bn5c_drops.txt", "bn5c_ignored_enemies.txt", "5TC")
+        enemy_drops.InputDropTable("bn5c_drops.txt", "bn5c_ignored_enemies.txt", "5TC"),
+        parse_cache=parse_cache
     )
 
     output = []
     output.append(PAGE_HEADER)
 
-    bn5_standard = bn5_chips_by_section["standard"]
+    bn5_standard = bn5_chip_library.section("standard")
     output.append("==Standard Class Chips==\n")
-    output.extend(gen_basic_chiploc_table(bn5_standard, game_drop_table=game_drop_table, mystery_data=(mystery_data_jp, mystery_data_en), chip_traders=chip_traders))
+    output.extend(gen_basic_chiploc_table(bn5_standard, game_drop_table=game_drop_table, mystery_data=mystery_data, chip_traders=chip_traders))
 
-    bn5_mega = bn5_chips_by_section["mega"]
+    bn5_mega = bn5_chip_library.section("mega")
     output.append("==Mega Class Chips==\n")
-    output.extend(gen_basic_chiploc_table(bn5_mega, game_drop_table=game_drop_table, mystery_data=(mystery_data_jp, mystery_data_en), chip_id_name_func=get_mega_chip_id_name, chip_traders=chip_traders))
+    output.extend(gen_basic_chiploc_table(bn5_mega, game_drop_table=game_drop_table, mystery_data=mystery_data, chip_id_name_func=get_mega_chip_id_name, chip_traders=chip_traders))
 
     output.extend(["==Giga Class Chips==\n", "===Team ProtoMan===\n"])
-    bn5_giga_protoman = bn5_chips_by_section["giga_protoman"]
+    bn5_giga_protoman = bn5_chip_library.section_version("giga", "protoman")
     output.extend(gen_basic_chiploc_table(bn5_giga_protoman))
 
-    bn5_giga_colonel = bn5_chips_by_section["giga_colonel"]
+    bn5_giga_colonel = bn5_chip_library.section_version("giga", "colonel")
     output.append("===Team Colonel===\n")
     output.extend(gen_basic_chiploc_table(bn5_giga_colonel))
 
-    bn5_dark = bn5_chips_by_section["dark"]
+    bn5_dark = bn5_chip_library.section("dark")
     output.append("==Dark Chips==\n")
     output.extend(gen_basic_chiploc_table(bn5_dark))
 
     output.extend(["==Secret Chips==\n", "That version's exclusive Navis are registered as Secret in other version's library.\n"])
-    bn5_secret_registered = bn5_chips_by_section["secret_registered"]
     output.extend(gen_basic_chiploc_table(bn5_secret_registered))
 
-    bn5_secret_unregistered = bn5_chips_by_section["secret_unregistered"]
     output.append("==Unregistered Chips==\n")
     output.extend(gen_basic_chiploc_table(bn5_secret_unregistered))
     output.append("\n")
@@ -0,0 +1,153 @@
+import sys
+import functools
+
+import numpy as np
+
+from symbol_table import SymbolTable
+from mystery_data import load_mystery_data_file, looks_like_chip_full, game_cycles, md_label_cycle_indices
+from parse_cache import ParseCache
+
+# bump whenever the computed probabilities change, so that cached results are invalidated
+GMD_PROBABILITIES_VERSION = 2
+
+class GmdChance:
+    __slots__ = ("reward", "cycle", "map_name", "chance", "expected_pickups", "num_gmds")
+
+    def __init__(self, reward, cycle, map_name, chance, expected_pickups, num_gmds):
+        self.reward = reward
+        self.cycle = cycle
+        self.map_name = map_name
+        # chance that one GMD pickup in the map gives the reward, over the map's GMDs of that cycle
+        self.chance = chance
+        self.expected_pickups = expected_pickups
+        self.num_gmds = num_gmds
+
+    def __str__(self):
+        return f"{self.reward} [{self.cycle}] {self.map_name}: {self.chance:.2%} per pickup, {self.expected_pickups:.1f} pickups expected ({self.num_gmds} GMDs)"
+
+# packed_chances is what gets cached: {reward: ((cycle index, map name, chance, expected pickups, num GMDs), ...)},
+# best chance first within each cycle
+class GmdProbabilities:
+    __slots__ = ("game_number", "cycles", "packed_chances")
+
+    def __init__(self, game_number, packed_chances):
+        self.game_number = game_number
+        self.cycles = game_cycles[game_number]
+        self.packed_chances = packed_chances
+
+    @classmethod
+    def load(cls, filename, game_number, parse_cache=None):
+        if parse_cache is None:
+            packed_chances = compute_packed_chances(filename, game_number)
+        else:
+            packed_chances = parse_cache.get_or_parse(
+                "gmd_probabilities", GMD_PROBABILITIES_VERSION, (filename,),
+                {"game_number": game_number},
+                functools.partial(compute_packed_chances, filename, game_number, parse_cache)
+            )
+
+        return cls(game_number, packed_chances)
+
+    def find(self, reward, cycle=None):
+        found_chances = []
+        for cycle_index, map_name, chance, expected_pickups, num_gmds in self.packed_chances.get(reward, ()):
+            cur_cycle = self.cycles[cycle_index]
+            if cycle is None or cur_cycle == cycle:
+                found_chances.append(GmdChance(reward, cur_cycle, map_name, chance, expected_pickups, num_gmds))
+
+        return found_chances
+
+    def find_chip(self, chip_name, code, cycle=None):
+        return self.find(f"{chip_name} {code}", cycle)
+
+    def best_maps(self, reward):
+        # the best map of every cycle the reward shows up in
+        best_chances = {}
+        for gmd_chance in self.find(reward):
+            if gmd_chance.cycle not in best_chances:
+                best_chances[gmd_chance.cycle] = gmd_chance
+
+        return best_chances
+
+    def chips(self):
+        return [reward for reward in self.packed_chances.keys() if looks_like_chip_full(reward)]
+
+def compute_packed_chances(filename, game_number, parse_cache=None):
+    num_cycles = len(game_cycles[game_number])
+    maps = SymbolTable()
+    rewards = SymbolTable()
+
+    # one row per (GMD, cycle, reward row). each cycle's numerators of one GMD sum to its denominator
+    reward_column = []
+    cycle_column = []
+    map_column = []
+    chance_column = []
+    gmd_cycle_maps = []
+    gmd_cycle_cycles = []
+
+    for mystery_data in load_mystery_data_file(filename, parse_cache).mds:
+        if mystery_data.md_type != "Green":
+            continue
+
+        map_id = maps.intern(mystery_data.map_name)
+        gmd_cycle_indices = set()
+        label_cycle_indices = md_label_cycle_indices(game_number, mystery_data)
+
+        for md_reward in mystery_data.rewards:
+            cycle_indices = label_cycle_indices[md_reward.label]
+            reward_id = rewards.intern(md_reward.reward)
+            chance = md_reward.numerator / md_reward.denominator
+            for cycle_index in cycle_indices:
+                reward_column.append(reward_id)
+                cycle_column.append(cycle_index)
+                map_column.append(map_id)
+                chance_column.append(chance)
+                gmd_cycle_indices.add(cycle_index)
+
+        for cycle_index in gmd_cycle_indices:
+            gmd_cycle_maps.append(map_id)
+            gmd_cycle_cycles.append(cycle_index)
+
+    # chance sums per (reward, cycle, map), divided by how many GMDs the map has in that cycle
+    chance_sums = np.zeros((len(rewards), num_cycles, len(maps)), dtype=np.float64)
+    np.add.at(chance_sums, (np.array(reward_column, dtype=np.int64), np.array(cycle_column, dtype=np.int64), np.array(map_column, dtype=np.int64)), np.array(chance_column, dtype=np.float64))
+
+    num_gmds = np.zeros((num_cycles, len(maps)), dtype=np.int64)
+    np.add.at(num_gmds, (np.array(gmd_cycle_cycles, dtype=np.int64), np.array(gmd_cycle_maps, dtype=np.int64)), 1)
+
+    chances = np.divide(chance_sums, num_gmds, out=np.zeros_like(chance_sums), where=num_gmds != 0)
+    expected_pickups = np.divide(1.0, chances, out=np.full_like(chances, np.inf), where=chances != 0)
+    # best map first, ties in file order
+    map_orders = np.argsort(-chances, axis=2, kind="stable")
+
+    packed_chances = {}
+    for reward_id, reward in enumerate(rewards.names):
+        packed_reward_chances = []
+        for cycle_index in range(num_cycles):
+            for map_id in map_orders[reward_id, cycle_index].tolist():
+                chance = float(chances[reward_id, cycle_index, map_id])
+                if chance == 0:
+                    break
+                packed_reward_chances.append((cycle_index, maps[map_id], chance, float(expected_pickups[reward_id, cycle_index, map_id]), int(num_gmds[cycle_index, map_id])))
+
+        packed_chances[reward] = tuple(packed_reward_chances)
+
+    return packed_chances
+
+def main():
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python gmd_probabilities.py MYSTERY_DATA_FILENAME GAME_NUMBER [REWARD]")
+        return
+
+    gmd_probabilities = GmdProbabilities.load(sys.argv[1], int(sys.argv[2]), ParseCache())
+
+    if len(sys.argv) == 4:
+        for gmd_chance in gmd_probabilities.find(sys.argv[3]):
+            print(gmd_chance)
+    else:
+        for chip_full in gmd_probabilities.chips():
+            for gmd_chance in gmd_probabilities.best_maps(chip_full).values():
+                print(gmd_chance)
+
+if __name__ == "__main__":
+    main()
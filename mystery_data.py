@@ -1,112 +1,319 @@
 import re
+import json
+import functools
 
-from line_reader import LineReader
+import chip_keys
+
+# bump whenever the parsed mystery data structures change, so that cached parses are invalidated
+MYSTERY_DATA_PARSER_VERSION = 3
 
-multitab_regex = re.compile(r"\t+")
 multispace_regex = re.compile(r" +")
-tab_then_digit_regex = re.compile(r"^\t+[0-9]")
-spaces_then_digit_regex = re.compile(r"^    +[0-9]")
+# a label such as "1st:", "Game 1:", "Level 1+:" or "Contents:" at the start of an indented row.
+# it can't cross a tab, so a row's own fields are never mistaken for a label
+row_label_regex = re.compile(r"[ \t]*([^ \t:][^\t:]*):")
+
+chip_codes = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ*")
 
 availability_to_abbrev_availability = {
     "Game 1": "G1",
     "Game 2": "G2",
 }
 
-class MysteryDataParser:
-    __slots__ = ("all_chip_locations",)
+# the MD contents cycles of each game. BN6 MDs have a single table
+game_cycles = {
+    4: ("Game 1", "Game 2", "Game 3+"),
+    5: ("Level 1", "Level 2", "Level 3"),
+    6: ("Any",),
+}
 
-    def __init__(self, filename, game_number, library_chips):
-        all_library_chip_code_combos = set()
-        for chip in library_chips:
-            for chip_code in chip["codes"]:
-                all_library_chip_code_combos.add(f"{chip['name']['en']} {chip_code}")
+# the cycles each MD label covers. BN4 set MDs are numbered by cycle, and their "Rest"
+# covers every cycle after the MD's last numbered label, so it isn't listed here
+game_label_to_cycle_indices = {
+    4: {"Game 1": (0,), "Game 2": (1,), "Rest": (2,), "Always": (0, 1, 2), "1st": (0,), "2nd": (1,), "3rd": (2,)},
+    5: {"Level 1": (0,), "Level 2": (1,), "Level 3": (2,), "Level 1+": (0, 1, 2)},
+    6: {"Contents": (0,)},
+}
 
-        with open(filename, "r") as f:
-            contents = f.read()
-            contents = contents.replace("Game 1:", "Game 1:\n").replace("Game 2:", "Game 2:\n").replace("Rest:", "Rest:\n").replace("Always:", "Always:\n")
-            line_reader = LineReader(contents.splitlines(), filename)
+# BN4 maps whose GMD "Rest" contents show up in every cycle
+bn4_rest_always_maps = frozenset({"Undernet 5", "Black Earth 1", "Black Earth 2"})
+
+# {label: cycle indices} for every label of the MD. unknown labels are an error
+def md_label_cycle_indices(game_number, mystery_data):
+    label_to_cycle_indices = game_label_to_cycle_indices[game_number]
+    num_cycles = len(game_cycles[game_number])
+    is_set_md = mystery_data.md_type != "Green"
+    label_cycle_indices = {}
+    has_set_rest = False
+
+    for md_reward in mystery_data.rewards:
+        label = md_reward.label
+        if label in label_cycle_indices:
+            continue
+
+        if label == "Rest" and is_set_md:
+            has_set_rest = True
+            continue
+
+        cycle_indices = label_to_cycle_indices.get(label)
+        if cycle_indices is None:
+            raise RuntimeError(f"At line {mystery_data.line_num}: Unknown MD label \"{label}\"!")
+
+        if label == "Rest" and game_number == 4 and mystery_data.map_name in bn4_rest_always_maps:
+            cycle_indices = tuple(range(num_cycles))
+
+        label_cycle_indices[label] = cycle_indices
+
+    if has_set_rest:
+        last_numbered_cycle_index = max((cycle_indices[-1] for cycle_indices in label_cycle_indices.values()), default=-1)
+        rest_cycle_indices = tuple(range(last_numbered_cycle_index + 1, num_cycles))
+        if len(rest_cycle_indices) == 0:
+            rest_cycle_indices = (num_cycles - 1,)
+        label_cycle_indices["Rest"] = rest_cycle_indices
+
+    return label_cycle_indices
+
+# slot, numerator/denominator, percent, then the reward or spawn coordinates and an
+# optional trap marker. columns are mostly tab separated, but not always
+row_fields_regex = re.compile(r"^\s*([0-9]+)\s+([0-9]+)\s*/\s*([0-9]+)\s+[0-9.]+%\s+(.*?)(?:\s+(\(Trap\)))?$")
+# a row's "x, y, z" spawn coordinates
+coords_regex = re.compile(r"^\(\s*(-?[0-9]+),\s*(-?[0-9]+),\s*(-?[0-9]+)\)$")
+
+class MysteryDataSpawn:
+    __slots__ = ("slot", "numerator", "denominator", "x", "y", "z")
+
+    def __init__(self, slot, numerator, denominator, x, y, z):
+        self.slot = slot
+        self.numerator = numerator
+        self.denominator = denominator
+        self.x = x
+        self.y = y
+        self.z = z
+
+class MysteryDataReward:
+    __slots__ = ("label", "slot", "numerator", "denominator", "reward", "is_trap")
+
+    def __init__(self, label, slot, numerator, denominator, reward, is_trap):
+        self.label = label
+        self.slot = slot
+        self.numerator = numerator
+        self.denominator = denominator
+        self.reward = reward
+        self.is_trap = is_trap
+
+    @property
+    def chance(self):
+        return f"{self.numerator}/{self.denominator}"
+
+class MysteryData:
+    __slots__ = ("map_name", "md_type", "flag_id", "spawns", "rewards", "line_num")
+
+    def __init__(self, map_name, md_type, flag_id, line_num):
+        self.map_name = map_name
+        self.md_type = md_type
+        self.flag_id = flag_id
+        self.spawns = []
+        self.rewards = []
+        self.line_num = line_num
+
+    @property
+    def md_type_abbrev(self):
+        return f"{self.md_type[0]}MD"
+
+class MysteryDataFile:
+    __slots__ = ("filename", "mds", "mds_by_map")
+
+    def __init__(self, filename, mds):
+        self.filename = filename
+        self.mds = mds
+        # map name to that map's MDs, in file order
+        self.mds_by_map = {}
+        for mystery_data in mds:
+            self.mds_by_map.setdefault(mystery_data.map_name, []).append(mystery_data)
+
+def looks_like_chip_full(reward):
+    # every chip reward is a name, padding, then a one character code
+    return len(reward) >= 3 and reward[-2] == " " and reward[-1] in chip_codes
+
+def parse_row_fields(text, filename, line_num):
+    match_obj = row_fields_regex.match(text)
+    if match_obj is None:
+        raise RuntimeError(f"At {filename}:{line_num}: Invalid mystery data row \"{text}\"!")
+
+    return int(match_obj.group(1)), int(match_obj.group(2)), int(match_obj.group(3)), match_obj.group(4), match_obj.group(5) is not None
+
+def add_spawn(mystery_data, text, filename, line_num):
+    slot, numerator, denominator, coords, is_trap = parse_row_fields(text, filename, line_num)
+    match_obj = coords_regex.match(coords)
+    if match_obj is None or is_trap:
+        raise RuntimeError(f"At {filename}:{line_num}: Invalid mystery data location \"{text}\"!")
+
+    x, y, z = (int(coord) for coord in match_obj.groups())
+    mystery_data.spawns.append(MysteryDataSpawn(slot, numerator, denominator, x, y, z))
+
+def add_reward(mystery_data, label, text, filename, line_num):
+    slot, numerator, denominator, reward, is_trap = parse_row_fields(text, filename, line_num)
+    if "  " in reward:
+        reward = multispace_regex.sub(" ", reward)
+
+    mystery_data.rewards.append(MysteryDataReward(label, slot, numerator, denominator, reward, is_trap))
+
+# one pass over a mystery data dump, tab-aligned (BN4/BN5) or space-aligned (BN6),
+# yielding each MD once its last row is read. rows before an MD's first label are
+# its extra spawn locations. a label applies to every row after it until the next label
+def iter_mystery_data(filename):
+    map_name = None
+    mystery_data = None
+    label = None
+
+    with open(filename, "r") as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.rstrip()
+            if line == "":
+                continue
+
+            if line[0] not in " \t":
+                if mystery_data is not None:
+                    yield mystery_data
+                    mystery_data = None
+
+                if line.startswith("Area "):
+                    map_name_parts = line.split(": ", maxsplit=1)
+                    if len(map_name_parts) != 2:
+                        raise RuntimeError(f"At {filename}:{line_num}: Invalid map line \"{line}\"!")
+                    map_name = map_name_parts[1]
+                elif not line.startswith("---"):
+                    header_parts = line.split(maxsplit=2)
+                    if map_name is None or len(header_parts) != 3 or not header_parts[2].startswith("Locations:"):
+                        raise RuntimeError(f"At {filename}:{line_num}: Invalid mystery data header \"{line}\"!")
+                    mystery_data = MysteryData(map_name, header_parts[0], header_parts[1], line_num)
+                    label = None
+                    add_spawn(mystery_data, header_parts[2][len("Locations:"):], filename, line_num)
+                continue
+
+            if mystery_data is None:
+                raise RuntimeError(f"At {filename}:{line_num}: Mystery data row outside of a mystery data!")
+
+            match_obj = row_label_regex.match(line)
+            if match_obj is not None:
+                label = match_obj.group(1)
+                text = line[match_obj.end():]
+                # a label on a line of its own applies to the rows below it
+                if text == "":
+                    continue
+            else:
+                text = line
 
+            if label is None:
+                add_spawn(mystery_data, text, filename, line_num)
+            else:
+                add_reward(mystery_data, label, text, filename, line_num)
+
+    if mystery_data is not None:
+        yield mystery_data
+
+def parse_mystery_data_file(filename):
+    return MysteryDataFile(filename, list(iter_mystery_data(filename)))
+
+def load_mystery_data_file(filename, parse_cache=None):
+    if parse_cache is None:
+        return parse_mystery_data_file(filename)
+    else:
+        return parse_cache.get_or_parse(
+            "mystery_data", MYSTERY_DATA_PARSER_VERSION, (filename,), {},
+            functools.partial(parse_mystery_data_file, filename)
+        )
+
+# feeds every MD of one file to each registered sink, in file order, then calls each
+# sink's finish(). a sink is anything with add_mystery_data(mystery_data) and finish(),
+# so a new output is one more sink rather than one more pass over the file
+class MysteryDataPipeline:
+    __slots__ = ("filename", "sinks")
+
+    def __init__(self, filename, sinks=()):
+        self.filename = filename
+        self.sinks = list(sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def run(self, parse_cache=None):
+        if parse_cache is not None:
+            mds = load_mystery_data_file(self.filename, parse_cache).mds
+        else:
+            mds = iter_mystery_data(self.filename)
+
+        for mystery_data in mds:
+            for sink in self.sinks:
+                sink.add_mystery_data(mystery_data)
+
+        for sink in self.sinks:
+            sink.finish()
+
+# the chip location parsers are sinks. with a filename they run their own pipeline,
+# with None they start empty and wait to be added to a shared one
+class MysteryDataChipLocations:
+    __slots__ = ("chip_library", "all_chip_locations", "all_chip_md_locations")
+
+    def __init__(self, filename, chip_library, parse_cache=None):
+        self.chip_library = chip_library
+        # keyed by packed chip key
         self.all_chip_locations = {}
+        # the same locations keyed by the MD they come from, for joining JP and EN data
+        self.all_chip_md_locations = {}
 
-        for line in line_reader:
-            map_name = line.split(": ")[1]
-            while True:
-                line = line_reader.next()
-                if line.strip() != "":
-                    break
-
-            while True:
-                mystery_data_type = line.split("\t", maxsplit=1)[0]
-                #if mystery_data_type in {"Blue", "Purple"}:
-                mystery_data_type_abbrev = f"{mystery_data_type[0]}MD"
-                if mystery_data_type == "Green":
-                    while True:
-                        line = line_reader.next()
-                        if not tab_then_digit_regex.match(line):
-                            break
-                else:
-                    line = line_reader.next()
-    
-                while True:
-                    md_contents = multitab_regex.split(line.strip())
-                    print(f"md_contents: {md_contents}")
-                    if mystery_data_type in {"Blue", "Purple"}:
-                        if line.endswith(":"):
-                            availability = "Rest"
-                            line = line_reader.next()
-                            md_contents = [""] + multitab_regex.split(line.strip())
-                        else:
-                            availability = md_contents[0].replace(":", "")
-                    elif line.endswith(":"):
-                        availability = line.strip()[:-1]
-                        line = line_reader.next()
-                        continue
-
-                    if mystery_data_type == "Green":
-                        reward_padded = md_contents[3]
-                    else:
-                        reward_padded = md_contents[4]
-                    reward = multispace_regex.sub(" ", reward_padded)
-
-                    abbrev_availability = availability_to_abbrev_availability.get(availability, availability)
-                    if abbrev_availability == "Rest" and mystery_data_type == "Green":
-                        if map_name in {"Undernet 5", "Black Earth 1", "Black Earth 2"}:
-                            abbrev_availability = "Always"
-                        else:
-                            abbrev_availability = "G3+"
-                    elif map_name == "Sharo Area" and reward == "BlkBomb Z":
-                        abbrev_availability = "Always"
-
-                    #print(line)
-                    if reward not in all_library_chip_code_combos:
-                        pass #print(f"ignored {reward}")
-                    else:
-                        location = f"{map_name} {mystery_data_type_abbrev} ({abbrev_availability})"
-                        #print(f"location: {location}")
-                        self.add_location(reward, location)
-    
-                    line = line_reader.next()
-                    if not line.startswith("\t"):
-                        break
-
-                if line.startswith("---------------"):
-                    break
-
-    def add_location(self, chip_full, location):
-        chip_locations = self.all_chip_locations.get(chip_full)
+        if filename is not None:
+            MysteryDataPipeline(filename, (self,)).run(parse_cache)
+
+    def finish(self):
+        pass
+
+    def add_location(self, chip_full, location, mystery_data):
+        chip_key = chip_keys.intern_chip_full(chip_full)
+        chip_locations = self.all_chip_locations.get(chip_key)
         if chip_locations is None:
             chip_locations = {location: True}
-            self.all_chip_locations[chip_full] = chip_locations
+            self.all_chip_locations[chip_key] = chip_locations
         else:
             chip_locations[location] = True
 
+        self.all_chip_md_locations.setdefault(chip_key, {})[(mystery_data.map_name, mystery_data.flag_id, location)] = True
+
     def find_chip(self, chip_name, code):
-        chip_locations = self.all_chip_locations.get(f"{chip_name} {code}")
+        return self.find_chip_key(chip_keys.lookup_chip_key(chip_name, code))
+
+    def find_chip_key(self, chip_key):
+        chip_locations = self.all_chip_locations.get(chip_key)
         if chip_locations is None:
             return None
         else:
             return ", ".join(chip_locations.keys())
 
+class MysteryDataParser(MysteryDataChipLocations):
+    __slots__ = ()
+
+    def __init__(self, filename, game_number, chip_library, parse_cache=None):
+        super().__init__(filename, chip_library, parse_cache)
+
+    def add_mystery_data(self, mystery_data):
+        map_name = mystery_data.map_name
+        label_cycle_indices = md_label_cycle_indices(4, mystery_data)
+        for md_reward in mystery_data.rewards:
+            reward = md_reward.reward
+            if not (looks_like_chip_full(reward) and self.chip_library.has_chip_full(reward)):
+                continue
+
+            abbrev_availability = availability_to_abbrev_availability.get(md_reward.label, md_reward.label)
+            if abbrev_availability == "Rest" and mystery_data.md_type == "Green":
+                if len(label_cycle_indices["Rest"]) == len(game_cycles[4]):
+                    abbrev_availability = "Always"
+                else:
+                    abbrev_availability = "G3+"
+            elif map_name == "Sharo Area" and reward == "BlkBomb Z":
+                abbrev_availability = "Always"
+
+            self.add_location(reward, f"{map_name} {mystery_data.md_type_abbrev} ({abbrev_availability})", mystery_data)
+
 dungeon_area_regex = re.compile(r"^(Main|Drill|Ship|Gargoyle|Factory) Comp")
 
 bn5_availability_to_abbrev_availability = {
@@ -115,258 +322,176 @@ bn5_availability_to_abbrev_availability = {
     "Level 3": "L3",
 }
 
-class MysteryDataParser5:
-    __slots__ = ("all_chip_locations",)
+def format_jp_en_map_name(map_name):
+    if "/" in map_name:
+        map_name_jp, map_name_en = map_name.replace(" (JP)", "").replace(" (EN)", "").split(" / ")
+        return f"{{{{JP}}}} {map_name_jp} / {{{{EN}}}} {map_name_en}"
+    else:
+        return map_name.replace("(JP)", "{{JP}}")
+
+class MysteryDataParser5(MysteryDataChipLocations):
+    __slots__ = ("map_name", "formatted_map_name", "is_dungeon_comp")
+
+    def __init__(self, filename, is_us, chip_library, parse_cache=None):
+        self.map_name = None
+        super().__init__(filename, chip_library, parse_cache)
+
+    def add_mystery_data(self, mystery_data):
+        if mystery_data.map_name != self.map_name:
+            self.map_name = mystery_data.map_name
+            # every level of a dungeon comp MD has the same contents
+            self.is_dungeon_comp = dungeon_area_regex.match(self.map_name) or self.map_name.startswith("Nebula Area")
+            self.formatted_map_name = format_jp_en_map_name(self.map_name)
+
+        for md_reward in mystery_data.rewards:
+            reward = md_reward.reward
+            if not (looks_like_chip_full(reward) and self.chip_library.has_chip_full(reward)):
+                continue
+
+            # blue and purple MDs only have a "Level 1+" label
+            if mystery_data.md_type == "Green" and not self.is_dungeon_comp:
+                abbrev_availability = bn5_availability_to_abbrev_availability.get(md_reward.label, md_reward.label)
+                location = f"{self.formatted_map_name} {mystery_data.md_type_abbrev} ({abbrev_availability})"
+            else:
+                location = f"{self.formatted_map_name} {mystery_data.md_type_abbrev}"
+
+            self.add_location(reward, location, mystery_data)
+
+class MysteryDataParser6(MysteryDataChipLocations):
+    __slots__ = ("map_name", "formatted_map_name")
+
+    def __init__(self, filename, is_us, chip_library, parse_cache=None):
+        self.map_name = None
+        super().__init__(filename, chip_library, parse_cache)
+
+    def add_mystery_data(self, mystery_data):
+        if mystery_data.map_name != self.map_name:
+            self.map_name = mystery_data.map_name
+            self.formatted_map_name = format_jp_en_map_name(self.map_name)
+
+        for md_reward in mystery_data.rewards:
+            reward = md_reward.reward
+            if looks_like_chip_full(reward) and self.chip_library.has_chip_full(reward):
+                self.add_location(reward, f"{self.formatted_map_name} {mystery_data.md_type_abbrev}", mystery_data)
+
+# writes every MD as one JSON object of a top level list, as the MDs arrive
+class MysteryDataJsonSink:
+    __slots__ = ("f", "num_mds")
+
+    def __init__(self, output_filename):
+        self.f = open(output_filename, "w+")
+        self.f.write("[")
+        self.num_mds = 0
+
+    def add_mystery_data(self, mystery_data):
+        md_json = {
+            "map": mystery_data.map_name,
+            "type": mystery_data.md_type,
+            "flag_id": mystery_data.flag_id,
+            "spawns": [
+                {"slot": spawn.slot, "numerator": spawn.numerator, "denominator": spawn.denominator, "x": spawn.x, "y": spawn.y, "z": spawn.z}
+                for spawn in mystery_data.spawns
+            ],
+            "rewards": [
+                {"label": md_reward.label, "slot": md_reward.slot, "numerator": md_reward.numerator, "denominator": md_reward.denominator, "reward": md_reward.reward, "trap": md_reward.is_trap}
+                for md_reward in mystery_data.rewards
+            ]
+        }
+
+        if self.num_mds != 0:
+            self.f.write(",")
+        self.f.write("\n  " + json.dumps(md_json))
+        self.num_mds += 1
+
+    def finish(self):
+        self.f.write("\n]\n")
+        self.f.close()
+
+JP_EN_SAME = 0
+JP_EN_JP_ONLY = 1
+JP_EN_EN_ONLY = 2
+JP_EN_DIFFERS = 3
+
+def join_md_locations(md_locations):
+    # several MDs can share one location text
+    return ", ".join({location: True for map_name, flag_id, location in md_locations})
+
+class JpEnChipLocations:
+    __slots__ = ("kind", "location_text_jp", "location_text_en", "location_text")
+
+    def __init__(self, md_locations_jp, md_locations_en):
+        shared_md_locations = [md_location for md_location in md_locations_en if md_location in md_locations_jp]
+        jp_only_md_locations = [md_location for md_location in md_locations_jp if md_location not in md_locations_en]
+        en_only_md_locations = [md_location for md_location in md_locations_en if md_location not in md_locations_jp]
+
+        if len(md_locations_jp) == 0:
+            self.kind = JP_EN_EN_ONLY
+        elif len(md_locations_en) == 0:
+            self.kind = JP_EN_JP_ONLY
+        elif len(jp_only_md_locations) == 0 and len(en_only_md_locations) == 0:
+            self.kind = JP_EN_SAME
+        else:
+            self.kind = JP_EN_DIFFERS
 
-    def __init__(self, filename, is_us, library_chips):
-        all_library_chip_code_combos = set()
-        for chip in library_chips:
-            for chip_code in chip["codes"]:
-                all_library_chip_code_combos.add(f"{chip['name']['en']} {chip_code}")
+        self.location_text_jp = join_md_locations(md_locations_jp) if len(md_locations_jp) != 0 else None
+        self.location_text_en = join_md_locations(md_locations_en) if len(md_locations_en) != 0 else None
 
-        with open(filename, "r") as f:
-            contents = f.read()
-            contents = contents.replace("Level 1:", "Level 1:\n").replace("Level 2:", "Level 2:\n").replace("Level 3:", "Level 3:\n")
-            line_reader = LineReader(contents.splitlines(), filename)
+        # e.g. "A BMD, {{JP}} B GMD / {{EN}} C GMD". a version only MD whose location
+        # text is already shared doesn't change what the reader sees
+        shared_locations = {location for map_name, flag_id, location in shared_md_locations}
+        jp_only_md_locations = [md_location for md_location in jp_only_md_locations if md_location[2] not in shared_locations]
+        en_only_md_locations = [md_location for md_location in en_only_md_locations if md_location[2] not in shared_locations]
 
-        self.all_chip_locations = {}
+        version_only_texts = []
+        if len(jp_only_md_locations) != 0:
+            version_only_texts.append(f"{{{{JP}}}} {join_md_locations(jp_only_md_locations)}")
+        if len(en_only_md_locations) != 0:
+            version_only_texts.append(f"{{{{EN}}}} {join_md_locations(en_only_md_locations)}")
 
-        for line in line_reader:
-            #print(f"line: {line}")
-            map_name = line.split(": ")[1]
-            is_dungeon_comp = dungeon_area_regex.match(map_name) or map_name.startswith("Nebula Area")
-            if "/" in map_name:
-                map_name_jp, map_name_en = map_name.replace(" (JP)", "").replace(" (EN)", "").split(" / ")
-                map_name = f"{{{{JP}}}} {map_name_jp} / {{{{EN}}}} {map_name_en}"
-            else:
-                map_name = map_name.replace("(JP)", "{{JP}}")
-                #if is_us:
-                #    map_name = map_name_en
-                #else:
-                #    map_name = map_name_jp
-
-            while True:
-                line = line_reader.next()
-                if line.strip() != "":
-                    break
-
-            while True:
-                mystery_data_type = line.split("\t", maxsplit=1)[0]
-                #if mystery_data_type in {"Blue", "Purple"}:
-                mystery_data_type_abbrev = f"{mystery_data_type[0]}MD"
-                if mystery_data_type == "Green":
-                    while True:
-                        line = line_reader.next()
-                        #print(line)
-                        if not tab_then_digit_regex.match(line):
-                            break
-                else:
-                    line = line_reader.next()
-
-                after_first_level = False
-
-                while True:
-                    md_contents = multitab_regex.split(line.strip())
-                    #print(f"md_contents: {md_contents}")
-                    if mystery_data_type in {"Blue", "Purple"}:
-                        #if line.endswith(":"):
-                        #    availability = "Rest"
-                        #    line = line_reader.next()
-                        #    md_contents = [""] + multitab_regex.split(line.strip())
-                        #else:
-                        availability = None # md_contents[0].replace(":", "")
-                    elif line.endswith(":"):
-                        availability = line.strip()[:-1]
-                        if is_dungeon_comp:
-                            availability = None
-                            if after_first_level:
-                                line = line_reader.next()
-                                if not line.startswith("\t"):
-                                    break
-
-                        #print(f"availability: {availability}")
-                        line = line_reader.next()
-                        #md_contents = multitab_regex.split(line.strip())
-                        #print(f"md_contents: {md_contents}")
-                        after_first_level = True
-                        continue
-
-                    if mystery_data_type == "Green":
-                        reward_padded = md_contents[3]
-                    else:
-                        reward_padded = md_contents[4]
-                    reward = multispace_regex.sub(" ", reward_padded)
-
-                    abbrev_availability = bn5_availability_to_abbrev_availability.get(availability, availability)
-                    #if abbrev_availability == "Rest" and mystery_data_type == "Green":
-                    #    if map_name in {"Undernet 5", "Black Earth 1", "Black Earth 2"}:
-                    #        abbrev_availability = "Always"
-                    #    else:
-                    #        abbrev_availability = "G3+"
-                    #elif map_name == "Sharo Area" and reward == "BlkBomb Z":
-                    #    abbrev_availability = "Always"
-
-                    #print(line)
-                    if reward not in all_library_chip_code_combos:
-                        pass #print(f"ignored {reward}")
-                    else:
-                        if abbrev_availability is None:
-                            location = f"{map_name} {mystery_data_type_abbrev}"
-                        else:
-                            location = f"{map_name} {mystery_data_type_abbrev} ({abbrev_availability})"
-                            
-                        #print(f"location: {location}")
-                        self.add_location(reward, location)
-    
-                    line = line_reader.next()
-                    if not line.startswith("\t"):
-                        break
-
-                if line.startswith("---------------"):
-                    break
-
-    def add_location(self, chip_full, location):
-        chip_locations = self.all_chip_locations.get(chip_full)
-        if chip_locations is None:
-            chip_locations = {location: True}
-            self.all_chip_locations[chip_full] = chip_locations
-        else:
-            chip_locations[location] = True
-
-    def find_chip(self, chip_name, code):
-        chip_locations = self.all_chip_locations.get(f"{chip_name} {code}")
-        if chip_locations is None:
-            return None
-        else:
-            return ", ".join(chip_locations.keys())
+        location_text_parts = []
+        if len(shared_md_locations) != 0:
+            location_text_parts.append(join_md_locations(shared_md_locations))
+        if len(version_only_texts) != 0:
+            location_text_parts.append(" / ".join(version_only_texts))
 
-class MysteryDataParser6:
-    __slots__ = ("all_chip_locations",)
+        self.location_text = ", ".join(location_text_parts)
 
-    def __init__(self, filename, is_us, library_chips):
-        all_library_chip_code_combos = set()
-        for chip in library_chips:
-            for chip_code in chip["codes"]:
-                all_library_chip_code_combos.add(f"{chip['name']['en']} {chip_code}")
+# joins the JP and EN parses of one game on (map, MD flag ID, location), so that
+# every chip's JP/EN difference is worked out once instead of on every lookup
+class JpEnMysteryData:
+    __slots__ = ("chip_locations",)
 
-        with open(filename, "r") as f:
-            contents = f.read()
-            contents = contents.replace("Contents:", "Contents:\n")
-            line_reader = LineReader(contents.splitlines(), filename)
+    def __init__(self, mystery_data_jp, mystery_data_en):
+        self.chip_locations = {}
+        all_chip_md_locations_jp = mystery_data_jp.all_chip_md_locations
+        all_chip_md_locations_en = mystery_data_en.all_chip_md_locations
 
-        self.all_chip_locations = {}
+        for chip_key, md_locations_jp in all_chip_md_locations_jp.items():
+            self.chip_locations[chip_key] = JpEnChipLocations(md_locations_jp, all_chip_md_locations_en.get(chip_key, {}))
 
-        for line in line_reader:
-            #print(f"line: {line}")
-            map_name = line.split(": ")[1]
-            #is_dungeon_comp = dungeon_area_regex.match(map_name) or map_name.startswith("Nebula Area")
-            if "/" in map_name:
-                map_name_jp, map_name_en = map_name.replace(" (JP)", "").replace(" (EN)", "").split(" / ")
-                map_name = f"{{{{JP}}}} {map_name_jp} / {{{{EN}}}} {map_name_en}"
-            else:
-                map_name = map_name.replace("(JP)", "{{JP}}")
-                #if is_us:
-                #    map_name = map_name_en
-                #else:
-                #    map_name = map_name_jp
-
-            while True:
-                line = line_reader.next()
-                if line.strip() != "":
-                    break
-
-            while True:
-                mystery_data_type = line.split(maxsplit=1)[0]
-                #if mystery_data_type in {"Blue", "Purple"}:
-                mystery_data_type_abbrev = f"{mystery_data_type[0]}MD"
-                if mystery_data_type == "Green":
-                    while True:
-                        line = line_reader.next()
-                        #print(line)
-                        if not spaces_then_digit_regex.match(line):
-                            print(f"line: {line}")
-                            break
-                else:
-                    line = line_reader.next()
-
-                after_first_level = False
-
-                while True:
-                    #print(f"line: {line}")
-                    md_contents = multitab_regex.split(line.strip())
-                    print(f"md_contents: {md_contents}")
-                    #if mystery_data_type in {"Blue", "Purple"}:
-                    #    #if line.endswith(":"):
-                    #    #    availability = "Rest"
-                    #    #    line = line_reader.next()
-                    #    #    md_contents = [""] + multitab_regex.split(line.strip())
-                    #    #else:
-                    #    availability = None # md_contents[0].replace(":", "")
-                    if line.endswith("Contents:"):
-                        #print(f"ends with contents")
-                        #availability = line.strip()[:-1]
-                        #if is_dungeon_comp:
-                        #    availability = None
-                        #    if after_first_level:
-                        #        line = line_reader.next()
-                        #        if not line.startswith("\t"):
-                        #            break
-
-                        #print(f"availability: {availability}")
-                        line = line_reader.next()
-                        #md_contents = multitab_regex.split(line.strip())
-                        #print(f"md_contents: {md_contents}")
-                        continue
-
-                    reward_padded = md_contents[3]
-                    reward = multispace_regex.sub(" ", reward_padded)
-
-                    if reward not in all_library_chip_code_combos:
-                        pass #print(f"ignored {reward}")
-                    else:
-                        location = f"{map_name} {mystery_data_type_abbrev}"
-
-                        self.add_location(reward, location)
-    
-                    #print(f"line before: {line}")
-                    line = line_reader.next()
-                    #print(f"line after: {line}")
-
-                    if not line.startswith("    "):
-                        break
-
-                if line.startswith("---------------"):
-                    break
-
-    def add_location(self, chip_full, location):
-        chip_locations = self.all_chip_locations.get(chip_full)
-        if chip_locations is None:
-            chip_locations = {location: True}
-            self.all_chip_locations[chip_full] = chip_locations
-        else:
-            chip_locations[location] = True
+        for chip_key, md_locations_en in all_chip_md_locations_en.items():
+            if chip_key not in self.chip_locations:
+                self.chip_locations[chip_key] = JpEnChipLocations({}, md_locations_en)
 
     def find_chip(self, chip_name, code):
-        chip_locations = self.all_chip_locations.get(f"{chip_name} {code}")
-        if chip_locations is None:
-            return None
-        else:
-            return ", ".join(chip_locations.keys())
+        return self.chip_locations.get(chip_keys.lookup_chip_key(chip_name, code))
+
+    def find_chip_key(self, chip_key):
+        return self.chip_locations.get(chip_key)
 
 def main():
-    import json
-    from gen_bn4_chips_wiki_table import convert_v2_format_to_v1, is_library_chip
+    from chip_library import load_chip_library
 
-    with open("bn4_chips_v2.json", "r") as f:
-        chips_v2 = json.load(f)
+    chip_library = load_chip_library(4)
 
-    chips = convert_v2_format_to_v1(chips_v2)
-    library_chips = list(filter(is_library_chip, chips))
+    pipeline = MysteryDataPipeline("bn4_mystery_data.txt")
+    bn4_mystery_data = pipeline.add_sink(MysteryDataParser(None, 4, chip_library))
+    pipeline.add_sink(MysteryDataJsonSink("bn4_mystery_data.json"))
+    pipeline.run()
 
-    bn4_mystery_data = MysteryDataParser("bn4_mystery_data.txt", 4, library_chips)
     output = ""
-    for chip_full, chip_locations in bn4_mystery_data.all_chip_locations.items():
-        output += f"{chip_full}: {', '.join(chip_locations.keys())}\n"
+    for chip_key, chip_locations in bn4_mystery_data.all_chip_locations.items():
+        output += f"{chip_keys.chip_key_to_chip_full(chip_key)}: {', '.join(chip_locations.keys())}\n"
 
     print(output)
 
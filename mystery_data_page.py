@@ -1,17 +1,8 @@
-import re
+import io
+import os
 import collections
 
-from line_reader import LineReader
-
-multitab_regex = re.compile(r"\t+")
-multispace_regex = re.compile(r" +")
-tab_then_digit_regex = re.compile(r"^\t+[0-9]")
-spaces_then_digit_regex = re.compile(r"^    +[0-9]")
-
-availability_to_abbrev_availability = {
-    "Game 1": "G1",
-    "Game 2": "G2",
-}
+from mystery_data import MysteryDataPipeline, MysteryDataJsonSink, format_jp_en_map_name, game_cycles, md_label_cycle_indices
 
 """
 {| class="wikitable"
@@ -41,7 +32,7 @@ class MysteryData:
         self.chance = chance
         self.is_trapped = is_trapped
 
-class BN4MapMysteryData:
+class MapMysteryData:
     __slots__ = ("map_name", "set_data", "gmds")
 
     def __init__(self, map_name):
@@ -49,411 +40,122 @@ class BN4MapMysteryData:
         self.set_data = collections.defaultdict(list)
         self.gmds = collections.defaultdict(lambda: collections.defaultdict(list))
 
-class MysteryDataParser:
-    __slots__ = ("all_chip_locations", "output")
-
-    def __init__(self, filename):
-        all_library_chip_code_combos = set()
-
-        with open(filename, "r") as f:
-            contents = f.read()
-            contents = contents.replace("Game 1:", "Game 1:\n").replace("Game 2:", "Game 2:\n").replace("Rest:", "Rest:\n").replace("Always:", "Always:\n")
-            line_reader = LineReader(contents.splitlines(), filename)
-
-        self.all_chip_locations = {}
-        output = ""
-
-        for line in line_reader:
-            map_name = line.split(": ")[1]
-            cur_map_mds = BN4MapMysteryData(map_name)
-
-            while True:
-                line = line_reader.next()
-                if line.strip() != "":
-                    break
-
-            cur_gmd_index = 0
-            while True:
-                mystery_data_type = line.split("\t", maxsplit=1)[0]
-                #if mystery_data_type in {"Blue", "Purple"}:
-                mystery_data_type_abbrev = f"{mystery_data_type[0]}MD"
-                if mystery_data_type == "Green":
-                    cur_gmd_index += 1
-                    while True:
-                        line = line_reader.next()
-                        if not tab_then_digit_regex.match(line):
-                            break
-                else:
-                    line = line_reader.next()
-    
-                while True:
-                    md_contents = multitab_regex.split(line.strip())
-                    #print(f"md_contents: {md_contents}")
-                    if mystery_data_type in {"Blue", "Purple"}:
-                        if line.endswith(":"):
-                            availability = "Rest"
-                            line = line_reader.next()
-                            md_contents = [""] + multitab_regex.split(line.strip())
-                        else:
-                            availability = md_contents[0].replace(":", "")
-                    elif line.endswith(":"):
-                        availability = line.strip()[:-1]
-                        line = line_reader.next()
-                        continue
-
-                    is_trapped = None
-
-                    if mystery_data_type == "Green":
-                        chance = md_contents[1]
-                        reward_padded = md_contents[3]
-                        if len(md_contents) == 5:
-                            is_trapped = True
-                        else:
-                            is_trapped = False
-                    else:
-                        reward_padded = md_contents[4]
-                    reward = multispace_regex.sub(" ", reward_padded)
-
-                    abbrev_availability = availability_to_abbrev_availability.get(availability, availability)
-                    if abbrev_availability == "Rest" and mystery_data_type == "Green":
-                        if map_name in {"Undernet 5", "Black Earth 1", "Black Earth 2"}:
-                            abbrev_availability = "Always"
-                        else:
-                            availability = "Game 3+"
-                            abbrev_availability = "G3+"
-
-                    #print(line)
-                    print(f"reward: {reward}, cur_gmd_index: {cur_gmd_index}")
-                    if mystery_data_type in {"Blue", "Purple"}:
-                        cur_map_mds.set_data[availability].append(MysteryData(mystery_data_type_abbrev, reward))
-                    else:
-                        cur_map_mds.gmds[cur_gmd_index][availability].append(MysteryData(mystery_data_type_abbrev, reward, chance, is_trapped))
-
-                    #if reward not in all_library_chip_code_combos:
-                    #    pass #print(f"ignored {reward}")
-                    #else:
-                    #    location = f"{map_name} {mystery_data_type_abbrev} ({abbrev_availability})"
-                    #    #print(f"location: {location}")
-                    #    self.add_location(reward, location)
-    
-                    line = line_reader.next()
-                    if not line.startswith("\t"):
-                        break
-
-                if line.startswith("---------------"):
-                    break
+# a MysteryDataPipeline sink that writes each map's wikitable to f as soon as the
+# map's last MD has been seen, so only one map is ever held in memory
+class MysteryDataPageWriter:
+    __slots__ = ("f", "game_number", "cur_map_mds", "cur_gmd_index")
+
+    def __init__(self, f, game_number):
+        self.f = f
+        self.game_number = game_number
+        self.cur_map_mds = None
+        self.cur_gmd_index = 0
+
+    def add_mystery_data(self, mystery_data):
+        map_name = mystery_data.map_name
+        if self.cur_map_mds is None or self.cur_map_mds.map_name != map_name:
+            if self.cur_map_mds is not None:
+                self.write_map(self.cur_map_mds)
+            self.cur_map_mds = MapMysteryData(map_name)
+            self.cur_gmd_index = 0
+
+        cur_map_mds = self.cur_map_mds
+        if mystery_data.md_type == "Green":
+            self.cur_gmd_index += 1
+
+        label_cycle_indices = md_label_cycle_indices(self.game_number, mystery_data)
+        for md_reward in mystery_data.rewards:
+            availability = md_reward.label
+            if mystery_data.md_type in {"Blue", "Purple"}:
+                cur_map_mds.set_data[availability].append(MysteryData(mystery_data.md_type_abbrev, md_reward.reward))
+            else:
+                # a GMD "Rest" that covers a single cycle is named after that cycle
+                cycle_indices = label_cycle_indices[availability]
+                if availability == "Rest" and len(cycle_indices) == 1:
+                    availability = game_cycles[self.game_number][cycle_indices[0]]
+                cur_map_mds.gmds[self.cur_gmd_index][availability].append(MysteryData(mystery_data.md_type_abbrev, md_reward.reward, md_reward.chance, md_reward.is_trap))
+
+    def finish(self):
+        if self.cur_map_mds is not None:
+            self.write_map(self.cur_map_mds)
+            self.cur_map_mds = None
+
+    def write_map(self, cur_map_mds):
+        f = self.f
+        if self.game_number == 4:
+            map_name = cur_map_mds.map_name
+        else:
+            map_name = format_jp_en_map_name(cur_map_mds.map_name)
 
-            output += f'''\
+        f.write(f"""\
 {{| class="wikitable"
-|+ {cur_map_mds.map_name}
-'''
+|+ {map_name}
+""")
 
-            if len(cur_map_mds.set_data) != 0:
-                output += '''\
-|-
-! !! '''
-                output += " !! ".join(sorted(cur_map_mds.set_data.keys())) + "\n"
-                output += """\
+        if len(cur_map_mds.set_data) != 0:
+            f.write("|-\n! !! ")
+            f.write(" !! ".join(sorted(cur_map_mds.set_data.keys())))
+            f.write("""
 |-
 ! scope="row"| Set Data
-|| """
-                set_data_grouped = []
-    
-                for set_mystery_data_by_availability in cur_map_mds.set_data.values():
-                    set_mystery_data_for_availability = " <br/> ".join(f"({set_mystery_data.md_type_abbrev}) {set_mystery_data.contents}" for set_mystery_data in set_mystery_data_by_availability)
-                    set_data_grouped.append(set_mystery_data_for_availability)
-    
-                output += " || ".join(set_data_grouped) + "\n"
-
-            if len(cur_map_mds.gmds) != 0:
-                output += """\
-|-
-! !! """
-
-                output += " !! ".join(sorted(cur_map_mds.gmds[1].keys())) + "\n"
-
-                for gmd_index, gmds_for_index in cur_map_mds.gmds.items():
-                    output += f'''\
+|| """)
+            f.write(" || ".join(
+                " <br/> ".join(f"({set_mystery_data.md_type_abbrev}) {set_mystery_data.contents}" for set_mystery_data in set_mystery_data_by_availability)
+                for set_mystery_data_by_availability in cur_map_mds.set_data.values()
+            ))
+            f.write("\n")
+
+        if len(cur_map_mds.gmds) != 0:
+            f.write("|-\n! !! ")
+            f.write(" !! ".join(sorted(cur_map_mds.gmds[1].keys())))
+            f.write("\n")
+
+            for gmd_index, gmds_for_index in cur_map_mds.gmds.items():
+                f.write(f"""\
 |-
 ! scope="row" | GMD {gmd_index}
-|| '''
-                    gmds_grouped = []
-    
-                    for gmds_by_availability in gmds_for_index.values():
-                        gmds_for_availability = " <br/> ".join(f"{gmd.contents} ({{{{chance|{gmd.chance}}}}}){' (Trap)' if gmd.is_trapped else ''}" for gmd in gmds_by_availability)
-                        gmds_grouped.append(gmds_for_availability)
-    
-                    output += " || ".join(gmds_grouped) + "\n"
-
-            output += "|}\n"
-
-        self.output = output
-
-    def add_location(self, chip_full, location):
-        chip_locations = self.all_chip_locations.get(chip_full)
-        if chip_locations is None:
-            chip_locations = {location: True}
-            self.all_chip_locations[chip_full] = chip_locations
-        else:
-            chip_locations[location] = True
-
-    def find_chip(self, chip_name, code):
-        chip_locations = self.all_chip_locations.get(f"{chip_name} {code}")
-        if chip_locations is None:
-            return None
-        else:
-            return ", ".join(chip_locations.keys())
-
-dungeon_area_regex = re.compile(r"^(Main|Drill|Ship|Gargoyle|Factory) Comp")
-
-bn5_availability_to_abbrev_availability = {
-    "Level 1": "L1",
-    "Level 2": "L2",
-    "Level 3": "L3",
-}
-
-class MysteryDataParser5:
-    __slots__ = ("all_chip_locations",)
-
-    def __init__(self, filename, is_us, library_chips):
-        all_library_chip_code_combos = set()
-        for chip in library_chips:
-            for chip_code in chip["codes"]:
-                all_library_chip_code_combos.add(f"{chip['name']['en']} {chip_code}")
-
-        with open(filename, "r") as f:
-            contents = f.read()
-            contents = contents.replace("Level 1:", "Level 1:\n").replace("Level 2:", "Level 2:\n").replace("Level 3:", "Level 3:\n")
-            line_reader = LineReader(contents.splitlines(), filename)
-
-        self.all_chip_locations = {}
-
-        for line in line_reader:
-            #print(f"line: {line}")
-            map_name = line.split(": ")[1]
-            is_dungeon_comp = dungeon_area_regex.match(map_name) or map_name.startswith("Nebula Area")
-            if "/" in map_name:
-                map_name_jp, map_name_en = map_name.replace(" (JP)", "").replace(" (EN)", "").split(" / ")
-                map_name = f"{{{{JP}}}} {map_name_jp} / {{{{EN}}}} {map_name_en}"
-            else:
-                map_name = map_name.replace("(JP)", "{{JP}}")
-                #if is_us:
-                #    map_name = map_name_en
-                #else:
-                #    map_name = map_name_jp
-
-            while True:
-                line = line_reader.next()
-                if line.strip() != "":
-                    break
-
-            while True:
-                mystery_data_type = line.split("\t", maxsplit=1)[0]
-                #if mystery_data_type in {"Blue", "Purple"}:
-                mystery_data_type_abbrev = f"{mystery_data_type[0]}MD"
-                if mystery_data_type == "Green":
-                    while True:
-                        line = line_reader.next()
-                        #print(line)
-                        if not tab_then_digit_regex.match(line):
-                            break
-                else:
-                    line = line_reader.next()
-
-                after_first_level = False
-
-                while True:
-                    md_contents = multitab_regex.split(line.strip())
-                    #print(f"md_contents: {md_contents}")
-                    if mystery_data_type in {"Blue", "Purple"}:
-                        #if line.endswith(":"):
-                        #    availability = "Rest"
-                        #    line = line_reader.next()
-                        #    md_contents = [""] + multitab_regex.split(line.strip())
-                        #else:
-                        availability = None # md_contents[0].replace(":", "")
-                    elif line.endswith(":"):
-                        availability = line.strip()[:-1]
-                        if is_dungeon_comp:
-                            availability = None
-                            if after_first_level:
-                                line = line_reader.next()
-                                if not line.startswith("\t"):
-                                    break
-
-                        #print(f"availability: {availability}")
-                        line = line_reader.next()
-                        #md_contents = multitab_regex.split(line.strip())
-                        #print(f"md_contents: {md_contents}")
-                        after_first_level = True
-                        continue
-
-                    if mystery_data_type == "Green":
-                        reward_padded = md_contents[3]
-                    else:
-                        reward_padded = md_contents[4]
-                    reward = multispace_regex.sub(" ", reward_padded)
-
-                    abbrev_availability = bn5_availability_to_abbrev_availability.get(availability, availability)
-                    #if abbrev_availability == "Rest" and mystery_data_type == "Green":
-                    #    if map_name in {"Undernet 5", "Black Earth 1", "Black Earth 2"}:
-                    #        abbrev_availability = "Always"
-                    #    else:
-                    #        abbrev_availability = "G3+"
-                    #elif map_name == "Sharo Area" and reward == "BlkBomb Z":
-                    #    abbrev_availability = "Always"
-
-                    #print(line)
-                    if reward not in all_library_chip_code_combos:
-                        pass #print(f"ignored {reward}")
-                    else:
-                        if abbrev_availability is None:
-                            location = f"{map_name} {mystery_data_type_abbrev}"
-                        else:
-                            location = f"{map_name} {mystery_data_type_abbrev} ({abbrev_availability})"
-                            
-                        #print(f"location: {location}")
-                        self.add_location(reward, location)
-    
-                    line = line_reader.next()
-                    if not line.startswith("\t"):
-                        break
-
-                if line.startswith("---------------"):
-                    break
-
-    def add_location(self, chip_full, location):
-        chip_locations = self.all_chip_locations.get(chip_full)
-        if chip_locations is None:
-            chip_locations = {location: True}
-            self.all_chip_locations[chip_full] = chip_locations
-        else:
-            chip_locations[location] = True
-
-    def find_chip(self, chip_name, code):
-        chip_locations = self.all_chip_locations.get(f"{chip_name} {code}")
-        if chip_locations is None:
-            return None
-        else:
-            return ", ".join(chip_locations.keys())
-
-class MysteryDataParser6:
-    __slots__ = ("all_chip_locations",)
-
-    def __init__(self, filename, is_us, library_chips):
-        all_library_chip_code_combos = set()
-        for chip in library_chips:
-            for chip_code in chip["codes"]:
-                all_library_chip_code_combos.add(f"{chip['name']['en']} {chip_code}")
-
-        with open(filename, "r") as f:
-            contents = f.read()
-            contents = contents.replace("Contents:", "Contents:\n")
-            line_reader = LineReader(contents.splitlines(), filename)
-
-        self.all_chip_locations = {}
-
-        for line in line_reader:
-            #print(f"line: {line}")
-            map_name = line.split(": ")[1]
-            #is_dungeon_comp = dungeon_area_regex.match(map_name) or map_name.startswith("Nebula Area")
-            if "/" in map_name:
-                map_name_jp, map_name_en = map_name.replace(" (JP)", "").replace(" (EN)", "").split(" / ")
-                map_name = f"{{{{JP}}}} {map_name_jp} / {{{{EN}}}} {map_name_en}"
-            else:
-                map_name = map_name.replace("(JP)", "{{JP}}")
-                #if is_us:
-                #    map_name = map_name_en
-                #else:
-                #    map_name = map_name_jp
-
-            while True:
-                line = line_reader.next()
-                if line.strip() != "":
-                    break
-
-            while True:
-                mystery_data_type = line.split(maxsplit=1)[0]
-                #if mystery_data_type in {"Blue", "Purple"}:
-                mystery_data_type_abbrev = f"{mystery_data_type[0]}MD"
-                if mystery_data_type == "Green":
-                    while True:
-                        line = line_reader.next()
-                        #print(line)
-                        if not spaces_then_digit_regex.match(line):
-                            print(f"line: {line}")
-                            break
-                else:
-                    line = line_reader.next()
-
-                after_first_level = False
-
-                while True:
-                    #print(f"line: {line}")
-                    md_contents = multitab_regex.split(line.strip())
-                    print(f"md_contents: {md_contents}")
-                    #if mystery_data_type in {"Blue", "Purple"}:
-                    #    #if line.endswith(":"):
-                    #    #    availability = "Rest"
-                    #    #    line = line_reader.next()
-                    #    #    md_contents = [""] + multitab_regex.split(line.strip())
-                    #    #else:
-                    #    availability = None # md_contents[0].replace(":", "")
-                    if line.endswith("Contents:"):
-                        #print(f"ends with contents")
-                        #availability = line.strip()[:-1]
-                        #if is_dungeon_comp:
-                        #    availability = None
-                        #    if after_first_level:
-                        #        line = line_reader.next()
-                        #        if not line.startswith("\t"):
-                        #            break
-
-                        #print(f"availability: {availability}")
-                        line = line_reader.next()
-                        #md_contents = multitab_regex.split(line.strip())
-                        #print(f"md_contents: {md_contents}")
-                        continue
-
-                    reward_padded = md_contents[3]
-                    reward = multispace_regex.sub(" ", reward_padded)
-
-                    if reward not in all_library_chip_code_combos:
-                        pass #print(f"ignored {reward}")
-                    else:
-                        location = f"{map_name} {mystery_data_type_abbrev}"
-
-                        self.add_location(reward, location)
-    
-                    #print(f"line before: {line}")
-                    line = line_reader.next()
-                    #print(f"line after: {line}")
-
-                    if not line.startswith("    "):
-                        break
-
-                if line.startswith("---------------"):
-                    break
-
-    def add_location(self, chip_full, location):
-        chip_locations = self.all_chip_locations.get(chip_full)
-        if chip_locations is None:
-            chip_locations = {location: True}
-            self.all_chip_locations[chip_full] = chip_locations
-        else:
-            chip_locations[location] = True
-
-    def find_chip(self, chip_name, code):
-        chip_locations = self.all_chip_locations.get(f"{chip_name} {code}")
-        if chip_locations is None:
-            return None
-        else:
-            return ", ".join(chip_locations.keys())
+|| """)
+                f.write(" || ".join(
+                    " <br/> ".join(f"{gmd.contents} ({{{{chance|{gmd.chance}}}}}){' (Trap)' if gmd.is_trapped else ''}" for gmd in gmds_by_availability)
+                    for gmds_by_availability in gmds_for_index.values()
+                ))
+                f.write("\n")
+
+        f.write("|}\n")
+
+# the BN4 page as one string, for callers that want it in memory
+class MysteryDataParser(MysteryDataPageWriter):
+    __slots__ = ("output",)
+
+    # with None it waits to be added to a shared MysteryDataPipeline
+    def __init__(self, filename, parse_cache=None):
+        super().__init__(io.StringIO(), 4)
+        self.output = ""
+
+        if filename is not None:
+            MysteryDataPipeline(filename, (self,)).run(parse_cache)
+
+    def finish(self):
+        super().finish()
+        self.output = self.f.getvalue()
+
+page_inputs = (
+    ("bn4_mystery_data.txt", 4),
+    ("exe5_mystery_data.txt", 5),
+    ("bn5_mystery_data.txt", 5),
+    ("exe6_mystery_data.txt", 6),
+    ("bn6_mystery_data.txt", 6),
+)
+
+def write_mystery_data_page(filename, game_number, output_filename, extra_sinks=(), parse_cache=None):
+    with open(output_filename, "w+") as f:
+        MysteryDataPipeline(filename, (MysteryDataPageWriter(f, game_number), *extra_sinks)).run(parse_cache)
 
 def main():
-    bn4_mystery_data = MysteryDataParser("bn4_mystery_data.txt")
-    with open("bn4_mystery_data_wiki_out.txt", "w+") as f:
-        f.write(bn4_mystery_data.output)
+    # one pass over each dump for both the area tables and the JSON export
+    for filename, game_number in page_inputs:
+        basename = os.path.splitext(filename)[0]
+        write_mystery_data_page(filename, game_number, f"{basename}_wiki_out.txt", (MysteryDataJsonSink(f"{basename}.json"),))
 
 if __name__ == "__main__":
     main()
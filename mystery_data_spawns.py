@@ -0,0 +1,242 @@
+import sys
+
+import numpy as np
+
+from symbol_table import SymbolTable
+from mystery_data import load_mystery_data_file
+
+# one row per spawn location of every MD. md indexes SpawnIndex.mds, the
+# spawn's chance of being picked is numerator/denominator
+spawn_dtype = np.dtype([
+    ("map", np.uint16),
+    ("md", np.uint32),
+    ("slot", np.uint8),
+    ("x", np.int16),
+    ("y", np.int16),
+    ("z", np.int16),
+    ("numerator", np.uint16),
+    ("denominator", np.uint16),
+])
+
+# maps span roughly -650 to 650 on both axes, so a 64 unit grid has a few spawns per cell at most
+DEFAULT_CELL_SIZE = 64
+
+all_spawn_index_inputs = (
+    ("bn4_mystery_data.txt", "4"),
+    ("exe5_mystery_data.txt", "5JP"),
+    ("bn5_mystery_data.txt", "5EN"),
+    ("exe6_mystery_data.txt", "6JP"),
+    ("bn6_mystery_data.txt", "6EN"),
+)
+
+class SpawnResult:
+    __slots__ = ("dataset", "map_name", "flag_id", "md_type", "slot", "x", "y", "z", "chance", "distance")
+
+    def __init__(self, dataset, map_name, flag_id, md_type, slot, x, y, z, chance, distance):
+        self.dataset = dataset
+        self.map_name = map_name
+        self.flag_id = flag_id
+        self.md_type = md_type
+        self.slot = slot
+        self.x = x
+        self.y = y
+        self.z = z
+        self.chance = chance
+        self.distance = distance
+
+    def __str__(self):
+        parts = [f"[{self.dataset}] {self.map_name} {self.md_type} {self.flag_id} #{self.slot} ({self.x}, {self.y}, {self.z}) {self.chance}"]
+        if self.distance is not None:
+            parts.append(f"at {self.distance:.1f}")
+
+        return " ".join(parts)
+
+class SpawnIndex:
+    __slots__ = ("maps", "mds", "spawns", "cell_size", "grid", "map_cell_bounds")
+
+    def __init__(self, inputs=all_spawn_index_inputs, parse_cache=None, cell_size=DEFAULT_CELL_SIZE):
+        # maps are keyed by (dataset, map name), since JP and EN dumps share map names
+        self.maps = SymbolTable()
+        self.mds = []
+        self.cell_size = cell_size
+
+        columns = {name: [] for name in spawn_dtype.names}
+
+        for filename, dataset in inputs:
+            for mystery_data in load_mystery_data_file(filename, parse_cache).mds:
+                map_id = self.maps.intern((dataset, mystery_data.map_name))
+                md_id = len(self.mds)
+                self.mds.append(mystery_data)
+
+                for spawn in mystery_data.spawns:
+                    columns["map"].append(map_id)
+                    columns["md"].append(md_id)
+                    columns["slot"].append(spawn.slot)
+                    columns["x"].append(spawn.x)
+                    columns["y"].append(spawn.y)
+                    columns["z"].append(spawn.z)
+                    columns["numerator"].append(spawn.numerator)
+                    columns["denominator"].append(spawn.denominator)
+
+        self.spawns = np.empty(len(columns["map"]), dtype=spawn_dtype)
+        for name, column in columns.items():
+            self.spawns[name] = column
+
+        # uniform grid: (map, cell x, cell y) -> spawn row indices
+        cell_xs = self.spawns["x"].astype(np.int32) // cell_size
+        cell_ys = self.spawns["y"].astype(np.int32) // cell_size
+        grid = {}
+        for row_index, cell_key in enumerate(zip(self.spawns["map"].tolist(), cell_xs.tolist(), cell_ys.tolist())):
+            grid.setdefault(cell_key, []).append(row_index)
+
+        self.grid = {cell_key: np.array(row_indices, dtype=np.int64) for cell_key, row_indices in grid.items()}
+
+        # (min cell x, max cell x, min cell y, max cell y) per map, to know when a search has seen everything
+        self.map_cell_bounds = {}
+        for map_id, cell_x, cell_y in self.grid.keys():
+            bounds = self.map_cell_bounds.get(map_id)
+            if bounds is None:
+                self.map_cell_bounds[map_id] = (cell_x, cell_x, cell_y, cell_y)
+            else:
+                self.map_cell_bounds[map_id] = (min(bounds[0], cell_x), max(bounds[1], cell_x), min(bounds[2], cell_y), max(bounds[3], cell_y))
+
+    def map_id(self, dataset, map_name):
+        map_id = self.maps.get((dataset, map_name))
+        if map_id is None:
+            raise RuntimeError(f"No mystery data for map \"{map_name}\" in dataset {dataset}!")
+
+        return map_id
+
+    def ring_row_indices(self, map_id, center_cell_x, center_cell_y, ring):
+        # the cells at Chebyshev distance exactly ring from the center cell
+        row_index_arrays = []
+        for cell_x in range(center_cell_x - ring, center_cell_x + ring + 1):
+            if abs(cell_x - center_cell_x) == ring:
+                cell_ys = range(center_cell_y - ring, center_cell_y + ring + 1)
+            else:
+                cell_ys = (center_cell_y - ring, center_cell_y + ring)
+
+            for cell_y in cell_ys:
+                row_indices = self.grid.get((map_id, cell_x, cell_y))
+                if row_indices is not None:
+                    row_index_arrays.append(row_indices)
+
+        return row_index_arrays
+
+    def distances(self, row_indices, x, y, z):
+        spawns = self.spawns[row_indices]
+        dx = spawns["x"].astype(np.float64) - x
+        dy = spawns["y"].astype(np.float64) - y
+        dz = spawns["z"].astype(np.float64) - z
+        return np.sqrt(dx * dx + dy * dy + dz * dz)
+
+    def within_radius(self, dataset, map_name, x, y, radius, z=0):
+        map_id = self.map_id(dataset, map_name)
+        cell_size = self.cell_size
+        row_index_arrays = []
+
+        for cell_x in range(int((x - radius) // cell_size), int((x + radius) // cell_size) + 1):
+            for cell_y in range(int((y - radius) // cell_size), int((y + radius) // cell_size) + 1):
+                row_indices = self.grid.get((map_id, cell_x, cell_y))
+                if row_indices is not None:
+                    row_index_arrays.append(row_indices)
+
+        if len(row_index_arrays) == 0:
+            return []
+
+        row_indices = np.concatenate(row_index_arrays)
+        distances = self.distances(row_indices, x, y, z)
+        in_radius = np.flatnonzero(distances <= radius)
+        closest_first = in_radius[np.argsort(distances[in_radius], kind="stable")]
+        return self.to_results(row_indices[closest_first], distances[closest_first])
+
+    def nearest(self, dataset, map_name, x, y, z=0, k=1):
+        map_id = self.map_id(dataset, map_name)
+        cell_size = self.cell_size
+        center_cell_x = int(x // cell_size)
+        center_cell_y = int(y // cell_size)
+        min_cell_x, max_cell_x, min_cell_y, max_cell_y = self.map_cell_bounds[map_id]
+        # the ring past which no cell of the map is left
+        last_ring = max(center_cell_x - min_cell_x, max_cell_x - center_cell_x, center_cell_y - min_cell_y, max_cell_y - center_cell_y, 0)
+
+        row_index_arrays = []
+        ring = 0
+        while True:
+            row_index_arrays.extend(self.ring_row_indices(map_id, center_cell_x, center_cell_y, ring))
+            if len(row_index_arrays) != 0:
+                row_indices = np.concatenate(row_index_arrays)
+                distances = self.distances(row_indices, x, y, z)
+                # every spawn not seen yet is at least ring * cell_size away
+                if ring >= last_ring or np.count_nonzero(distances <= ring * cell_size) >= k:
+                    break
+            elif ring >= last_ring:
+                return []
+
+            ring += 1
+
+        closest = np.argsort(distances, kind="stable")[:k]
+        return self.to_results(row_indices[closest], distances[closest])
+
+    def shared_spawn_points(self, dataset=None):
+        # groups of MD slots that can spawn at exactly the same point of the same map
+        spawns = self.spawns
+        if dataset is not None:
+            spawns_row_indices = np.flatnonzero(np.isin(spawns["map"], [map_id for map_id, (map_dataset, map_name) in enumerate(self.maps.names) if map_dataset == dataset]))
+        else:
+            spawns_row_indices = np.arange(len(spawns))
+
+        selected = spawns[spawns_row_indices]
+        order = np.lexsort((selected["z"], selected["y"], selected["x"], selected["map"]))
+        sorted_spawns = selected[order]
+        point_columns = ("map", "x", "y", "z")
+        starts_group = np.ones(len(sorted_spawns), dtype=bool)
+        if len(sorted_spawns) != 0:
+            same_as_previous = np.ones(len(sorted_spawns) - 1, dtype=bool)
+            for name in point_columns:
+                same_as_previous &= sorted_spawns[name][1:] == sorted_spawns[name][:-1]
+            starts_group[1:] = ~same_as_previous
+
+        group_starts = np.flatnonzero(starts_group)
+        group_ends = np.append(group_starts[1:], len(sorted_spawns))
+
+        shared_groups = []
+        for group_start, group_end in zip(group_starts.tolist(), group_ends.tolist()):
+            if group_end - group_start > 1:
+                shared_groups.append(self.to_results(spawns_row_indices[order[group_start:group_end]], None))
+
+        return shared_groups
+
+    def to_results(self, row_indices, distances):
+        results = []
+        for i, row_index in enumerate(row_indices.tolist()):
+            spawn = self.spawns[row_index]
+            mystery_data = self.mds[int(spawn["md"])]
+            dataset, map_name = self.maps[int(spawn["map"])]
+            distance = float(distances[i]) if distances is not None else None
+            results.append(SpawnResult(dataset, map_name, mystery_data.flag_id, mystery_data.md_type, int(spawn["slot"]), int(spawn["x"]), int(spawn["y"]), int(spawn["z"]), f"{int(spawn['numerator'])}/{int(spawn['denominator'])}", distance))
+
+        return results
+
+def main():
+    if len(sys.argv) not in (1, 5, 6):
+        print("Usage: python mystery_data_spawns.py [DATASET MAP_NAME X Y [RADIUS]]")
+        return
+
+    spawn_index = SpawnIndex()
+
+    if len(sys.argv) == 1:
+        for shared_group in spawn_index.shared_spawn_points():
+            print(" | ".join(str(result) for result in shared_group))
+        return
+
+    dataset, map_name, x, y = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+    if len(sys.argv) == 6:
+        results = spawn_index.within_radius(dataset, map_name, x, y, int(sys.argv[5]))
+    else:
+        results = spawn_index.nearest(dataset, map_name, x, y)
+
+    for result in results:
+        print(result)
+
+if __name__ == "__main__":
+    main()
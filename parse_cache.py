@@ -0,0 +1,105 @@
+import hashlib
+import os
+import pathlib
+import pickle
+
+DEFAULT_PARSE_CACHE_DIR = ".parse_cache"
+DEFAULT_PARSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+class ParseCache:
+    __slots__ = ("cache_dir", "max_bytes")
+
+    def __init__(self, cache_dir=DEFAULT_PARSE_CACHE_DIR, max_bytes=DEFAULT_PARSE_CACHE_MAX_BYTES):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def get_or_parse(self, kind, parser_version, input_filenames, options, parse_func):
+        result = self.get(kind, parser_version, input_filenames, options)
+        if result is None:
+            result = parse_func()
+            self.put(kind, parser_version, input_filenames, options, result)
+
+        return result
+
+    def get(self, kind, parser_version, input_filenames, options):
+        slot_prefix, cache_filename = self.get_cache_filename(kind, parser_version, input_filenames, options)
+
+        try:
+            with open(cache_filename, "rb") as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            cache_filename.unlink(missing_ok=True)
+            return None
+
+        os.utime(cache_filename)
+        return result
+
+    def put(self, kind, parser_version, input_filenames, options, result):
+        slot_prefix, cache_filename = self.get_cache_filename(kind, parser_version, input_filenames, options)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for stale_cache_filename in self.cache_dir.glob(f"{slot_prefix}*.pickle"):
+            stale_cache_filename.unlink(missing_ok=True)
+
+        temp_cache_filename = cache_filename.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_cache_filename, "wb+") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp_cache_filename, cache_filename)
+        self.evict()
+
+    def get_cache_filename(self, kind, parser_version, input_filenames, options):
+        # the slot identifies "this parser over these files with these options",
+        # the content digest identifies one particular state of the inputs.
+        # a new content digest for an existing slot supersedes the old entry
+        slot_digest = hash_parts(kind, *input_filenames, *(f"{key}={value!r}" for key, value in sorted(options.items())))
+        content_digest = hash_parts(str(parser_version), *(hash_file(input_filename) for input_filename in input_filenames))
+        slot_prefix = f"{kind}-{slot_digest}-"
+        return slot_prefix, self.cache_dir / f"{slot_prefix}{content_digest}.pickle"
+
+    def evict(self):
+        cache_files = []
+        total_size = 0
+
+        for cache_filename in self.cache_dir.glob("*.pickle"):
+            stat = cache_filename.stat()
+            cache_files.append((stat.st_mtime, stat.st_size, cache_filename))
+            total_size += stat.st_size
+
+        # least recently used first, since hits touch the mtime
+        cache_files.sort()
+
+        for mtime, size, cache_filename in cache_files:
+            if total_size <= self.max_bytes:
+                break
+
+            cache_filename.unlink(missing_ok=True)
+            total_size -= size
+
+    def clear(self):
+        for cache_filename in self.cache_dir.glob("*.pickle"):
+            cache_filename.unlink(missing_ok=True)
+
+def hash_parts(*parts):
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(str(part).encode("utf-8"))
+        hasher.update(b"\0")
+
+    return hasher.hexdigest()
+
+def hash_file(filename):
+    if filename is None:
+        return "None"
+
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as f:
+        while True:
+            chunk = f.read(1 << 16)
+            if not chunk:
+                break
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
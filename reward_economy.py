@@ -0,0 +1,223 @@
+import re
+import sys
+
+import numpy as np
+
+import enemy_drops
+from drop_rate_store import DropRateStore, CHANCE_DENOMINATOR
+from drop_odds import rank_distribution_to_weights, parse_rank_distribution
+from gmd_probabilities import GmdProbabilities
+from mystery_data import load_mystery_data_file, game_cycles
+from parse_cache import ParseCache
+
+REWARD_KIND_ZENNY = "zenny"
+REWARD_KIND_BUGFRAGS = "bugfrags"
+REWARD_KIND_HP_PLUS = "hp_plus"
+REWARD_KIND_HP_MEMORY = "hp_memory"
+
+reward_kinds = (REWARD_KIND_ZENNY, REWARD_KIND_BUGFRAGS, REWARD_KIND_HP_PLUS, REWARD_KIND_HP_MEMORY)
+
+zenny_regex = re.compile(r"^([0-9]+)z$")
+bugfrags_regex = re.compile(r"^BugFrag x([0-9]+)$")
+# drop table HP recovery ("HP+50") and mystery data NaviCust parts ("HP+50 (pink)")
+hp_plus_regex = re.compile(r"^HP\+([0-9]+)(?: \([a-z]+\))?$")
+hp_memory_rewards = frozenset(("HP Memory", "HP Memry"))
+
+def reward_kind_amount(reward):
+    # (kind, amount) of a non-chip reward, or (None, 0) for anything else
+    match_obj = zenny_regex.match(reward)
+    if match_obj is not None:
+        return REWARD_KIND_ZENNY, int(match_obj.group(1))
+
+    match_obj = bugfrags_regex.match(reward)
+    if match_obj is not None:
+        return REWARD_KIND_BUGFRAGS, int(match_obj.group(1))
+
+    match_obj = hp_plus_regex.match(reward)
+    if match_obj is not None:
+        return REWARD_KIND_HP_PLUS, int(match_obj.group(1))
+
+    if reward in hp_memory_rewards:
+        return REWARD_KIND_HP_MEMORY, 1
+
+    return None, 0
+
+economy_md_inputs = (
+    ("bn4_mystery_data.txt", 4, "4"),
+    ("exe5_mystery_data.txt", 5, "5JP"),
+    ("bn5_mystery_data.txt", 5, "5EN"),
+    ("exe6_mystery_data.txt", 6, "6JP"),
+    ("bn6_mystery_data.txt", 6, "6EN"),
+)
+
+# BN4 BMDs and PMDs give their "Rest" reward on every visit after the numbered ones
+REPEATING_MD_LABEL = "Rest"
+
+class DropEconomy:
+    __slots__ = ("version", "enemy_name", "hp_percent", "rank", "kind", "expected_amount")
+
+    def __init__(self, version, enemy_name, hp_percent, rank, kind, expected_amount):
+        self.version = version
+        self.enemy_name = enemy_name
+        self.hp_percent = hp_percent
+        # None when the amount is taken over a busting level distribution
+        self.rank = rank
+        self.kind = kind
+        self.expected_amount = expected_amount
+
+    def __str__(self):
+        parts = [f"[{self.version}] {self.enemy_name}"]
+        if self.rank is not None:
+            parts.append(f"LV{self.rank}")
+        if self.hp_percent is not None:
+            parts.append(f"{self.hp_percent} HP")
+        parts.append(f"{self.expected_amount:.2f} {self.kind} per battle")
+
+        return " ".join(parts)
+
+class MapEconomy:
+    __slots__ = ("dataset", "map_name", "kind", "one_time_total", "repeating_total", "cycles", "gmd_expected_amounts")
+
+    def __init__(self, dataset, map_name, kind, one_time_total, repeating_total, cycles, gmd_expected_amounts):
+        self.dataset = dataset
+        self.map_name = map_name
+        self.kind = kind
+        # everything the map's blue and purple MDs give once
+        self.one_time_total = one_time_total
+        # what one more round of the map's repeating blue and purple MD rewards gives
+        self.repeating_total = repeating_total
+        self.cycles = cycles
+        # expected amount from one GMD pickup in the map, per cycle
+        self.gmd_expected_amounts = gmd_expected_amounts
+
+    def __str__(self):
+        gmd_parts = ", ".join(f"{cycle}: {gmd_expected_amount:.2f}" for cycle, gmd_expected_amount in zip(self.cycles, self.gmd_expected_amounts))
+        return f"[{self.dataset}] {self.map_name}: {self.one_time_total} {self.kind} once and {self.repeating_total} per repeat from BMDs/PMDs, per GMD pickup {gmd_parts}"
+
+# drop group keys pack (table, enemy, hp_percent, rank) into one int64, following drop_rate_dtype's widths
+DROP_GROUP_KEY_SHIFTS = (32, 16, 8, 0)
+
+# drop rewards come from drop_rate_store's rows, so one DropRateStore parse serves the
+# economy index alongside the chip drop odds
+class RewardEconomyIndex:
+    __slots__ = ("drop_rate_store", "parse_cache", "reward_kind_ids", "reward_amounts", "map_economies")
+
+    def __init__(self, drop_rate_store, md_inputs=economy_md_inputs, parse_cache=None):
+        self.drop_rate_store = drop_rate_store
+        self.parse_cache = parse_cache
+
+        # per drop store reward id. -1 is not an economy reward. drop tables have no BugFrags
+        reward_kind_ids = []
+        reward_amounts = []
+        for reward in drop_rate_store.rewards.names:
+            kind, amount = reward_kind_amount(reward)
+            reward_kind_ids.append(reward_kinds.index(kind) if kind is not None else -1)
+            reward_amounts.append(amount)
+
+        self.reward_kind_ids = np.array(reward_kind_ids, dtype=np.int8)
+        self.reward_amounts = np.array(reward_amounts, dtype=np.float64)
+
+        self.map_economies = {}
+        for filename, game_number, dataset in md_inputs:
+            self.add_map_economies(filename, game_number, dataset)
+
+    def add_map_economies(self, filename, game_number, dataset):
+        parse_cache = self.parse_cache
+        cycles = game_cycles[game_number]
+        # {(map name, kind): [one time total, repeating total, [GMD expected amount per cycle]]}, in map order
+        map_kind_totals = {}
+        map_order = {}
+
+        for mystery_data in load_mystery_data_file(filename, parse_cache).mds:
+            map_order.setdefault(mystery_data.map_name, len(map_order))
+            if mystery_data.md_type == "Green":
+                continue
+
+            for md_reward in mystery_data.rewards:
+                kind, amount = reward_kind_amount(md_reward.reward)
+                if kind is not None:
+                    map_kind_total = map_kind_totals.setdefault((mystery_data.map_name, kind), [0, 0, [0.0] * len(cycles)])
+                    if md_reward.label == REPEATING_MD_LABEL:
+                        map_kind_total[1] += amount
+                    else:
+                        map_kind_total[0] += amount
+
+        gmd_probabilities = GmdProbabilities.load(filename, game_number, parse_cache)
+        for reward in gmd_probabilities.packed_chances.keys():
+            kind, amount = reward_kind_amount(reward)
+            if kind is None:
+                continue
+
+            for gmd_chance in gmd_probabilities.find(reward):
+                gmd_expected_amounts = map_kind_totals.setdefault((gmd_chance.map_name, kind), [0, 0, [0.0] * len(cycles)])[2]
+                gmd_expected_amounts[cycles.index(gmd_chance.cycle)] += gmd_chance.chance * amount
+
+        self.map_economies[dataset] = [
+            MapEconomy(dataset, map_name, kind, one_time_total, repeating_total, cycles, tuple(gmd_expected_amounts))
+            for (map_name, kind), (one_time_total, repeating_total, gmd_expected_amounts) in sorted(map_kind_totals.items(), key=lambda item: (map_order[item[0][0]], reward_kinds.index(item[0][1])))
+        ]
+
+    def best_drops(self, kind, version, rank=None, rank_distribution=None, limit=None):
+        # expected amount of kind per battle for every (enemy, HP band, busting level), best first.
+        # with a rank_distribution, busting levels are weighted into one amount per (enemy, HP band)
+        if kind not in reward_kinds:
+            raise RuntimeError(f"Unknown reward kind {kind}! Expected one of {', '.join(reward_kinds)}.")
+
+        drop_rate_store = self.drop_rate_store
+        selected = drop_rate_store.select(table=version, rank=rank)
+        selected &= self.reward_kind_ids[drop_rate_store.drop_rates["reward"]] == reward_kinds.index(kind)
+        rows = drop_rate_store.drop_rates[selected]
+
+        amounts = rows["chance"].astype(np.float64) / CHANCE_DENOMINATOR * self.reward_amounts[rows["reward"]]
+        ranks = rows["rank"].astype(np.int64)
+        if rank_distribution is not None:
+            amounts *= rank_distribution_to_weights(rank_distribution)[ranks]
+            ranks = np.zeros_like(ranks)
+
+        keys = ranks
+        for name, shift in zip(("table", "enemy", "hp_percent"), DROP_GROUP_KEY_SHIFTS):
+            keys = keys | (rows[name].astype(np.int64) << shift)
+
+        group_keys, group_indices = np.unique(keys, return_inverse=True)
+        group_amounts = np.bincount(group_indices.reshape(-1), weights=amounts, minlength=len(group_keys))
+        order = np.argsort(-group_amounts, kind="stable")
+        order = order[group_amounts[order] > 0][:limit]
+
+        drop_economies = []
+        for group_key, expected_amount in zip(group_keys[order].tolist(), group_amounts[order].tolist()):
+            table_id, enemy_id, hp_percent_bit = ((group_key >> shift) & mask for shift, mask in zip(DROP_GROUP_KEY_SHIFTS, (0xff, 0xffff, 0xff)))
+            drop_rank = enemy_drops.DropEntry.int_to_rank(group_key & 0xff) if rank_distribution is None else None
+            drop_economies.append(DropEconomy(drop_rate_store.tables[table_id], drop_rate_store.enemies[enemy_id], enemy_drops.bit_to_hp_percent[hp_percent_bit], drop_rank, kind, expected_amount))
+
+        return drop_economies
+
+    def map_totals(self, kind, dataset):
+        return [map_economy for map_economy in self.map_economies.get(dataset, ()) if map_economy.kind == kind]
+
+def main():
+    if len(sys.argv) < 4 or sys.argv[1] not in ("drops", "maps"):
+        print("Usage: python reward_economy.py drops KIND VERSION [RANK|RANK_DISTRIBUTION]")
+        print("       python reward_economy.py maps KIND DATASET")
+        return
+
+    reward_economy_index = RewardEconomyIndex(DropRateStore(), parse_cache=ParseCache())
+    kind = sys.argv[2]
+
+    if sys.argv[1] == "drops":
+        rank = None
+        rank_distribution = None
+        if len(sys.argv) == 5:
+            if ":" in sys.argv[4]:
+                rank_distribution = parse_rank_distribution(sys.argv[4])
+            else:
+                rank = sys.argv[4]
+
+        results = reward_economy_index.best_drops(kind, sys.argv[3], rank, rank_distribution, limit=20)
+    else:
+        results = reward_economy_index.map_totals(kind, sys.argv[3])
+
+    for result in results:
+        print(result)
+
+if __name__ == "__main__":
+    main()
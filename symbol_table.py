@@ -0,0 +1,24 @@
+class SymbolTable:
+    __slots__ = ("names", "ids")
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def intern(self, name):
+        symbol_id = self.ids.get(name)
+        if symbol_id is None:
+            symbol_id = len(self.names)
+            self.names.append(name)
+            self.ids[name] = symbol_id
+
+        return symbol_id
+
+    def get(self, name):
+        return self.ids.get(name)
+
+    def __getitem__(self, symbol_id):
+        return self.names[symbol_id]
+
+    def __len__(self):
+        return len(self.names)
@@ -0,0 +1,139 @@
+import enemy_drops
+
+# (game number, drop files with their ignored enemies and version)
+game_drop_files = (
+    (1, (("bn1_drops.txt", "bn1_ignored_enemies.txt", None),)),
+    (2, (("bn2_drops.txt", "bn2_ignored_enemies.txt", None),)),
+    (3, (("bn3w_drops.txt", "bn3w_ignored_enemies.txt", "3W"), ("bn3b_drops.txt", "bn3b_ignored_enemies.txt", "3B"))),
+    (4, (("bn4rs_drops.txt", "bn4rs_ignored_enemies.txt", "4RS"), ("bn4bm_drops.txt", "bn4bm_ignored_enemies.txt", "4BM"))),
+    (5, (("bn5p_drops.txt", "bn5p_ignored_enemies.txt", "5TP"), ("bn5c_drops.txt", "bn5c_ignored_enemies.txt", "5TC"))),
+    (6, (("bn6g_drops.txt", "bn6g_ignored_enemies.txt", "6CG"), ("bn6f_drops.txt", "bn6f_ignored_enemies.txt", "6CF"))),
+)
+
+def baseline_fold(drop_entries):
+    # the original fold, run once over all of an enemy's entries for a chip: the first pair
+    # (0=1, 0=2, 1=2) with the same busting levels is merged and goes first
+    def merge_if_ranks_equal(drop_entry_1, drop_entry_2):
+        if drop_entry_1[1] == drop_entry_2[1]:
+            return (drop_entry_1[0] | drop_entry_2[0], drop_entry_1[1])
+        return None
+
+    if len(drop_entries) == 1:
+        return drop_entries
+    elif len(drop_entries) == 2:
+        merged_drop_entry = merge_if_ranks_equal(*drop_entries)
+        return drop_entries if merged_drop_entry is None else [merged_drop_entry]
+    elif len(drop_entries) == 3:
+        for i, j, k in ((0, 1, 2), (0, 2, 1), (1, 2, 0)):
+            merged_drop_entry = merge_if_ranks_equal(drop_entries[i], drop_entries[j])
+            if merged_drop_entry is not None:
+                fully_merged_drop_entry = merge_if_ranks_equal(merged_drop_entry, drop_entries[k])
+                if fully_merged_drop_entry is not None:
+                    return [fully_merged_drop_entry]
+                return [merged_drop_entry, drop_entries[k]]
+
+        return drop_entries
+    else:
+        raise RuntimeError(f"drop_entries has len {len(drop_entries)}!")
+
+def baseline_chip_drops(filename, ignored_enemies_filename, hp_percent_drops):
+    # {(chip, enemy): [(hp_percents_mask, ranks_mask), ...]} as the original parser built it
+    enemy_drop_tables = enemy_drops.EnemyDropTables(filename, ignored_enemies_filename, hp_percent_drops=hp_percent_drops)
+    unfolded_chip_drops = {}
+    cur_enemy_index = -1
+    skip_enemy = False
+    drop_entry = None
+
+    for drop_record in enemy_drop_tables.iter_drop_records():
+        if drop_record.enemy_index != cur_enemy_index:
+            cur_enemy_index = drop_record.enemy_index
+            skip_enemy = enemy_drop_tables.is_skipped_enemy(cur_enemy_index, drop_record.enemy_name)
+            drop_entry = None
+
+        if skip_enemy:
+            continue
+
+        if drop_record.is_new_reward:
+            drop_entry = None
+            if enemy_drops.is_chip_reward(drop_record.reward):
+                drop_entry = [enemy_drops.hp_percent_to_bit[drop_record.hp_percent], 0]
+                unfolded_chip_drops.setdefault((drop_record.reward, drop_record.enemy_name), []).append(drop_entry)
+
+        if drop_entry is not None:
+            drop_entry[1] |= enemy_drops.rank_range_to_mask(drop_record.rank)
+
+    return {key: baseline_fold([tuple(drop_entry) for drop_entry in drop_entries]) for key, drop_entries in unfolded_chip_drops.items()}
+
+def parsed_chip_drops(enemy_drop_tables):
+    return {
+        (chip_full, enemy_name): [(drop_entry.hp_percents_mask, drop_entry.ranks_mask) for drop_entry in enemy_drop.drop_entries]
+        for chip_full, chip_drop_locations in enemy_drop_tables.all_chip_drop_locations.items()
+        for enemy_name, enemy_drop in chip_drop_locations.enemy_drops.items()
+    }
+
+def load_game_drop_table(game_number, drop_files, max_workers=None):
+    hp_percents_to_name = None if game_number == 1 else {}
+    input_drop_tables = [enemy_drops.InputDropTable(filename, ignored_enemies_filename, version) for filename, ignored_enemies_filename, version in drop_files]
+    return enemy_drops.GameDropTable(hp_percents_to_name, game_number, *input_drop_tables, max_workers=max_workers)
+
+def test_drop_entries_match_baseline_fold():
+    for max_workers in (None, 2):
+        for game_number, drop_files in game_drop_files:
+            game_drop_table = load_game_drop_table(game_number, drop_files, max_workers)
+            for (filename, ignored_enemies_filename, version), enemy_drop_tables_and_version in zip(drop_files, game_drop_table.game_enemy_drop_tables):
+                assert parsed_chip_drops(enemy_drop_tables_and_version.enemy_drop_tables) == baseline_chip_drops(filename, ignored_enemies_filename, game_number != 1), filename
+
+def test_merged_entry_goes_first():
+    game_drop_table = load_game_drop_table(*game_drop_files[1])
+    enemy_drop = game_drop_table.game_enemy_drop_tables[0].enemy_drop_tables.all_chip_drop_locations["LilBomb T"].enemy_drops["Beetank"]
+    assert [drop_entry.num_hp_percents() for drop_entry in enemy_drop.drop_entries] == [2, 1]
+
+def test_shared_drop_entries_are_not_changed():
+    drop_entry_1 = enemy_drops.DropEntry(enemy_drops.hp_percent_to_bit[">37.5%"], 0b110)
+    drop_entry_2 = enemy_drops.DropEntry(enemy_drops.hp_percent_to_bit["<=37.5%"], 0b110)
+    enemy_drop = enemy_drops.EnemyDrop("Mettaur", None)
+    enemy_drop.add_drop_entry(drop_entry_1)
+    enemy_drop.add_drop_entry(drop_entry_2)
+
+    assert len(enemy_drop.drop_entries) == 1
+    assert enemy_drop.drop_entries[0].num_hp_percents() == 2
+    assert drop_entry_1.hp_percents_mask == enemy_drops.hp_percent_to_bit[">37.5%"]
+
+class ParsedDropsCache:
+    # hands GameDropTable parses the test still holds references into
+    def __init__(self, all_chip_drop_locations_list):
+        self.all_chip_drop_locations_iter = iter(all_chip_drop_locations_list)
+
+    def get(self, *cache_key):
+        return next(self.all_chip_drop_locations_iter)
+
+def test_canonicalizing_leaves_parsed_enemy_drops_alone():
+    game_number, drop_files = game_drop_files[2]
+    enemy_block_drops = {}
+    all_chip_drop_locations_list = []
+    for filename, ignored_enemies_filename, version in drop_files:
+        enemy_drop_tables = enemy_drops.EnemyDropTables(filename, ignored_enemies_filename)
+        enemy_drop_tables.parse_enemy_drop_tables(enemy_block_drops)
+        all_chip_drop_locations_list.append(enemy_drop_tables.all_chip_drop_locations)
+
+    parsed_enemy_drops = [
+        enemy_drop
+        for all_chip_drop_locations in all_chip_drop_locations_list
+        for chip_drop_locations in all_chip_drop_locations.values()
+        for enemy_drop in chip_drop_locations.enemy_drops.values()
+    ]
+    input_drop_tables = [enemy_drops.InputDropTable(filename, ignored_enemies_filename, version) for filename, ignored_enemies_filename, version in drop_files]
+    game_drop_table = enemy_drops.GameDropTable({}, game_number, *input_drop_tables, parse_cache=ParsedDropsCache(all_chip_drop_locations_list))
+
+    for enemy_drop in parsed_enemy_drops:
+        assert isinstance(enemy_drop.drop_entries, list) and enemy_drop.drop_table_id is None
+    parsed_enemy_drops[0].add_drop_entry(enemy_drops.DropEntry(enemy_drops.hp_percent_to_bit[">=37.5%"], 0b110))
+
+    canonical_enemy_drop = next(iter(next(iter(all_chip_drop_locations_list[0].values())).enemy_drops.values()))
+    assert canonical_enemy_drop.drop_entries is game_drop_table.drop_tables[canonical_enemy_drop.drop_table_id]
+    try:
+        canonical_enemy_drop.add_drop_entry(enemy_drops.DropEntry(enemy_drops.hp_percent_to_bit[">=37.5%"], 0b110))
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("a canonical EnemyDrop took a new entry")